@@ -1,92 +1,130 @@
 import chess
 import time
 import chess.polyglot
-from threading import Thread
+from threading import Thread, Lock
 from queue import Queue
-from search import Searcher  
-class AI:
-    def __init__(self):
-        self.move = None
+from search import Searcher
+from engine_common import BOOK_PATH  # Sách Polyglot; có thể tự tạo từ PGN bằng book_builder.py
 
-    def run_search_process(self, board_state, return_queue):
-            def search_and_update():
-                try:
-                    start = time.time()
-
-                    # ⚡ Ưu tiên tìm trong sách khai cuộc trước
-                    move = None
-                    try:
-                        with chess.polyglot.open_reader("baron30.bin") as reader:
-                            try:
-                                entry = reader.find(board_state)
-                                move = entry.move
-                                print(f"[AI] Sử dụng sách khai cuộc: {move}")
-                            except IndexError:
-                                pass
-                    except FileNotFoundError:
-                        print("[Lỗi] Không tìm thấy baron30.bin")
 
+class EngineWorker(Thread):
+    """
+    Luồng engine tồn tại suốt chương trình, nhận yêu cầu tìm kiếm qua hàng đợi.
+
+    Kết quả được trả về qua callback on_result(request_id, move) và thông tin
+    từng độ sâu qua on_info(request_id, info), đều được gọi từ luồng engine.
+    Yêu cầu bị huỷ (cancel) hoặc bị thay thế bởi yêu cầu mới sẽ không gọi callback,
+    và việc tìm kiếm của nó tự dừng: Searcher kiểm tra request_id qua stop_condition.
+    """
+
+    def __init__(self, book_path=BOOK_PATH, analysis_cache=None):
+        super().__init__(daemon=True)
+        self.requests = Queue()
+        self.searcher = Searcher()
+        self.searcher.analysis_cache = analysis_cache  # AnalysisCache dùng chung giữa các lần phân tích (tuỳ chọn)
+        self.book_path = book_path
+        self.book = None
+        self.lock = Lock()
+        self.current_id = 0
+        self.start()
+
+    def submit(self, board, on_result, on_info=None, max_depth=6, time_limit=9):
+        """Gửi một yêu cầu tìm kiếm, huỷ yêu cầu đang chạy (nếu có). Trả về request_id."""
+        with self.lock:
+            self.current_id += 1
+            request_id = self.current_id
+        self.searcher.stop()
+        self.requests.put((request_id, board, on_result, on_info, max_depth, time_limit))
+        return request_id
+
+    def cancel(self):
+        """Huỷ yêu cầu đang chạy; kết quả của nó sẽ bị bỏ qua."""
+        with self.lock:
+            self.current_id += 1
+        self.searcher.stop()
+
+    def shutdown(self):
+        self.cancel()
+        self.requests.put(None)
+        if self.book:
+            self.book.close()
+            self.book = None
+
+    def is_current(self, request_id):
+        return request_id == self.current_id
+
+    def book_move(self, board):
+        """Tìm nước đi trong sách khai cuộc; sách chỉ được mở một lần."""
+        if self.book is None and self.book_path:
+            try:
+                self.book = chess.polyglot.open_reader(self.book_path)
+            except FileNotFoundError:
+                print(f"[Lỗi] Không tìm thấy {self.book_path}. Dùng Searcher.")
+                self.book_path = None
+        if self.book is None:
+            return None
+        entry = self.book.get(board)
+        return entry.move if entry else None
+
+    def run(self):
+        while True:
+            request = self.requests.get()
+            if request is None:
+                break
+            request_id, board, on_result, on_info, max_depth, time_limit = request
+            if not self.is_current(request_id):
+                continue
+
+            try:
+                start = time.time()
+                # ⚡ Ưu tiên tìm trong sách khai cuộc trước
+                move = self.book_move(board)
+                if move is not None:
+                    print(f"[AI] Sử dụng sách khai cuộc: {move}")
+                else:
                     # ❌ Nếu không tìm thấy, dùng Searcher
-                    if move is None:
-                        searcher = Searcher()
-                        move = searcher.iterative_deepening(board_state, max_depth=6, time_limit=9)
-                        print(f"[AI] Đã chọn nước đi: {move} trong {time.time() - start:.2f} giây")
+                    if on_info:
+                        self.searcher.info_callback = lambda info: self.is_current(request_id) and on_info(request_id, info)
+                    else:
+                        self.searcher.info_callback = None
+                    # searcher.stop() có thể đến trước khi iterative_deepening xoá cờ dừng;
+                    # điều kiện này luôn được kiểm tra nên yêu cầu đã bị thay thế không chạy hết giờ
+                    self.searcher.stop_condition = lambda: not self.is_current(request_id)
+                    move = self.searcher.iterative_deepening(board, max_depth=max_depth, time_limit=time_limit)
+                    print(f"[AI] Đã chọn nước đi: {move} trong {time.time() - start:.2f} giây")
+            except Exception as e:
+                print("[Lỗi] Lỗi trong tìm kiếm:", e)
+                move = None
 
-                    self.move = move
-                    if return_queue:
-                        return_queue.put(move)
+            if self.is_current(request_id):
+                on_result(request_id, move)
 
-                except Exception as e:
-                    print("[Lỗi] Lỗi trong tìm kiếm:", e)
-                    self.move = None
-                    if return_queue:
-                        return_queue.put(None)
 
-            Thread(target=search_and_update).start()
+class AI:
+    def __init__(self, cache_path=None):
+        self.move = None
+        # cache_path: file của AnalysisCache (analysis_cache.py) để dùng lại kết quả phân tích giữa các lần chơi
+        analysis_cache = None
+        if cache_path:
+            from analysis_cache import AnalysisCache
+            analysis_cache = AnalysisCache(cache_path)
+        self.worker = EngineWorker(analysis_cache=analysis_cache)
 
-    def update_ai_move(self, game, board_state):
+    def request_move(self, board_state, on_result, on_info=None):
+        """Yêu cầu engine tìm nước đi mà không chặn luồng gọi."""
         self.move = None
-        return_queue = Queue()
-
-        try:
-            with chess.polyglot.open_reader("baron30.bin") as reader:
-                try:
-                    entry = reader.find(board_state)
-                    self.move = entry.move
-                    print(f"[AI] Sử dụng sách khai cuộc: {self.move}")
-                    game.board.push(self.move)
-                    game.history_index = len(game.board.move_stack)
-                    game.view_board = game.board.copy()
-                    game.check_game_end()
-                    if hasattr(game, 'root'):
-                        game.root.title("Cờ vua - Đã xong")
-                    return
-                except IndexError:
-                    print("[AI] Không tìm thấy nước đi trong sách khai cuộc. Dùng Searcher.")
-        except FileNotFoundError:
-            print("[Lỗi] Không tìm thấy tệp baron30.bin. Dùng Searcher.")
-        except Exception as e:
-            print("[Lỗi] Lỗi khi mở sách khai cuộc:", e)
-
-        self.run_search_process(board_state, return_queue)
-
-        def check_result():
-            if self.move and self.move in game.board.legal_moves:
-                game.board.push(self.move)
-                game.history_index = len(game.board.move_stack)
-                game.view_board = game.board.copy()
-                game.check_game_end()
-                if hasattr(game, 'root'):
-                    game.root.title("Cờ vua - Đã xong")
-            elif not self.move:
-                if hasattr(game, 'root'):
-                    game.root.after(50, check_result)
-                else:
-                    time.sleep(0.05)
-                    Thread(target=check_result).start()
-
-        if hasattr(game, 'root'):
-            game.root.title("AI đang nghĩ...")
-            game.root.after(50, check_result)
-        else:
-            check_result()
\ No newline at end of file
+        return self.worker.submit(board_state, on_result, on_info)
+
+    def run_search_process(self, board_state, return_queue):
+        def on_result(request_id, move):
+            self.move = move
+            if return_queue:
+                return_queue.put(move)
+
+        self.request_move(board_state, on_result)
+
+    def cancel(self):
+        self.worker.cancel()
+
+    def close(self):
+        self.worker.shutdown()
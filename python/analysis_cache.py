@@ -0,0 +1,125 @@
+"""
+Persistent on-disk cache of deep search results, keyed by Zobrist hash.
+
+Searcher writes the root result after every completed iteration (depth, score,
+bound, best move, PV) and consults the cache at the root, and optionally at
+shallow interior plies, so positions analysed before return instantly. The
+cache is a single SQLite file with a size limit and least-recently-used
+eviction.
+
+Usage:
+    python analysis_cache.py stats [path]
+    python analysis_cache.py clear [path]
+"""
+import sys
+import time
+import sqlite3
+import threading
+
+CACHE_PATH = "analysis_cache.sqlite"
+HIT_DEPTH = 8  # Default Searcher.cache_hit_depth of the entry points (--cache-depth, UCI CacheDepth)
+
+EXACT, LOWER, UPPER = 0, 1, 2  # Same bounds as TranspositionTable
+
+
+def _signed(key):
+    """SQLite integers are signed 64-bit; Zobrist keys are unsigned."""
+    return key - (1 << 64) if key >= (1 << 63) else key
+
+
+class CacheEntry:
+    __slots__ = ("depth", "score", "flag", "move", "pv")
+
+    def __init__(self, depth, score, flag, move, pv):
+        self.depth = depth
+        self.score = score
+        self.flag = flag
+        self.move = move  # UCI string
+        self.pv = pv      # list of UCI strings
+
+
+class AnalysisCache:
+    def __init__(self, path=CACHE_PATH, max_entries=1_000_000):
+        self.path = path
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key INTEGER PRIMARY KEY, depth INTEGER, score INTEGER, flag INTEGER, "
+            "move TEXT, pv TEXT, last_used REAL)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS entries_last_used ON entries(last_used)")
+        self.conn.commit()
+        self.count = self.conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, touch=True):
+        """Look up a position; touch=True marks it as recently used (one write)."""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT depth, score, flag, move, pv FROM entries WHERE key = ?", (_signed(key),)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            if touch:
+                self.conn.execute("UPDATE entries SET last_used = ? WHERE key = ?", (time.time(), _signed(key)))
+                self.conn.commit()
+        depth, score, flag, move, pv = row
+        return CacheEntry(depth, score, flag, move, pv.split() if pv else [])
+
+    def put(self, key, depth, score, flag, move, pv=()):
+        """Store a result unless a deeper one is already cached."""
+        move = move.uci() if hasattr(move, "uci") else move
+        pv = " ".join(m.uci() if hasattr(m, "uci") else m for m in pv)
+        with self.lock:
+            row = self.conn.execute("SELECT depth FROM entries WHERE key = ?", (_signed(key),)).fetchone()
+            if row is None:
+                self.conn.execute(
+                    "INSERT INTO entries (key, depth, score, flag, move, pv, last_used) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (_signed(key), depth, int(score), flag, move, pv, time.time()))
+                self.count += 1
+                if self.count > self.max_entries:
+                    self._evict()
+            elif depth >= row[0]:
+                self.conn.execute(
+                    "UPDATE entries SET depth = ?, score = ?, flag = ?, move = ?, pv = ?, last_used = ? WHERE key = ?",
+                    (depth, int(score), flag, move, pv, time.time(), _signed(key)))
+            self.conn.commit()
+
+    def _evict(self):
+        """Drop the least recently used entries down to 90% of the limit."""
+        excess = self.count - int(self.max_entries * 0.9)
+        cur = self.conn.execute(
+            "DELETE FROM entries WHERE key IN (SELECT key FROM entries ORDER BY last_used LIMIT ?)", (excess,))
+        self.count -= cur.rowcount
+
+    def __len__(self):
+        return self.count
+
+    def clear(self):
+        with self.lock:
+            self.conn.execute("DELETE FROM entries")
+            self.conn.commit()
+            self.count = 0
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "stats"
+    cache = AnalysisCache(sys.argv[2] if len(sys.argv) > 2 else CACHE_PATH)
+    if command == "clear":
+        cache.clear()
+        print("[Cache] Đã xoá cache")
+    else:
+        rows = cache.conn.execute("SELECT depth, COUNT(*) FROM entries GROUP BY depth ORDER BY depth").fetchall()
+        print(f"[Cache] {len(cache):,} entries")
+        for depth, count in rows:
+            print(f"  depth {depth:<3} {count:,}")
+    cache.close()
@@ -0,0 +1,149 @@
+"""
+Endgame bitbases for KQK, KRK and KPK, built locally by retrograde analysis.
+
+Each table stores one bit per position: "the side with the extra piece wins".
+Positions are normalised so the strong side is white and indexed as
+wk * 4096 + bk * 64 + piece_square, with separate halves for white to move and
+black to move (2 * 64^3 bits = 64 KB per table). Probing only reads the
+memory-mapped files; generation (NumPy) lives in bitbase_gen.py.
+
+Usage:
+    python bitbase.py [generate] [out_dir]   # build all tables (a few seconds)
+    python bitbase.py verify [n_positions]   # check tables against python-chess
+"""
+import os
+import sys
+import mmap
+import chess
+
+# Next to this module, not the working directory: the engine is also started from
+# elsewhere (python python/uci.py, the UCI gateway, a PyInstaller build of uci.spec)
+BITBASE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bitbases")
+MAGIC = b"TBB1"
+HEADER_SIZE = 8
+
+WIN, DRAW, LOSS = 1, 0, -1
+
+TABLE_NAMES = {
+    chess.QUEEN: "kqk",
+    chess.ROOK: "krk",
+    chess.PAWN: "kpk",
+}
+
+N = 64 * 64 * 64
+
+
+class Bitbases:
+    """Memory-mapped bitbase tables probed by the search and the evaluation."""
+
+    def __init__(self, directory=BITBASE_DIR):
+        self.tables = {}
+        for piece_type, name in TABLE_NAMES.items():
+            path = os.path.join(directory, name + ".bin")
+            if not os.path.exists(path):
+                continue
+            with open(path, "rb") as f:
+                header = f.read(HEADER_SIZE)
+                if header[:4] != MAGIC or header[4] != piece_type:
+                    print(f"[Bitbase] Bỏ qua {path}: sai định dạng")
+                    continue
+                self.tables[piece_type] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __bool__(self):
+        return bool(self.tables)
+
+    def probe(self, board):
+        """
+        Probe the position from the side to move's point of view.
+        Returns WIN, DRAW, LOSS, or None if no table covers the position.
+        """
+        if chess.popcount(board.occupied) != 3:
+            return None
+        piece_square = chess.lsb(board.occupied & ~board.kings)
+        piece = board.piece_at(piece_square)
+        table = self.tables.get(piece.piece_type)
+        if table is None:
+            return None
+
+        if piece.color == chess.WHITE:
+            wk, bk, p = board.king(chess.WHITE), board.king(chess.BLACK), piece_square
+        else:
+            wk = chess.square_mirror(board.king(chess.BLACK))
+            bk = chess.square_mirror(board.king(chess.WHITE))
+            p = chess.square_mirror(piece_square)
+        strong_to_move = board.turn == piece.color
+
+        index = (wk << 12) | (bk << 6) | p
+        if not strong_to_move:
+            index += N
+        if not (table[HEADER_SIZE + (index >> 3)] >> (index & 7)) & 1:
+            return DRAW
+        return WIN if strong_to_move else LOSS
+
+
+_BITBASES = None
+
+
+def get_bitbases():
+    """Shared Bitbases instance, mapped on first use."""
+    global _BITBASES
+    if _BITBASES is None:
+        _BITBASES = Bitbases()
+    return _BITBASES
+
+
+def verify(n_positions=2000, directory=BITBASE_DIR, seed=1):
+    """
+    Check every table against python-chess: each sampled position must agree
+    with the best result over its legal moves (or with mate/stalemate).
+    """
+    import random
+    bitbases = Bitbases(directory)
+    rng = random.Random(seed)
+    errors = 0
+    for piece_type in bitbases.tables:
+        checked = 0
+        while checked < n_positions:
+            board = chess.Board(None)
+            squares = rng.sample(range(64), 3)
+            board.set_piece_at(squares[0], chess.Piece(chess.KING, chess.WHITE))
+            board.set_piece_at(squares[1], chess.Piece(chess.KING, chess.BLACK))
+            board.set_piece_at(squares[2], chess.Piece(piece_type, chess.WHITE))
+            board.turn = rng.choice([chess.WHITE, chess.BLACK])
+            if not board.is_valid():
+                continue
+            checked += 1
+            expected = _result_by_search(bitbases, board)
+            if bitbases.probe(board) != expected:
+                errors += 1
+                print(f"[Bitbase] Sai: {board.fen()} bitbase={bitbases.probe(board)} expected={expected}")
+        print(f"[Bitbase] {TABLE_NAMES[piece_type]}: {checked} positions checked")
+    return errors == 0
+
+
+def _result_by_search(bitbases, board):
+    if board.is_checkmate():
+        return LOSS
+    if board.is_stalemate():
+        return DRAW
+    best = LOSS
+    for move in board.legal_moves:
+        board.push(move)
+        if chess.popcount(board.occupied) == 2:
+            result = DRAW
+        else:
+            result = bitbases.probe(board)
+            result = DRAW if result is None else -result
+        board.pop()
+        best = max(best, result)
+    return best
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "verify":
+        ok = verify(int(sys.argv[2]) if len(sys.argv) > 2 else 2000)
+        print("[Bitbase] OK" if ok else "[Bitbase] FAILED")
+        sys.exit(0 if ok else 1)
+    from bitbase_gen import generate_all
+    args = sys.argv[2:] if len(sys.argv) > 1 and sys.argv[1] == "generate" else sys.argv[1:]
+    generate_all(args[0] if args else BITBASE_DIR)
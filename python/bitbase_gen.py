@@ -0,0 +1,178 @@
+"""
+Generation of the endgame bitbases (see bitbase.py) by retrograde analysis.
+
+Kept apart from bitbase.py so that probing the tables never imports NumPy or
+builds the board geometry below; only generating them does.
+
+Usage:
+    python bitbase.py [generate] [out_dir]
+"""
+import os
+import time
+import chess
+import numpy as np
+
+from bitbase import BITBASE_DIR, MAGIC, TABLE_NAMES, N
+
+SQUARES = np.arange(64)
+FILES = SQUARES % 8
+RANKS = SQUARES // 8
+
+KING_DIRS = [(1, 0), (-1, 0), (0, 1), (0, -1), (1, 1), (1, -1), (-1, 1), (-1, -1)]
+ROOK_DIRS = KING_DIRS[:4]
+
+# Chebyshev distance between two squares (kings are adjacent when it is 1)
+CHEB = np.maximum(np.abs(FILES[:, None] - FILES[None, :]), np.abs(RANKS[:, None] - RANKS[None, :]))
+
+
+def _build_geometry():
+    king_targets = np.full((64, 8), -1, dtype=np.int64)
+    rays = np.full((64, 8, 7), -1, dtype=np.int64)
+    between = np.zeros((64, 64, 64), dtype=bool)
+    for sq in range(64):
+        f, r = sq % 8, sq // 8
+        for d, (df, dr) in enumerate(KING_DIRS):
+            if 0 <= f + df < 8 and 0 <= r + dr < 8:
+                king_targets[sq, d] = (r + dr) * 8 + f + df
+            path = []
+            for k in range(1, 8):
+                nf, nr = f + df * k, r + dr * k
+                if not (0 <= nf < 8 and 0 <= nr < 8):
+                    break
+                to = nr * 8 + nf
+                rays[sq, d, k - 1] = to
+                between[sq, to, path] = True
+                path.append(to)
+    return king_targets, rays, between
+
+
+KING_TARGETS, RAYS, BETWEEN = _build_geometry()
+
+
+def _line_attacks(dirs):
+    attacks = np.zeros((64, 64), dtype=bool)
+    for sq in range(64):
+        for d, step in enumerate(KING_DIRS):
+            if step in dirs:
+                targets = RAYS[sq, d]
+                attacks[sq, targets[targets >= 0]] = True
+    return attacks
+
+
+# Empty-board attack maps of the strong (white) piece
+ATTACKS = {
+    chess.QUEEN: _line_attacks(KING_DIRS),
+    chess.ROOK: _line_attacks(ROOK_DIRS),
+    chess.PAWN: (np.abs(FILES[:, None] - FILES[None, :]) == 1) & (RANKS[None, :] == RANKS[:, None] + 1),
+}
+
+
+def _attacks(piece_type, frm, to, blocker):
+    """Does a white piece on frm attack to, with the white king on blocker as the only possible blocker?"""
+    return ATTACKS[piece_type][frm, to] & ~BETWEEN[frm, to, blocker]
+
+
+def generate(piece_type, promotion_tables=None):
+    """
+    Build the table for K + piece vs K by retrograde analysis.
+
+    Returns (white_to_move, black_to_move) boolean arrays of size 64^3 that are
+    True where white wins. KPK needs the KQK and KRK tables (black to move) in
+    promotion_tables to score promotions.
+    """
+    idx = np.arange(N)
+    wk, bk, p = idx >> 12, (idx >> 6) & 63, idx & 63
+
+    base = (wk != bk) & (wk != p) & (bk != p) & (CHEB[wk, bk] > 1)
+    if piece_type == chess.PAWN:
+        base &= (p >= 8) & (p < 56)
+    black_in_check = _attacks(piece_type, p, bk, wk)
+    w_valid = base & ~black_in_check
+    b_valid = base
+
+    # Black king moves: successor indices into the white-to-move table, N = illegal
+    b_succ = []
+    b_has_move = np.zeros(N, dtype=bool)
+    b_escape = np.zeros(N, dtype=bool)  # Black can capture the undefended piece: draw
+    for d in range(8):
+        t = KING_TARGETS[bk, d]
+        on = t >= 0
+        t = np.where(on, t, 0)
+        safe = on & (CHEB[t, wk] > 1)
+        capture = safe & (t == p)
+        quiet = safe & (t != p) & ~_attacks(piece_type, p, t, wk)
+        b_has_move |= capture | quiet
+        b_escape |= capture
+        b_succ.append(np.where(quiet, (wk << 12) | (t << 6) | p, N))
+    b_succ = np.array(b_succ)
+
+    # White moves: successor indices into the black-to-move table, N = illegal
+    w_succ = []
+    for d in range(8):
+        t = KING_TARGETS[wk, d]
+        on = t >= 0
+        t = np.where(on, t, 0)
+        legal = on & (t != p) & (CHEB[t, bk] > 1)
+        w_succ.append(np.where(legal, (t << 12) | (bk << 6) | p, N))
+
+    promo_win = np.zeros(N, dtype=bool)
+    if piece_type == chess.PAWN:
+        push = np.minimum(p + 8, 63)
+        push_free = (push != wk) & (push != bk)
+        promotes = push >= 56
+        w_succ.append(np.where(push_free & ~promotes, (wk << 12) | (bk << 6) | push, N))
+        double = np.minimum(p + 16, 63)
+        double_free = push_free & (p < 16) & (double != wk) & (double != bk)
+        w_succ.append(np.where(double_free, (wk << 12) | (bk << 6) | double, N))
+        for table in promotion_tables or []:
+            promo_win |= push_free & promotes & table[(wk << 12) | (bk << 6) | push]
+    else:
+        for d, step in enumerate(KING_DIRS):
+            if piece_type == chess.ROOK and step not in ROOK_DIRS:
+                continue
+            alive = np.ones(N, dtype=bool)
+            for k in range(7):
+                t = RAYS[p, d, k]
+                alive &= t >= 0
+                t = np.where(alive, t, 0)
+                alive &= (t != wk) & (t != bk)
+                w_succ.append(np.where(alive, (wk << 12) | (bk << 6) | t, N))
+    w_succ = np.array(w_succ)
+
+    mate = b_valid & black_in_check & ~b_has_move
+    b_forced = b_valid & b_has_move & ~b_escape
+
+    w_win = np.zeros(N + 1, dtype=bool)
+    b_win = np.zeros(N + 1, dtype=bool)
+    b_win[:N] = mate
+    while True:
+        w_new = w_valid & (promo_win | b_win[w_succ].any(axis=0))
+        w_win[:N] = w_new
+        w_win[N] = True  # Illegal black moves never refute a win
+        b_new = mate | (b_forced & w_win[b_succ].all(axis=0))
+        w_win[N] = False
+        if np.array_equal(b_new, b_win[:N]):
+            break
+        b_win[:N] = b_new
+    return w_win[:N].copy(), b_win[:N].copy()
+
+
+def save(path, piece_type, tables):
+    white, black = tables
+    with open(path, "wb") as f:
+        f.write(MAGIC + bytes([piece_type, 0, 0, 0]))
+        f.write(np.packbits(np.concatenate([white, black]), bitorder="little").tobytes())
+
+
+def generate_all(out_dir=BITBASE_DIR):
+    os.makedirs(out_dir, exist_ok=True)
+    tables = {}
+    for piece_type in (chess.QUEEN, chess.ROOK, chess.PAWN):
+        start = time.time()
+        promotion_tables = [tables[pt][1] for pt in (chess.QUEEN, chess.ROOK)] if piece_type == chess.PAWN else None
+        tables[piece_type] = generate(piece_type, promotion_tables)
+        path = os.path.join(out_dir, TABLE_NAMES[piece_type] + ".bin")
+        save(path, piece_type, tables[piece_type])
+        wins = int(tables[piece_type][0].sum() + tables[piece_type][1].sum())
+        print(f"[Bitbase] {path}: {wins:,} won positions ({time.time() - start:.2f}s)")
+    return tables
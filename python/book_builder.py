@@ -0,0 +1,247 @@
+"""
+Polyglot opening book builder.
+
+Streams PGN files in worker processes, counts win/draw/loss statistics for
+every (position, move) pair up to --max-ply, and writes a Polyglot .bin book
+that chess.polyglot (and ai.py) can read.
+
+Memory stays bounded for large databases:
+  * PGN files are split into byte ranges aligned on "[Event " lines, so each
+    worker only holds one range at a time;
+  * a worker's counts are flushed to disk whenever they reach --flush-entries,
+    partitioned by the top 8 bits of the Zobrist key into 256 bucket files;
+  * buckets are merged one at a time (an external distribution sort), so the
+    output is written in key order without loading every count at once.
+
+Usage:
+    python book_builder.py book.bin games.pgn [more.pgn ...] [--max-ply 20] [--min-games 3]
+                           [--win 2 --draw 1 --loss 0] [--workers K]
+"""
+import io
+import os
+import glob
+import time
+import argparse
+import tempfile
+from multiprocessing import Pool
+
+import chess
+import chess.pgn
+import chess.polyglot
+import numpy as np
+
+COUNT_DTYPE = np.dtype([("key", "<u8"), ("move", "<u2"), ("win", "<u4"), ("draw", "<u4"), ("loss", "<u4")])
+ENTRY_DTYPE = np.dtype([("key", ">u8"), ("move", ">u2"), ("weight", ">u2"), ("learn", ">u4")])
+BUCKET_BITS = 8
+EVENT_TAG = b"\n[Event "
+RESULTS = {"1-0": 1, "0-1": -1, "1/2-1/2": 0}
+
+
+def polyglot_move(board, move):
+    """Polyglot move encoding; castling is written as king takes own rook."""
+    to_square = move.to_square
+    if board.is_castling(move):
+        rank = chess.square_rank(move.from_square)
+        to_square = chess.square(7 if board.is_kingside_castling(move) else 0, rank)
+    promotion = move.promotion - 1 if move.promotion else 0
+    return to_square | (move.from_square << 6) | (promotion << 12)
+
+
+class OpeningVisitor(chess.pgn.BaseVisitor):
+    """Collects (zobrist key, polyglot move, mover) for the first max_ply moves of a game without building a tree."""
+
+    def __init__(self, max_ply):
+        self.max_ply = max_ply
+
+    def begin_game(self):
+        self.moves = []
+        self.outcome = None
+        self.skip = False
+
+    def visit_header(self, tagname, tagvalue):
+        if tagname == "Result":
+            self.outcome = RESULTS.get(tagvalue)
+        elif tagname == "Variant" and tagvalue.lower() not in ("standard", "chess"):
+            self.skip = True
+
+    def end_headers(self):
+        if self.skip or self.outcome is None:
+            return chess.pgn.SKIP
+
+    def begin_variation(self):
+        return chess.pgn.SKIP
+
+    def begin_parse_san(self, board, san):
+        if board.ply() >= self.max_ply:
+            return chess.pgn.SKIP  # Rest of the game is not needed: skip SAN parsing entirely
+
+    def visit_move(self, board, move):
+        self.moves.append((chess.polyglot.zobrist_hash(board), polyglot_move(board, move), board.turn))
+
+    def handle_error(self, error):
+        self.skip = True
+
+    def result(self):
+        if self.skip:
+            return None, None
+        return self.outcome, self.moves
+
+
+def split_file(path, chunk_size):
+    """Byte ranges of path, each starting at the beginning of a game."""
+    size = os.path.getsize(path)
+    boundaries = [0]
+    with open(path, "rb") as f:
+        offset = chunk_size
+        while offset < size:
+            f.seek(offset)
+            window = b""
+            while True:
+                data = f.read(1 << 20)
+                if not data:
+                    found = -1
+                    break
+                window += data
+                found = window.find(EVENT_TAG)
+                if found >= 0:
+                    break
+                window = window[-len(EVENT_TAG):]
+                offset += len(data) - len(EVENT_TAG)
+            if found < 0:
+                break
+            start = offset + found + 1
+            if start > boundaries[-1]:
+                boundaries.append(start)
+            offset = start + chunk_size
+    boundaries.append(size)
+    return [(path, start, end) for start, end in zip(boundaries, boundaries[1:]) if end > start]
+
+
+def flush_counts(counts, tmp_dir, task_id):
+    """Append counts to this task's bucket files, sorted by key so the merge step only concatenates."""
+    records = np.empty(len(counts), dtype=COUNT_DTYPE)
+    for i, (packed, wdl) in enumerate(counts.items()):
+        records[i] = (packed >> 16, packed & 0xFFFF, wdl[0], wdl[1], wdl[2])
+    records.sort(order=("key", "move"))
+    buckets = records["key"] >> np.uint64(64 - BUCKET_BITS)
+    splits = np.searchsorted(buckets, np.arange(1, 1 << BUCKET_BITS), side="left")
+    for bucket, part in enumerate(np.split(records, splits)):
+        if len(part):
+            with open(os.path.join(tmp_dir, f"{bucket:03d}-{task_id:05d}.bin"), "ab") as f:
+                part.tofile(f)
+    counts.clear()
+
+
+def count_range(task):
+    """Worker: count opening moves in one byte range of a PGN file."""
+    task_id, path, start, end, max_ply, tmp_dir, flush_entries = task
+    with open(path, "rb") as f:
+        f.seek(start)
+        text = f.read(end - start).decode("utf-8", errors="replace")
+
+    handle = io.StringIO(text)
+    del text
+    counts = {}
+    games = positions = 0
+    while True:
+        game = chess.pgn.read_game(handle, Visitor=lambda: OpeningVisitor(max_ply))
+        if game is None:
+            break
+        result, moves = game
+        if result is None or moves is None:
+            continue  # Unfinished, variant or illegal game
+        games += 1
+        for key, move, turn in moves:
+            outcome = result if turn == chess.WHITE else -result
+            wdl = counts.setdefault((key << 16) | move, [0, 0, 0])
+            wdl[1 - outcome] += 1  # win -> 0, draw -> 1, loss -> 2
+            positions += 1
+        if len(counts) >= flush_entries:
+            flush_counts(counts, tmp_dir, task_id)
+    if counts:
+        flush_counts(counts, tmp_dir, task_id)
+    return games, positions
+
+
+def merge_bucket(paths, min_games, weights):
+    """Sum the partial counts of one bucket and turn them into Polyglot entries."""
+    records = np.concatenate([np.fromfile(p, dtype=COUNT_DTYPE) for p in paths])
+    order = np.lexsort((records["move"], records["key"]))
+    records = records[order]
+    new_group = np.ones(len(records), dtype=bool)
+    new_group[1:] = (records["key"][1:] != records["key"][:-1]) | (records["move"][1:] != records["move"][:-1])
+    starts = np.flatnonzero(new_group)
+    key, move = records["key"][starts], records["move"][starts]
+    win, draw, loss = (np.add.reduceat(records[name].astype(np.int64), starts) for name in ("win", "draw", "loss"))
+
+    keep = win + draw + loss >= min_games
+    key, move, win, draw, loss = key[keep], move[keep], win[keep], draw[keep], loss[keep]
+    weight = weights[0] * win + weights[1] * draw + weights[2] * loss
+
+    # Scale positions whose best move overflows 16 bits, keeping the ratios
+    if len(key):
+        key_starts = np.flatnonzero(np.r_[True, key[1:] != key[:-1]])
+        key_max = np.maximum.reduceat(weight, key_starts)
+        per_entry_max = np.repeat(key_max, np.diff(np.r_[key_starts, len(key)]))
+        weight = np.where(per_entry_max > 65535, weight * 65535 // np.maximum(per_entry_max, 1), weight)
+
+    keep = weight > 0
+    entries = np.zeros(int(keep.sum()), dtype=ENTRY_DTYPE)
+    entries["key"] = key[keep]
+    entries["move"] = move[keep]
+    entries["weight"] = weight[keep]
+    # Within a position, best moves first (what most Polyglot readers expect)
+    return entries[np.lexsort((-entries["weight"].astype(np.int64), entries["key"]))]
+
+
+def build_book(pgn_paths, out_path, max_ply=20, min_games=3, weights=(2, 1, 0), workers=None,
+               chunk_mb=32, flush_entries=1_000_000, tmp_dir=None):
+    start = time.time()
+    with tempfile.TemporaryDirectory(dir=tmp_dir, prefix="book-") as work_dir:
+        ranges = [r for path in pgn_paths for r in split_file(path, max(1, int(chunk_mb * (1 << 20))))]
+        tasks = [(i, path, lo, hi, max_ply, work_dir, flush_entries) for i, (path, lo, hi) in enumerate(ranges)]
+        print(f"[Book] {len(pgn_paths)} file(s), {len(tasks)} chunk(s)")
+
+        games = positions = 0
+        with Pool(workers) as pool:
+            for n, (g, p) in enumerate(pool.imap_unordered(count_range, tasks), 1):
+                games += g
+                positions += p
+                print(f"[Book] Chunk {n}/{len(tasks)}: {games:,} games, {positions:,} moves "
+                      f"({time.time() - start:.1f}s)")
+
+        written = 0
+        with open(out_path, "wb") as out:
+            for bucket in range(1 << BUCKET_BITS):
+                paths = sorted(glob.glob(os.path.join(work_dir, f"{bucket:03d}-*.bin")))
+                if paths:
+                    entries = merge_bucket(paths, min_games, weights)
+                    entries.tofile(out)
+                    written += len(entries)
+                    for p in paths:
+                        os.remove(p)
+
+    print(f"[Book] {games:,} games -> {written:,} entries in {out_path} ({time.time() - start:.1f}s)")
+    return written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build a Polyglot opening book from PGN files")
+    parser.add_argument("out", help="output .bin book")
+    parser.add_argument("pgn", nargs="+")
+    parser.add_argument("--max-ply", type=int, default=20, help="only count the first N plies of each game")
+    parser.add_argument("--min-games", type=int, default=3, help="drop moves played fewer times")
+    parser.add_argument("--win", type=int, default=2, help="weight of a win for the side that moved")
+    parser.add_argument("--draw", type=int, default=1)
+    parser.add_argument("--loss", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument("--chunk-mb", type=float, default=32, help="PGN bytes per worker task")
+    parser.add_argument("--flush-entries", type=int, default=1_000_000, help="counts held per worker before spilling")
+    parser.add_argument("--tmp", default=None, help="directory for temporary bucket files")
+    args = parser.parse_args(argv)
+    build_book(args.pgn, args.out, args.max_ply, args.min_games, (args.win, args.draw, args.loss),
+               args.workers, args.chunk_mb, args.flush_entries, args.tmp)
+
+
+if __name__ == "__main__":
+    main()
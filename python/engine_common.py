@@ -0,0 +1,37 @@
+"""
+Constants and small helpers shared by the engine front ends and tools.
+
+Kept free of heavy imports (like search_params.py): the engine host's parent
+process, the startup benchmark and the tuning tools can use them without
+loading the search, another tool's dependencies or the GUI worker.
+"""
+import io
+import contextlib
+
+BOOK_PATH = "baron30.bin"  # Polyglot book; can be built from PGN with book_builder.py
+
+# Self-play adjudication (selfplay.py, spsa.py): a game whose search scores stay
+# beyond +/-ADJUDICATE_SCORE for ADJUDICATE_PLIES plies in a row is decided
+ADJUDICATE_SCORE = 2000
+ADJUDICATE_PLIES = 8
+
+
+def percentile(values, q):
+    """The q-quantile (0 <= q <= 1) of values by nearest rank; 0 for no values."""
+    if not values:
+        return 0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def search_nodes(searcher, board, node_budget):
+    """Search at most node_budget nodes; returns (move, score for side to move)."""
+    last = {"score": 0}
+
+    def on_info(info):
+        last["score"] = info["score"]
+
+    searcher.info_callback = on_info
+    with contextlib.redirect_stdout(io.StringIO()):
+        move = searcher.iterative_deepening(board, max_depth=64, time_limit=None, node_limit=node_budget)
+    return move, last["score"]
@@ -0,0 +1,479 @@
+"""
+Multi-game engine host.
+
+Serves search requests for many concurrent games from a fixed pool of worker
+processes, instead of one AI (with its own threads and book handle) per game.
+Every game sticks to one worker, which keeps a warm Searcher per game (TT,
+killers, history) in an LRU of --games-per-worker entries, so CPU and memory
+stay bounded however many games are connected.
+
+Protocol: one JSON object per line, over stdin/stdout or a TCP socket (--port).
+    {"id": 1, "game": "g42", "fen": "<FEN>", "moves": ["e2e4", ...], "time": 1.0, "nodes": 20000, "depth": 12}
+        -> {"id": 1, "game": "g42", "move": "e7e5", "score": 12, "depth": 7, "nodes": 20512,
+            "book": false, "queue_ms": 0.4, "search_ms": 998.1}
+    {"id": 2, "cmd": "close", "game": "g42"}   drop the game's searcher
+    {"id": 3, "cmd": "stats"}                  queue latency percentiles, pending requests, cached games
+"fen" defaults to the start position; "time" and "nodes" are clamped to
+--max-time and --max-nodes. Requests beyond --max-pending are answered with
+{"error": "busy"}, malformed ones with {"error": "<reason>"}. A worker that
+dies is restarted and its pending requests are answered with an error.
+
+Health metrics (see metrics.py) are optional: --metrics-port serves them in
+the Prometheus text format on GET /metrics, --metrics-jsonl appends a JSON
+snapshot every --metrics-interval seconds. They cover searches in flight,
+queue depth, nodes/sec and time-to-bestmove histograms, TT occupancy and hit
+rate, book hit rate, see_cache size and per-worker RSS.
+
+With --cache PATH every worker shares the persistent analysis cache (see
+analysis_cache.py): results are written after each completed iteration, and a
+cached result at least --cache-depth deep answers a request without a search.
+
+Usage:
+    python engine_host.py [--port 8765] [--workers 4] [--games-per-worker 16] [--max-time 10] [--max-nodes N]
+                          [--metrics-port 9100] [--metrics-jsonl metrics.jsonl] [--metrics-interval 10]
+                          [--cache analysis_cache.sqlite] [--cache-depth 8]
+"""
+import os
+import sys
+import json
+import math
+import time
+import argparse
+import queue
+import threading
+import socketserver
+from collections import OrderedDict, deque
+from multiprocessing import Process, Queue
+
+import chess
+import chess.polyglot
+
+from engine_common import BOOK_PATH, percentile
+from analysis_cache import HIT_DEPTH
+from metrics import Metrics, NPS_BUCKETS, SECONDS_BUCKETS, JsonLinesWriter, current_rss_bytes, serve_http
+
+DEFAULT_TT_ENTRIES = 500_000  # Per game; the Searcher default is far too large for many games at once
+WORKER_CHECK_INTERVAL = 1.0   # Seconds between two checks for dead workers
+
+
+def parse_search(request, max_time, max_nodes):
+    """(fen, moves, time limit, node budget, max depth) of a search request; ValueError if malformed."""
+    fen = request.get("fen")
+    if fen is not None and not isinstance(fen, str):
+        raise ValueError("fen must be a string")
+    moves = request.get("moves", [])
+    if not isinstance(moves, list) or not all(isinstance(move, str) for move in moves):
+        raise ValueError("moves must be a list of UCI strings")
+    try:
+        time_limit = float(request.get("time", max_time))
+        node_budget = request.get("nodes") or max_nodes
+        node_budget = int(node_budget) if node_budget else None
+        max_depth = int(request.get("depth", 64))
+    except (TypeError, ValueError, OverflowError):
+        raise ValueError("time, nodes and depth must be numbers") from None
+    if not math.isfinite(time_limit):  # nan would never end the search: every comparison is False
+        raise ValueError("time must be a finite number")
+    time_limit = min(time_limit, max_time)
+    if max_nodes and node_budget:
+        node_budget = min(node_budget, max_nodes)
+    if time_limit <= 0 or max_depth < 1 or (node_budget is not None and node_budget < 1):
+        raise ValueError("time, nodes and depth must be positive")
+    return fen, moves, time_limit, node_budget, max_depth
+
+
+def _search(searcher, board, time_limit, node_budget, max_depth):
+    """Search within the time limit and at most node_budget nodes."""
+    last = {"score": 0, "depth": 0}
+
+    def on_info(info):
+        last["score"] = info["score"]
+        last["depth"] = info["depth"]
+
+    searcher.info_callback = on_info
+    move = searcher.iterative_deepening(board, max_depth=max_depth, time_limit=time_limit,
+                                        node_limit=node_budget or None)
+    return move, last["score"], last["depth"], searcher.nodes
+
+
+def _worker_main(index, requests, results, games_per_worker, tt_entries, book_path, cache_path, cache_depth):
+    """Worker process: one warm Searcher per game, least recently used games are dropped."""
+    from search import Searcher
+    from analysis_cache import AnalysisCache
+    sys.stdout = open(os.devnull, "w")  # Searcher logs must not mix with the protocol on stdout
+
+    book = None
+    if book_path and os.path.exists(book_path):
+        book = chess.polyglot.open_reader(book_path)
+    cache = AnalysisCache(cache_path) if cache_path else None  # One connection per worker (SQLite WAL)
+    searchers = OrderedDict()
+    evictions = 0
+    tt_probes = tt_hits = 0  # Over all searches of this worker, including evicted games
+
+    while True:
+        item = requests.get()
+        if item is None:
+            break
+        if item[0] == "close":
+            searchers.pop(item[1], None)
+            continue
+
+        seq, game, fen, moves, time_limit, node_budget, max_depth, received = item
+        started = time.time()
+        reply = {"queue_ms": round((started - received) * 1000, 2)}
+        try:
+            board = chess.Board(fen) if fen else chess.Board()
+            for uci in moves:
+                board.push_uci(uci)
+
+            searcher = searchers.pop(game, None)
+            if searcher is None:
+                searcher = Searcher()
+                searcher.tt.size = tt_entries
+                searcher.tt.count_probes()
+                searcher.analysis_cache = cache
+                searcher.cache_hit_depth = cache_depth
+            searchers[game] = searcher
+            while len(searchers) > games_per_worker:
+                searchers.popitem(last=False)
+                evictions += 1
+
+            entry = book.get(board) if book else None
+            if entry is not None:
+                reply.update(move=entry.move.uci(), score=0, depth=0, nodes=0, book=True)
+            else:
+                probes, hits = searcher.tt.probes, searcher.tt.hits
+                move, score, depth, nodes = _search(searcher, board, time_limit, node_budget, max_depth)
+                tt_probes += searcher.tt.probes - probes
+                tt_hits += searcher.tt.hits - hits
+                reply.update(move=move.uci() if move else None, score=int(score), depth=depth,
+                             nodes=nodes, book=False)
+        except Exception as e:  # One bad request must not take the worker (and its games) down
+            reply["error"] = str(e) or type(e).__name__
+        reply["search_ms"] = round((time.time() - started) * 1000, 2)
+        stats = {
+            "cached_games": len(searchers),
+            "evictions": evictions,
+            "tt_entries": sum(len(s.tt.table) for s in searchers.values()),
+            "see_cache": sum(len(s.see_cache) for s in searchers.values()),
+            "tt_probes": tt_probes,
+            "tt_hits": tt_hits,
+            "rss": current_rss_bytes(),
+        }
+        results.put((seq, index, reply, stats))
+
+
+class EngineHost:
+    def __init__(self, workers=None, games_per_worker=16, max_time=10.0, max_nodes=None,
+                 max_pending=1000, tt_entries=DEFAULT_TT_ENTRIES, book_path=BOOK_PATH,
+                 cache_path=None, cache_depth=HIT_DEPTH):
+        self.max_time = max_time
+        self.max_nodes = max_nodes
+        self.max_pending = max_pending
+        self.worker_args = (games_per_worker, tt_entries, book_path, cache_path, cache_depth)
+        if cache_path:
+            from analysis_cache import AnalysisCache
+            AnalysisCache(cache_path).close()  # Create the file and table once, before the workers open it
+        self.results = Queue()
+        workers = workers or os.cpu_count() or 1
+        self.requests = [None] * workers
+        self.processes = [None] * workers
+        for i in range(workers):
+            self._start_worker(i)
+
+        self.lock = threading.Lock()
+        self.seq = 0
+        self.pending = {}                    # seq -> (client id, game, reply callback, worker index)
+        self.restarts = 0
+        self.closing = False
+        self.load = [0] * len(self.processes)
+        self.assignments = OrderedDict()     # game -> worker index
+        self.max_assignments = len(self.processes) * games_per_worker * 4
+        self.worker_stats = [{} for _ in self.processes]  # Latest stats reported by each worker
+        self.queue_ms = deque(maxlen=10000)  # Recent queueing latencies for stats
+        self.completed = 0
+        self.metrics = self._create_metrics()
+        self.collector = threading.Thread(target=self._collect, daemon=True)
+        self.collector.start()
+
+    def _start_worker(self, index):
+        requests = Queue()
+        process = Process(target=_worker_main, daemon=True,
+                          args=(index, requests, self.results, *self.worker_args))
+        process.start()
+        self.requests[index] = requests
+        self.processes[index] = process
+
+    def _check_workers(self):
+        """Restart dead workers and answer their pending requests with an error."""
+        for index, process in enumerate(self.processes):
+            if process.is_alive() or self.closing:
+                continue
+            print(f"[Host] Worker {index} died (exit code {process.exitcode}), restarting", file=sys.stderr)
+            with self.lock:
+                lost = [(seq, item) for seq, item in self.pending.items() if item[3] == index]
+                for seq, _ in lost:
+                    del self.pending[seq]
+                self.load[index] = 0
+                self.worker_stats[index] = {}
+                for game in [game for game, worker in self.assignments.items() if worker == index]:
+                    del self.assignments[game]
+                self.restarts += 1
+                self._start_worker(index)
+            for _, (client_id, game, reply, _) in lost:
+                self.metrics.inc("errors_total", reason="worker")
+                try:
+                    reply({"id": client_id, "game": game, "error": "worker died"})
+                except OSError:
+                    pass
+
+    def _create_metrics(self):
+        metrics = Metrics()
+        metrics.describe("requests_total", "counter", "Completed search requests by source (book or search)")
+        metrics.describe("errors_total", "counter", "Requests answered with an error (busy, invalid or worker)")
+        metrics.describe("searches_in_flight", "gauge", "Workers currently searching")
+        metrics.describe("queue_depth", "gauge", "Requests waiting for a worker")
+        metrics.describe("search_seconds", "histogram", "Time from dequeue to bestmove", SECONDS_BUCKETS)
+        metrics.describe("queue_seconds", "histogram", "Time spent waiting in a worker queue", SECONDS_BUCKETS)
+        metrics.describe("nodes_per_second", "histogram", "Search speed per request", NPS_BUCKETS)
+        metrics.describe("book_hit_rate", "gauge", "Share of requests answered from the opening book")
+        metrics.describe("tt_hit_rate", "gauge", "Search and quiescence TT probes that found an entry")
+        metrics.describe("tt_entries", "gauge", "TT entries over all cached games")
+        metrics.describe("see_cache_entries", "gauge", "see_cache entries over all cached games")
+        metrics.describe("cached_games", "gauge", "Warm searchers kept by the workers")
+        metrics.describe("rss_bytes", "gauge", "Resident memory per process")
+        metrics.add_collector(self._collect_metrics)
+        return metrics
+
+    def _collect_metrics(self, metrics):
+        with self.lock:
+            busy = sum(1 for load in self.load if load)
+            metrics.set("searches_in_flight", busy)
+            metrics.set("queue_depth", sum(self.load) - busy)
+            stats = list(self.worker_stats)
+
+        def total(key):
+            return sum(s.get(key, 0) for s in stats)
+
+        probes = total("tt_probes")
+        metrics.set("tt_hit_rate", round(total("tt_hits") / probes, 4) if probes else 0.0)
+        requests = metrics.get("requests_total", source="book") + metrics.get("requests_total", source="search")
+        metrics.set("book_hit_rate", round(metrics.get("requests_total", source="book") / requests, 4)
+                    if requests else 0.0)
+        metrics.set("tt_entries", total("tt_entries"))
+        metrics.set("see_cache_entries", total("see_cache"))
+        metrics.set("cached_games", total("cached_games"))
+        metrics.set("rss_bytes", current_rss_bytes(), process="host")
+        for i, s in enumerate(stats):
+            if s:
+                metrics.set("rss_bytes", s["rss"], process=f"worker{i}")
+
+    def _worker_for(self, game):
+        """Sticky assignment: a game always goes to the same worker (new games to the least loaded one)."""
+        worker = self.assignments.pop(game, None)
+        if worker is None:
+            worker = min(range(len(self.load)), key=self.load.__getitem__)
+        self.assignments[game] = worker
+        while len(self.assignments) > self.max_assignments:
+            self.assignments.popitem(last=False)
+        return worker
+
+    def submit(self, request, reply):
+        """Queue a request; reply(dict) is called from the collector thread (or at once for errors/stats)."""
+        client_id = request.get("id")
+        command = request.get("cmd", "search")
+        if command == "stats":
+            reply({"id": client_id, **self.stats()})
+            return
+        game = str(request.get("game", ""))
+        if command == "close":
+            with self.lock:
+                worker = self.assignments.pop(game, None)
+            if worker is not None:
+                self.requests[worker].put(("close", game))
+            reply({"id": client_id, "game": game, "closed": worker is not None})
+            return
+        if command != "search":
+            reply({"id": client_id, "error": f"unknown command {command!r}"})
+            return
+
+        try:
+            fen, moves, time_limit, node_budget, max_depth = parse_search(request, self.max_time, self.max_nodes)
+        except ValueError as e:
+            self.metrics.inc("errors_total", reason="invalid")
+            reply({"id": client_id, "game": game, "error": str(e)})
+            return
+        with self.lock:
+            if len(self.pending) >= self.max_pending:
+                self.metrics.inc("errors_total", reason="busy")
+                reply({"id": client_id, "game": game, "error": "busy"})
+                return
+            self.seq += 1
+            seq = self.seq
+            worker = self._worker_for(game)
+            self.pending[seq] = (client_id, game, reply, worker)
+            self.load[worker] += 1
+            self.requests[worker].put((seq, game, fen, moves, time_limit, node_budget, max_depth, time.time()))
+
+    def _collect(self):
+        next_check = time.time() + WORKER_CHECK_INTERVAL
+        while True:
+            if time.time() >= next_check:
+                self._check_workers()
+                next_check = time.time() + WORKER_CHECK_INTERVAL
+            try:
+                item = self.results.get(timeout=WORKER_CHECK_INTERVAL)
+            except queue.Empty:
+                continue
+            except (EOFError, OSError):
+                break  # Shutting down
+            if item is None:
+                break
+            seq, worker, result, stats = item
+            with self.lock:
+                if seq not in self.pending:
+                    continue  # Already answered when its worker was found dead
+                client_id, game, reply, _ = self.pending.pop(seq)
+                self.load[worker] -= 1
+                self.worker_stats[worker] = stats
+                self.queue_ms.append(result["queue_ms"])
+                self.completed += 1
+            self._record(result)
+            try:
+                reply({"id": client_id, "game": game, **result})
+            except OSError:
+                pass  # Client went away
+
+    def _record(self, result):
+        metrics = self.metrics
+        metrics.observe("queue_seconds", result["queue_ms"] / 1000)
+        if "error" in result:
+            metrics.inc("errors_total", reason="invalid")
+            return
+        metrics.inc("requests_total", source="book" if result["book"] else "search")
+        if not result["book"]:
+            seconds = result["search_ms"] / 1000
+            metrics.observe("search_seconds", seconds)
+            if seconds > 0:
+                metrics.observe("nodes_per_second", result["nodes"] / seconds)
+
+    def stats(self):
+        with self.lock:
+            latencies = list(self.queue_ms)
+            return {
+                "workers": len(self.processes),
+                "pending": len(self.pending),
+                "completed": self.completed,
+                "worker_load": list(self.load),
+                "worker_restarts": self.restarts,
+                "cached_games": sum(s.get("cached_games", 0) for s in self.worker_stats),
+                "evictions": sum(s.get("evictions", 0) for s in self.worker_stats),
+                "queue_ms_p50": percentile(latencies, 0.5),
+                "queue_ms_p95": percentile(latencies, 0.95),
+                "queue_ms_max": max(latencies, default=0),
+            }
+
+    def close(self):
+        self.closing = True
+        for requests in self.requests:
+            requests.put(None)
+        for process in self.processes:
+            process.join(timeout=5)
+        self.results.put(None)
+
+
+def handle_lines(host, lines, write):
+    """Feed JSON lines to the host; write(str) must be thread-safe."""
+    def reply(response):
+        write(json.dumps(response) + "\n")
+
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            request = json.loads(line)
+        except json.JSONDecodeError as e:
+            reply({"error": f"invalid JSON: {e}"})
+            continue
+        if not isinstance(request, dict):
+            reply({"error": "request must be a JSON object"})
+            continue
+        host.submit(request, reply)
+
+
+def serve_stdio(host):
+    lock = threading.Lock()
+    out = sys.stdout
+
+    def write(text):
+        with lock:
+            out.write(text)
+            out.flush()
+
+    handle_lines(host, sys.stdin, write)
+    # Wait for the remaining replies before exiting
+    while host.stats()["pending"]:
+        time.sleep(0.01)
+
+
+def serve_tcp(host, port, bind="127.0.0.1"):
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            lock = threading.Lock()
+
+            def write(text):
+                with lock:
+                    self.wfile.write(text.encode())
+                    self.wfile.flush()
+
+            handle_lines(host, (line.decode("utf-8", errors="replace") for line in self.rfile), write)
+
+    socketserver.ThreadingTCPServer.allow_reuse_address = True
+    with socketserver.ThreadingTCPServer((bind, port), Handler) as server:
+        server.daemon_threads = True
+        print(f"[Host] Listening on {bind}:{port} with {len(host.processes)} workers", file=sys.stderr)
+        server.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve search requests for many games from one process pool")
+    parser.add_argument("--port", type=int, default=None, help="listen on TCP instead of stdin/stdout")
+    parser.add_argument("--bind", default="127.0.0.1")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument("--games-per-worker", type=int, default=16, help="warm searchers kept per worker")
+    parser.add_argument("--max-time", type=float, default=10.0, help="upper bound for a request's time")
+    parser.add_argument("--max-nodes", type=int, default=None, help="upper bound for a request's nodes")
+    parser.add_argument("--max-pending", type=int, default=1000, help="queued requests before answering busy")
+    parser.add_argument("--tt-entries", type=int, default=DEFAULT_TT_ENTRIES, help="TT entries per game")
+    parser.add_argument("--book", default=BOOK_PATH)
+    parser.add_argument("--cache", default=None, help="persistent analysis cache file shared by the workers")
+    parser.add_argument("--cache-depth", type=int, default=HIT_DEPTH,
+                        help="cached results at least this deep answer a request without a search")
+    parser.add_argument("--metrics-port", type=int, default=None, help="serve Prometheus metrics on GET /metrics")
+    parser.add_argument("--metrics-jsonl", default=None, help="append metrics snapshots to this file")
+    parser.add_argument("--metrics-interval", type=float, default=10.0, help="seconds between JSON snapshots")
+    args = parser.parse_args(argv)
+
+    host = EngineHost(args.workers, args.games_per_worker, args.max_time, args.max_nodes,
+                      args.max_pending, args.tt_entries, args.book, args.cache, args.cache_depth)
+    writer = None
+    if args.metrics_port is not None:
+        serve_http(host.metrics, args.metrics_port, args.bind)
+        print(f"[Host] Metrics on http://{args.bind}:{args.metrics_port}/metrics", file=sys.stderr)
+    if args.metrics_jsonl:
+        writer = JsonLinesWriter(host.metrics, args.metrics_jsonl, args.metrics_interval)
+    try:
+        if args.port is not None:
+            serve_tcp(host, args.port, args.bind)
+        else:
+            serve_stdio(host)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if writer:
+            writer.close()
+        host.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+"""
+EnginePool: batch analysis over K engines.
+
+Positions are taken lazily from any iterable of FEN strings, chess.Board
+objects or chess.pgn.Game objects (every position before a mainline move), at
+most max_pending at a time, so arbitrarily large inputs stream through in
+bounded memory. Results are yielded as they complete, not in input order.
+
+Backends:
+    mode="searcher"  K worker processes each running an in-process Searcher
+    mode="uci"       K instances of a UCI engine (default: this project's uci.py)
+
+    pool = EnginePool(workers=4, time_limit=0.5)
+    for result in pool.analyse(read_games("games.pgn")):
+        print(result["game"], result["ply"], result["move"], result["score"])
+
+    async for result in pool.analyse_async(fens): ...
+
+Each result is a dict: game, ply, fen, move, score (centipawns for the side to
+move; mates use Searcher's mate scores), depth, nodes, pv, time.
+
+Usage:
+    python engine_pool.py games.pgn [--workers K] [--time 0.5] [--depth N] [--uci [command ...]]
+"""
+import io
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import contextlib
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
+
+import chess
+import chess.pgn
+import chess.engine
+
+from search import Searcher, IMMEDIATE_MATE_SCORE
+
+UCI_COMMAND = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "uci.py")]
+
+_SEARCHER = None
+
+
+def _init_worker():
+    global _SEARCHER
+    _SEARCHER = Searcher()
+
+
+def _search_board(board, time_limit, max_depth, node_budget):
+    """Worker: search one position with the process's Searcher."""
+    searcher = _SEARCHER
+    last = {"score": 0, "depth": 0, "pv": []}
+
+    def on_info(info):
+        last.update(score=info["score"], depth=info["depth"], pv=[m.uci() for m in info["pv"]])
+
+    start = time.time()
+    searcher.info_callback = on_info
+    with contextlib.redirect_stdout(io.StringIO()):
+        move = searcher.iterative_deepening(board, max_depth=max_depth, time_limit=time_limit,
+                                            node_limit=node_budget or None)
+    return {
+        "move": move.uci() if move else None,
+        "score": int(last["score"]),
+        "depth": last["depth"],
+        "nodes": searcher.nodes,
+        "pv": last["pv"],
+        "time": time.time() - start,
+    }
+
+
+def read_games(path):
+    """Stream the games of a PGN file."""
+    with open(path, encoding="utf-8", errors="replace") as f:
+        while True:
+            game = chess.pgn.read_game(f)
+            if game is None:
+                break
+            yield game
+
+
+def iter_positions(items):
+    """(game index, ply, board) for every position of the input items."""
+    for index, item in enumerate(items):
+        if isinstance(item, chess.pgn.Game):
+            board = item.board()
+            if board.uci_variant != "chess":
+                continue  # Variants are not supported by the engine
+            for move in item.mainline_moves():
+                yield index, board.ply(), board.copy()
+                board.push(move)
+        elif isinstance(item, chess.Board):
+            yield index, item.ply(), item.copy()
+        else:
+            board = chess.Board(item)
+            yield index, board.ply(), board
+
+
+class EnginePool:
+    def __init__(self, workers=None, mode="searcher", time_limit=1.0, max_depth=None, node_budget=None,
+                 max_pending=None, uci_command=None):
+        if mode not in ("searcher", "uci"):
+            raise ValueError(f"unknown mode {mode!r}")
+        self.workers = workers or os.cpu_count() or 1
+        self.mode = mode
+        self.time_limit = time_limit
+        self.max_depth = max_depth
+        self.node_budget = node_budget
+        self.max_pending = max_pending or 2 * self.workers
+        self.uci_command = uci_command or UCI_COMMAND
+
+    def analyse(self, items):
+        """Synchronous interface: a generator of results as they complete."""
+        loop = asyncio.new_event_loop()
+        results = self.analyse_async(items)
+        try:
+            while True:
+                try:
+                    yield loop.run_until_complete(results.__anext__())
+                except StopAsyncIteration:
+                    break
+        finally:
+            loop.run_until_complete(results.aclose())
+            loop.close()
+
+    async def analyse_async(self, items):
+        """Asynchronous interface: an async generator of results as they complete."""
+        async with self._backend() as run:
+            positions = iter_positions(items)
+            pending = set()
+            exhausted = False
+            try:
+                while True:
+                    # Back-pressure: only read more input while fewer than max_pending are in flight
+                    while not exhausted and len(pending) < self.max_pending:
+                        item = next(positions, None)
+                        if item is None:
+                            exhausted = True
+                        else:
+                            pending.add(asyncio.ensure_future(self._run(run, *item)))
+                    if not pending:
+                        break
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        yield task.result()
+            finally:
+                # Consumer stopped early or a search failed: drop what is still in flight
+                for task in pending:
+                    task.cancel()
+                await asyncio.gather(*pending, return_exceptions=True)
+
+    async def _run(self, run, game, ply, board):
+        result = await run(board, game)
+        return {"game": game, "ply": ply, "fen": board.fen(), **result}
+
+    @contextlib.asynccontextmanager
+    async def _backend(self):
+        """Yields an async function (board, game index) -> result dict running on one of the K engines."""
+        if self.mode == "searcher":
+            loop = asyncio.get_running_loop()
+            executor = ProcessPoolExecutor(self.workers, initializer=_init_worker)
+            time_limit = self.time_limit if self.time_limit is not None else float("inf")
+
+            async def run(board, game):
+                return await loop.run_in_executor(
+                    executor, _search_board, board, time_limit, self.max_depth or 64, self.node_budget)
+            try:
+                yield run
+            finally:
+                executor.shutdown(cancel_futures=True)
+            return
+
+        engines = asyncio.Queue()
+        started = []
+        try:
+            for _ in range(self.workers):
+                _, engine = await chess.engine.popen_uci(self.uci_command, stderr=subprocess.DEVNULL)
+                started.append(engine)
+                engines.put_nowait(engine)
+            limit = chess.engine.Limit(time=self.time_limit, depth=self.max_depth, nodes=self.node_budget)
+
+            async def run(board, game):
+                engine = await engines.get()
+                try:
+                    start = time.time()
+                    info = await engine.analyse(board, limit, game=game)  # ucinewgame between different games
+                finally:
+                    engines.put_nowait(engine)
+                score = info.get("score")
+                pv = info.get("pv", [])
+                return {
+                    "move": pv[0].uci() if pv else None,
+                    "score": score.relative.score(mate_score=IMMEDIATE_MATE_SCORE) if score else 0,
+                    "depth": info.get("depth", 0),
+                    "nodes": info.get("nodes", 0),
+                    "pv": [m.uci() for m in pv],
+                    "time": time.time() - start,
+                }
+            yield run
+        finally:
+            for engine in started:
+                with contextlib.suppress(chess.engine.EngineError, asyncio.TimeoutError):
+                    await engine.quit()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Analyse every position of a PGN file on K engines")
+    parser.add_argument("pgn")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--time", type=float, default=0.5, help="seconds per position")
+    parser.add_argument("--depth", type=int, default=None)
+    parser.add_argument("--nodes", type=int, default=None)
+    parser.add_argument("--uci", nargs="*", default=None, help="use UCI engines (default command: uci.py)")
+    args = parser.parse_args(argv)
+
+    mode = "uci" if args.uci is not None else "searcher"
+    pool = EnginePool(args.workers, mode, args.time, args.depth, args.nodes, uci_command=args.uci or None)
+    start = time.time()
+    count = 0
+    for result in pool.analyse(read_games(args.pgn)):
+        print(json.dumps(result), flush=True)
+        count += 1
+    print(f"[Pool] {count} positions in {time.time() - start:.1f}s", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""
+EPD tactical test-suite runner.
+
+Runs Searcher.iterative_deepening on every position of an EPD file in a process
+pool and reports how many positions were solved (bm / am opcodes), together
+with time-, node- and depth-to-solution statistics.
+
+Usage:
+    python epd_runner.py suite.epd [--time 5] [--depth 64] [--nodes N] [--workers K] [--json out.json]
+"""
+import io
+import os
+import json
+import time
+import argparse
+import contextlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import chess
+
+from search import Searcher
+from engine_common import percentile
+
+
+def load_epd(path):
+    """Read an EPD file into a list of (epd line, id) pairs; blank and comment lines are skipped."""
+    positions = []
+    with open(path) as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            _, ops = chess.Board.from_epd(line)
+            positions.append((line, ops.get("id", f"{os.path.basename(path)}:{line_no}")))
+    return positions
+
+
+def is_solution(move, best_moves, avoid_moves):
+    if move is None:
+        return False
+    if best_moves and move not in best_moves:
+        return False
+    return move not in avoid_moves
+
+
+def solve_position(epd, position_id, time_limit, max_depth, node_limit):
+    """Search one EPD position and return its result record (runs in a worker process)."""
+    board, ops = chess.Board.from_epd(epd)
+    best_moves = ops.get("bm", [])
+    avoid_moves = ops.get("am", [])
+
+    searcher = Searcher()
+    iterations = []
+
+    def on_info(info):
+        iterations.append((info["depth"], info["move"], info["nodes"], info["time"]))
+
+    searcher.info_callback = on_info
+    start = time.time()
+    with contextlib.redirect_stdout(io.StringIO()):
+        move = searcher.iterative_deepening(board, max_depth=max_depth, time_limit=time_limit,
+                                            node_limit=node_limit or None)
+    elapsed = time.time() - start
+
+    solved = is_solution(move, best_moves, avoid_moves)
+    # The solution counts from the first iteration after which the best move never changed again
+    solution = None
+    if solved:
+        for depth, iteration_move, nodes, t in reversed(iterations):
+            if not is_solution(iteration_move, best_moves, avoid_moves):
+                break
+            solution = {"depth": depth, "nodes": nodes, "time": t}
+
+    return {
+        "id": position_id,
+        "move": board.san(move) if move else None,
+        "bm": [board.san(m) for m in best_moves],
+        "am": [board.san(m) for m in avoid_moves],
+        "solved": solved,
+        "depth": iterations[-1][0] if iterations else 0,
+        "nodes": searcher.nodes,
+        "time": elapsed,
+        "solution": solution,
+    }
+
+
+def summarize(results):
+    solved = [r for r in results if r["solved"]]
+    times = [r["solution"]["time"] for r in solved if r["solution"]]
+    nodes = [r["solution"]["nodes"] for r in solved if r["solution"]]
+    depths = [r["solution"]["depth"] for r in solved if r["solution"]]
+    return {
+        "positions": len(results),
+        "solved": len(solved),
+        "total_nodes": sum(r["nodes"] for r in results),
+        "total_time": sum(r["time"] for r in results),
+        "time_to_solution": {q: percentile(times, q) for q in (0.25, 0.5, 0.75, 0.9)},
+        "nodes_to_solution": {q: percentile(nodes, q) for q in (0.25, 0.5, 0.75, 0.9)},
+        "depth_to_solution": {q: percentile(depths, q) for q in (0.25, 0.5, 0.75, 0.9)},
+    }
+
+
+def run_suite(path, time_limit=5.0, max_depth=64, node_limit=None, workers=None, progress=True):
+    positions = load_epd(path)
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(solve_position, epd, position_id, time_limit, max_depth, node_limit)
+                   for epd, position_id in positions]
+        for future in as_completed(futures):
+            result = future.result()
+            results.append(result)
+            if progress:
+                status = "✅" if result["solved"] else "❌"
+                found = result["solution"]
+                detail = f"d{found['depth']} {found['nodes']:,} nodes {found['time']:.2f}s" if found else "-"
+                print(f"{status} [{len(results)}/{len(positions)}] {result['id']}: {result['move']} "
+                      f"(bm {' '.join(result['bm']) or '-'}, am {' '.join(result['am']) or '-'}) "
+                      f"depth {result['depth']} | {detail}")
+    order = {position_id: i for i, (_, position_id) in enumerate(positions)}
+    results.sort(key=lambda r: order[r["id"]])
+    return results, summarize(results)
+
+
+def print_summary(summary):
+    print("\n===== EPD SUITE REPORT =====")
+    print(f"Solved: {summary['solved']}/{summary['positions']}")
+    print(f"Nodes : {summary['total_nodes']:,} in {summary['total_time']:.2f}s (sum over positions)")
+    print(f"{'Percentile':<12} {'Time (s)':<12} {'Nodes':<14} {'Depth':<6}")
+    for q in (0.25, 0.5, 0.75, 0.9):
+        print(f"{int(q * 100):<12} {summary['time_to_solution'][q]:<12.2f} "
+              f"{summary['nodes_to_solution'][q]:<14,} {summary['depth_to_solution'][q]:<6}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run an EPD tactical test suite")
+    parser.add_argument("epd")
+    parser.add_argument("--time", type=float, default=5.0, help="time limit per position (seconds)")
+    parser.add_argument("--depth", type=int, default=64, help="maximum depth per position")
+    parser.add_argument("--nodes", type=int, default=None, help="node limit per position")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument("--json", default=None, help="write per-position results and summary to this file")
+    args = parser.parse_args(argv)
+
+    results, summary = run_suite(args.epd, args.time, args.depth, args.nodes, args.workers)
+    print_summary(summary)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"summary": summary, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
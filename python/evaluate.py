@@ -1,115 +1,6 @@
 import chess
-import chess
-import numpy as np
-
-# Define piece values
-piece_values = {
-    chess.PAWN: 100,
-    chess.KNIGHT: 320,
-    chess.BISHOP: 330,
-    chess.ROOK: 500,
-    chess.QUEEN: 900,
-    chess.KING: 20000
-}
-
-# Define piece-square tables
-PAWN_TABLE = [
-    0,  0,  0,  0,  0,  0,  0,  0,
-    50, 50, 50, 50, 50, 50, 50, 50,
-    10, 10, 20, 30, 30, 20, 10, 10,
-    5,  5, 10, 25, 25, 10,  5,  5,
-    0,  0,  0, 20, 20,  0,  0,  0,
-    5, -5,-10,  0,  0,-10, -5,  5,
-    5, 10, 10,-20,-20, 10, 10,  5,
-    0,  0,  0,  0,  0,  0,  0,  0
-]
-
-PAWN_ENDGAME_TABLE = [
-    0,  0,  0,  0,  0,  0,  0,  0,
-    80, 80, 80, 80, 80, 80, 80, 80,
-    50, 50, 50, 50, 50, 50, 50, 50,
-    30, 30, 30, 30, 30, 30, 30, 30,
-    20, 20, 20, 20, 20, 20, 20, 20,
-    10, 10, 10, 10, 10, 10, 10, 10,
-    10, 10, 10, 10, 10, 10, 10, 10,
-    0,  0,  0,  0,  0,  0,  0,  0
-]
+from bitbase import get_bitbases, WIN, DRAW
 
-KNIGHT_TABLE = [
-    -50,-40,-30,-30,-30,-30,-40,-50,
-    -40,-20,  0,  0,  0,  0,-20,-40,
-    -30,  0, 10, 15, 15, 10,  0,-30,
-    -30,  5, 15, 20, 20, 15,  5,-30,
-    -30,  0, 15, 20, 20, 15,  0,-30,
-    -30,  5, 10, 15, 15, 10,  5,-30,
-    -40,-20,  0,  5,  5,  0,-20,-40,
-    -50,-40,-30,-30,-30,-30,-40,-50
-]
-
-BISHOP_TABLE = [
-    -20,-10,-10,-10,-10,-10,-10,-20,
-    -10,  0,  0,  0,  0,  0,  0,-10,
-    -10,  0, 10, 10, 10, 10,  0,-10,
-    -10,  5,  5, 10, 10,  5,  5,-10,
-    -10,  0,  5, 10, 10,  5,  0,-10,
-    -10,  5,  5,  5,  5,  5,  5,-10,
-    -10,  0,  5,  0,  0,  5,  0,-10,
-    -20,-10,-10,-10,-10,-10,-10,-20
-]
-
-ROOK_TABLE = [
-    0,  0,  0,  0,  0,  0,  0,  0,
-    5, 10, 10, 10, 10, 10, 10,  5,
-    -5,  0,  0,  0,  0,  0,  0, -5,
-    -5,  0,  0,  0,  0,  0,  0, -5,
-    -5,  0,  0,  0,  0,  0,  0, -5,
-    -5,  0,  0,  0,  0,  0,  0, -5,
-    -5,  0,  0,  0,  0,  0,  0, -5,
-    0,  0,  0,  5,  5,  0,  0,  0
-]
-
-QUEEN_TABLE = [
-    -20,-10,-10, -5, -5,-10,-10,-20,
-    -10,  0,  0,  0,  0,  0,  0,-10,
-    -10,  0,  5,  5,  5,  5,  0,-10,
-    -5,  0,  5,  5,  5,  5,  0, -5,
-    0,  0,  5,  5,  5,  5,  0, -5,
-    -10,  5,  5,  5,  5,  5,  0,-10,
-    -10,  0,  5,  0,  0,  0,  0,-10,
-    -20,-10,-10, -5, -5,-10,-10,-20
-]
-
-KING_START = [
-    -30,-40,-40,-50,-50,-40,-40,-30,
-    -30,-40,-40,-50,-50,-40,-40,-30,
-    -30,-40,-40,-50,-50,-40,-40,-30,
-    -30,-40,-40,-50,-50,-40,-40,-30,
-    -20,-30,-30,-40,-40,-30,-30,-20,
-    -10,-20,-20,-20,-20,-20,-20,-10,
-    20, 20,  0,  0,  0,  0, 20, 20,
-    20, 30, 10,  0,  0, 10, 30, 20
-]
-
-KING_END = [
-    -50,-40,-30,-20,-20,-30,-40,-50,
-    -30,-20,-10,  0,  0,-10,-20,-30,
-    -30,-10, 20, 30, 30, 20,-10,-30,
-    -30,-10, 30, 40, 40, 30,-10,-30,
-    -30,-10, 30, 40, 40, 30,-10,-30,
-    -30,-10, 20, 30, 30, 20,-10,-30,
-    -30,-30,  0,  0,  0,  0,-30,-30,
-    -50,-30,-30,-30,-30,-30,-30,-50
-]
-
-# Convert piece-square tables to numpy arrays for faster access
-PAWN_TABLE = np.array(PAWN_TABLE)
-PAWN_ENDGAME_TABLE = np.array(PAWN_ENDGAME_TABLE)
-KNIGHT_TABLE = np.array(KNIGHT_TABLE)
-BISHOP_TABLE = np.array(BISHOP_TABLE)
-ROOK_TABLE = np.array(ROOK_TABLE)
-QUEEN_TABLE = np.array(QUEEN_TABLE)
-KING_START = np.array(KING_START)
-KING_END = np.array(KING_END)
 # --- Piece-square tables from SebLague's PieceSquareTable.cs ---
 PAWN_TABLE = [
     0, 0, 0, 0, 0, 0, 0, 0,
@@ -217,6 +108,16 @@ piece_values = {
     chess.KING: 0
 }
 
+# Bảng đã tinh chỉnh bằng texel.py (nếu có) thay thế bảng mặc định ở trên
+try:
+    from tuned_eval import piece_values, piece_square_tables
+except ImportError:
+    pass
+
+def pst_index(sq, color):
+    """Index into a piece-square table: tables are laid out from white's point of view, rank 8 first."""
+    return chess.square_mirror(sq) if color == chess.WHITE else sq
+
 def get_material_info(board, color):
     pieces = board.piece_map()
     value = 0
@@ -238,7 +139,8 @@ def evaluate_piece_square(board, color, endgame_t):
         pc = board.piece_at(sq)
         if pc and pc.color == color:
             t_early, t_end = piece_square_tables[pc.piece_type]
-            table_val = t_early[sq] * (1 - endgame_t) + t_end[sq] * endgame_t
+            idx = pst_index(sq, color)
+            table_val = t_early[idx] * (1 - endgame_t) + t_end[idx] * endgame_t
             value += table_val
     return value
 
@@ -292,10 +194,29 @@ def mop_up_eval(board, color, my_mat, opp_mat, endgame_t):
         return int(((14 - dist) * 4 + center_dist * 10) * endgame_t)
     return 0
 
+# Score for a position the bitbases prove won: above any material balance, below mate scores
+KNOWN_WIN = 20000
+
+def evaluate_known_win(board, color):
+    """Known-win score plus progress terms (king drive, pawn advance) so the search keeps converting."""
+    my_mat, _, _ = get_material_info(board, color)
+    progress = 0
+    for sq in board.pieces(chess.PAWN, color):
+        progress += 20 * (chess.square_rank(sq) if color == chess.WHITE else 7 - chess.square_rank(sq))
+    return KNOWN_WIN + my_mat + progress + mop_up_eval(board, color, my_mat, 0, 1)
+
 def evaluate_board(board):
     if board.is_checkmate():
         return -999999 if board.turn == chess.WHITE else 999999
 
+    # Endgame bitbases (KQK, KRK, KPK): exact win/draw/loss in O(1)
+    wdl = get_bitbases().probe(board)
+    if wdl is not None:
+        if wdl == DRAW:
+            return 0
+        score = evaluate_known_win(board, board.turn if wdl == WIN else not board.turn)
+        return score if wdl == WIN else -score
+
     white_mat, white_end, white_count = get_material_info(board, chess.WHITE)
     black_mat, black_end, black_count = get_material_info(board, chess.BLACK)
 
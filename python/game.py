@@ -1,26 +1,36 @@
 import pygame
 import chess
-import copy
 from ai import AI
+from history import PositionHistory, search_copy
+
+# Sự kiện pygame do luồng engine gửi về
+AI_MOVE_EVENT = pygame.event.custom_type()
+AI_INFO_EVENT = pygame.event.custom_type()
 
 class Game:
     def __init__(self):
         self.board = chess.Board()
-        self.view_board = self.board.copy()  # Khởi tạo view_board đồng bộ
+        self.history = PositionHistory(self.board)  # Lưu thế cờ theo từng nước để xem lại O(1)
+        self.view_board = self.history.board_at(0)  # Khởi tạo view_board đồng bộ
         self.history_index = 0
         self.selected_square = None
         self.ai_thinking = False
         self.ai_color = chess.BLACK
-        self.ai_move_time = 0
+        self.ai_request = None
+        self.ai_info = None  # Thông tin tìm kiếm mới nhất (độ sâu, điểm theo phía trắng, PV) cho thanh đánh giá
         self.clock = pygame.time.Clock()
         self.running = True
         self.ai = AI()
         print("[Debug] Khởi tạo Game instance")  # Debug để phát hiện khởi tạo lại
 
     def handle_event(self, event):
-        if not self.running:
-            return  # Không xử lý sự kiện nếu trò chơi kết thúc
-        if event.type == pygame.MOUSEBUTTONDOWN and not self.ai_thinking:
+        if not self.running and event.type != pygame.KEYDOWN:
+            return  # Trò chơi đã kết thúc: chỉ còn nhận phím (xem lại, R để chơi ván mới)
+        if event.type == AI_MOVE_EVENT:
+            self.on_ai_move(event)
+        elif event.type == AI_INFO_EVENT:
+            self.on_ai_info(event)
+        elif event.type == pygame.MOUSEBUTTONDOWN and not self.ai_thinking:
             x, y = pygame.mouse.get_pos()
             col, row = x // 75, y // 75
             square = chess.square(col, 7 - row)
@@ -30,28 +40,39 @@ class Game:
             else:
                 move = self.create_move(self.selected_square, square)
                 if move in self.board.legal_moves:
-                    self.board.push(move)
-                    self.history_index = len(self.board.move_stack)
-                    self.view_board = self.board.copy()  # Đồng bộ view_board
-                    self.check_game_end()
-                    if not self.board.turn and not self.ai_thinking:
-                        self.ai_thinking = True
-                        self.ai_move_time = pygame.time.get_ticks()
+                    self.push_move(move)
+                    if self.running and self.board.turn == self.ai_color and not self.ai_thinking:
+                        self.start_ai_move()
                 self.selected_square = None
 
         elif event.type == pygame.KEYDOWN:
             if event.key == pygame.K_LEFT:
-                self.history_index = max(0, self.history_index - 1)
-                self.update_view_board()
+                self.go_to_ply(self.history_index - 1)
             elif event.key == pygame.K_RIGHT:
-                self.history_index = min(len(self.board.move_stack), self.history_index + 1)
-                self.update_view_board()
+                self.go_to_ply(self.history_index + 1)
+            elif event.key == pygame.K_HOME:
+                self.go_to_ply(0)
+            elif event.key == pygame.K_END:
+                self.go_to_ply(len(self.history))
+            elif event.key == pygame.K_r:
+                self.restart()
+
+    def go_to_ply(self, ply):
+        """Nhảy tới bước bất kỳ trong lịch sử ván đấu"""
+        self.history_index = max(0, min(len(self.history), ply))
+        self.update_view_board()
 
     def update_view_board(self):
-        """Cập nhật view_board dựa trên history_index"""
-        self.view_board = chess.Board()
-        for move in self.board.move_stack[:self.history_index]:
-            self.view_board.push(move)
+        """Cập nhật view_board dựa trên history_index (lấy từ PositionHistory, không chơi lại từ đầu)"""
+        self.view_board = self.history.board_at(self.history_index)
+
+    def push_move(self, move):
+        """Đi một nước trên bàn cờ chính và đồng bộ lịch sử, view_board."""
+        self.board.push(move)
+        self.history.push(self.board)
+        self.history_index = len(self.board.move_stack)
+        self.view_board = self.history.board_at(self.history_index)  # Đồng bộ view_board
+        self.check_game_end()
 
     def create_move(self, from_sq, to_sq):
         piece = self.board.piece_at(from_sq)
@@ -61,12 +82,48 @@ class Game:
                 return chess.Move(from_sq, to_sq, promotion=chess.QUEEN)
         return chess.Move(from_sq, to_sq)
 
-    def update_ai_move(self):
-        if self.running and not self.board.turn and self.ai_thinking and pygame.time.get_ticks() - self.ai_move_time >= 1000:
-            board_copy = copy.deepcopy(self.board)
-            self.ai.update_ai_move(self, board_copy)
-            self.view_board = self.board.copy()  # Đồng bộ view_board sau nước đi AI
-            self.ai_thinking = False
+    def start_ai_move(self):
+        """Gửi thế cờ hiện tại cho luồng engine; kết quả quay về dưới dạng AI_MOVE_EVENT."""
+        self.ai_thinking = True
+        board_copy = search_copy(self.board)  # Chỉ sao chép các nước cần cho phát hiện lặp lại
+        self.ai_request = self.ai.request_move(
+            board_copy,
+            on_result=lambda request_id, move: pygame.event.post(
+                pygame.event.Event(AI_MOVE_EVENT, request_id=request_id, move=move)),
+            on_info=lambda request_id, info: pygame.event.post(
+                pygame.event.Event(AI_INFO_EVENT, request_id=request_id, info=info)),
+        )
+
+    def on_ai_move(self, event):
+        if event.request_id != self.ai_request:
+            return  # Kết quả của yêu cầu đã bị huỷ
+        self.ai_thinking = False
+        self.ai_request = None
+        if event.move and event.move in self.board.legal_moves:
+            self.push_move(event.move)
+        else:
+            print(f"[Lỗi] AI trả về nước đi không hợp lệ: {event.move}")
+
+    def on_ai_info(self, event):
+        if event.request_id != self.ai_request:
+            return
+        info = dict(event.info)
+        if self.board.turn == chess.BLACK:
+            info["score"] = -info["score"]  # Quy về góc nhìn của bên trắng
+        self.ai_info = info
+
+    def restart(self):
+        """Bắt đầu ván mới, huỷ tìm kiếm đang chạy."""
+        self.ai.cancel()
+        self.running = True
+        self.ai_request = None
+        self.ai_thinking = False
+        self.ai_info = None
+        self.board = chess.Board()
+        self.history = PositionHistory(self.board)
+        self.history_index = 0
+        self.view_board = self.history.board_at(0)
+        self.selected_square = None
 
     def check_game_end(self):
         if self.board.is_checkmate():
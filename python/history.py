@@ -0,0 +1,70 @@
+import chess
+from collections import OrderedDict
+
+
+class PositionHistory:
+    """
+    Per-ply position records of a game, for constant-time history navigation.
+
+    Every ply is stored as a FEN string, so rebuilding the position at any ply
+    costs the same no matter how long the game is. Recently visited positions
+    are kept as ready-made chess.Board objects in a small LRU cache, which makes
+    stepping back and forth through the game free after the first visit.
+
+    Boards returned by board_at() are shared with the cache and must be treated
+    as read-only.
+    """
+
+    def __init__(self, board=None, cache_size=64):
+        board = board if board is not None else chess.Board()
+        self.fens = [board.fen()]
+        self.moves = []
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+
+    def __len__(self):
+        """Number of plies played (the last valid ply index)."""
+        return len(self.moves)
+
+    def push(self, board):
+        """Record the position reached after the last move pushed on board."""
+        self.moves.append(board.peek())
+        self.fens.append(board.fen())
+
+    def truncate(self, ply):
+        """Drop every record after ply (e.g. when a move is taken back)."""
+        del self.moves[ply:]
+        del self.fens[ply + 1:]
+        for key in [k for k in self.cache if k > ply]:
+            del self.cache[key]
+
+    def fen_at(self, ply):
+        return self.fens[ply]
+
+    def move_at(self, ply):
+        """The move that led to ply (None for the start position)."""
+        return self.moves[ply - 1] if ply > 0 else None
+
+    def board_at(self, ply):
+        ply = max(0, min(ply, len(self.moves)))
+        board = self.cache.get(ply)
+        if board is not None:
+            self.cache.move_to_end(ply)
+            return board
+
+        board = chess.Board(self.fens[ply])
+        self.cache[ply] = board
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        return board
+
+
+def search_copy(board):
+    """
+    Cheap copy of a board to hand to the engine.
+
+    Only the moves since the last capture or pawn move are copied: no earlier
+    position can repeat, so repetition detection in the search stays exact while
+    the cost no longer grows with the length of the game.
+    """
+    return board.copy(stack=board.halfmove_clock)
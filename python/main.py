@@ -1,5 +1,5 @@
 import pygame
-from ui import draw_board, draw_pieces, highlight_moves
+from ui import BoardRenderer
 from game import Game
 
 # Kiểm tra xem module đã được nhập chưa để tránh chạy lại
@@ -16,29 +16,38 @@ if __name__ == "__main__":
         exit()
 
     game = Game()
+    renderer = BoardRenderer(screen)
+    caption = "Chess Game"
     running = True
 
-    while running and game.running:  # Kiểm tra cả trạng thái game
+    while running:  # Ván kết thúc không đóng cửa sổ: vẫn xem lại được hoặc nhấn R để chơi ván mới
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 running = False
+            elif event.type in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED):
+                renderer.invalidate()  # Cửa sổ bị che rồi hiện lại: vẽ lại toàn bộ
             else:
                 game.handle_event(event)
 
-        screen.fill((0, 0, 0))  # Xóa màn hình trước khi vẽ
-        draw_board(screen)  # Vẽ bàn cờ
-        draw_pieces(screen, game.view_board)  # Vẽ quân cờ từ view_board
-        if game.selected_square is not None and game.history_index == len(game.board.move_stack):
-            highlight_moves(screen, game.view_board, game.selected_square)
-
-        game.update_ai_move()
+        # Chỉ gợi ý nước đi khi đang ở thế cờ hiện tại
+        selected = game.selected_square if game.history_index == len(game.board.move_stack) else None
+        dirty = renderer.render(game.view_board, selected)  # Chỉ vẽ lại các ô thay đổi
+        if dirty:
+            pygame.display.update(dirty)
 
         if game.history_index < len(game.board.move_stack):
-            pygame.display.set_caption(f"Chess Game - Đang xem lại bước {game.history_index}/{len(game.board.move_stack)}")
+            new_caption = f"Chess Game - Đang xem lại bước {game.history_index}/{len(game.board.move_stack)}"
+        elif game.ai_info:
+            info = game.ai_info
+            new_caption = f"Chess Game - Đánh giá: {info['score'] / 100:+.2f} (độ sâu {info['depth']}) " \
+                          + " ".join(move.uci() for move in info["pv"])
         else:
-            pygame.display.set_caption("Chess Game")
+            new_caption = "Chess Game"
+        if new_caption != caption:
+            caption = new_caption
+            pygame.display.set_caption(caption)
 
-        pygame.display.flip()
         game.clock.tick(60)
 
-    pygame.quit()
\ No newline at end of file
+    game.ai.close()
+    pygame.quit()
@@ -0,0 +1,224 @@
+"""
+Mate search: proves forced mates with depth-first proof-number search (df-pn).
+
+By default only the attacker's checking moves and the defender's replies are
+searched (a checks-and-evasions tree); checks_only=False also tries quiet
+attacking moves. Nodes are expanded in order of proof and disproof numbers
+instead of by depth, so forced mates are found in a small fraction of the
+nodes alpha-beta needs. The numbers are kept in the solver's own table, keyed by
+(Zobrist key, plies left), and mate lengths are tried from 1 to N so the
+first proof found is the shortest mate. The table is cleared by every solve.
+
+Values are stored for the side to move (phi/delta form): phi = 0 means the
+side to move wins, delta = 0 means it loses. A node's phi is the smallest
+delta of its children and its delta the sum of their phis.
+
+Used by the UCI "go mate N" command.
+
+Usage:
+    python mate_search.py "<FEN>" N [--nodes 1000000] [--time 60] [--all-moves]
+"""
+import time
+import argparse
+
+import chess
+import chess.polyglot
+
+from search import NodeContext
+
+INF = 100_000_000
+WIN = (0, INF)   # Proven for the side to move
+LOSS = (INF, 0)  # Disproven for the side to move
+
+
+class MateSearch:
+    def __init__(self, max_entries=2_000_000, checks_only=True):
+        self.table = {}  # (key, plies left) -> (phi, delta)
+        self.max_entries = max_entries
+        self.checks_only = checks_only
+        self.path = set()  # Keys of the positions on the current line (repetitions are draws)
+
+        self.stop_search = False
+        self.start_time = 0
+        self.time_limit = float("inf")
+        self.node_limit = None
+        self.nodes = 0
+        self.check_interval = 1024
+        self.next_check = 0
+        self.stop_condition = None  # Optional callable: True stops the search (see Searcher.stop_condition)
+
+    def stop(self):
+        self.stop_search = True
+
+    def check_limits(self):
+        """Same scheme as Searcher.check_limits: exact node limit, clock polled every check_interval nodes."""
+        if self.node_limit is not None and self.nodes >= self.node_limit:
+            self.stop_search = True
+        elif time.time() - self.start_time > self.time_limit:
+            self.stop_search = True
+        elif self.stop_condition is not None and self.stop_condition():
+            self.stop_search = True
+        self.next_check = self.nodes + self.check_interval
+        if self.node_limit is not None:
+            self.next_check = min(self.next_check, self.node_limit)
+        return self.stop_search
+
+    def solve(self, board, max_moves, time_limit=None, node_limit=None, info_callback=None):
+        """
+        Look for a mate in at most max_moves moves for the side to move.
+        Returns (moves to mate, mating line) or (None, []) if no mate was proven
+        within the limits. info_callback gets a dict (moves, nodes, time) after
+        every mate length that was fully searched.
+        """
+        self.stop_search = False
+        self.start_time = time.time()
+        self.time_limit = time_limit if time_limit is not None else float("inf")
+        self.node_limit = node_limit
+        self.nodes = 0
+        self.next_check = min(self.check_interval, node_limit) if node_limit is not None else self.check_interval
+
+        # Values are only valid for one solve: draws by repetition depend on the path, and
+        # a checks-only search stores "no check left" disproofs that are not real disproofs
+        self.table.clear()
+        board = board.copy()
+        key = chess.polyglot.zobrist_hash(board)
+        for moves in range(1, max_moves + 1):
+            self.path = {key}
+            phi, delta = self._mid(board, key, 2 * moves - 1, INF, INF)
+            if self.stop_search:
+                break
+            if phi == 0:
+                return moves, self.mate_line(board, 2 * moves - 1)
+            if info_callback:
+                info_callback({"moves": moves, "nodes": self.nodes, "time": time.time() - self.start_time})
+        return None, []
+
+    def _store(self, key, plies, value):
+        if len(self.table) >= self.max_entries:
+            self.table.clear()
+        self.table[(key, plies)] = value
+
+    def _initial(self, board, plies):
+        """Value of a new node: terminal results, otherwise the number of replies for an evading defender."""
+        if plies % 2:
+            return (1, 1)
+        replies = board.legal_moves.count()
+        if replies == 0:
+            return LOSS if board.is_check() else WIN  # Mated, or stalemate (a draw: the defender holds)
+        if plies == 0:
+            return WIN  # Out of moves: the defender holds
+        return (1, replies)
+
+    def _mid(self, board, key, plies, th_phi, th_delta):
+        """Expand the node until its phi or delta reaches the thresholds; returns (phi, delta)."""
+        self.nodes += 1
+        if self.nodes >= self.next_check and self.check_limits():
+            return self.table.get((key, plies), (1, 1))
+
+        if plies % 2 and self.checks_only:
+            ctx = NodeContext(board)
+            moves = [move for move in board.legal_moves if ctx.gives_check(move)]
+        else:
+            moves = list(board.legal_moves)
+        if not moves:
+            value = self._initial(board, plies) if not plies % 2 else LOSS  # No check (or no move) left
+            self._store(key, plies, value)
+            return value
+
+        # Children: [move, key, fixed value or None (then the value is read from the table)]
+        children = []
+        for move in moves:
+            board.push(move)
+            child_key = chess.polyglot.zobrist_hash(board)
+            if child_key in self.path or board.is_insufficient_material() or board.halfmove_clock >= 100:
+                # Draw: good for the defender, whoever is to move
+                children.append([move, child_key, WIN if plies % 2 else LOSS])
+            else:
+                if (child_key, plies - 1) not in self.table:
+                    self._store(child_key, plies - 1, self._initial(board, plies - 1))
+                children.append([move, child_key, None])
+            board.pop()
+
+        while True:
+            phi = INF
+            delta = 0
+            best = None
+            best_phi = second_delta = INF
+            for child in children:
+                child_phi, child_delta = child[2] or self.table.get((child[1], plies - 1), (1, 1))
+                delta = min(INF, delta + child_phi)
+                if child_delta < phi:
+                    second_delta = phi
+                    phi = child_delta
+                    best = child
+                    best_phi = child_phi
+                elif child_delta < second_delta:
+                    second_delta = child_delta
+
+            if phi >= th_phi or delta >= th_delta or self.stop_search:
+                self._store(key, plies, (phi, delta))
+                return phi, delta
+
+            board.push(best[0])
+            self.path.add(best[1])
+            self._mid(board, best[1], plies - 1, th_delta - delta + best_phi, min(th_phi, second_delta + 1))
+            self.path.discard(best[1])
+            board.pop()
+
+    def _shortest(self, key, plies, wins):
+        """Fewest plies left (<= plies) at which the table proves a win (or a loss) for the side to move."""
+        for left in range(plies % 2, plies + 1, 2):
+            value = self.table.get((key, left))
+            if value and value[0 if wins else 1] == 0:
+                return left
+        return None
+
+    def mate_line(self, board, plies):
+        """The proven mating line: fastest mate for the attacker, longest defence for the defender."""
+        board = board.copy()
+        line = []
+        while plies > 0:
+            choice = None
+            for move in board.legal_moves:
+                board.push(move)
+                # Attacker: the defender must be lost; defender: every reply is lost, pick the slowest
+                if board.is_checkmate():
+                    length = 0 if plies % 2 else None
+                else:
+                    length = self._shortest(chess.polyglot.zobrist_hash(board), plies - 1, wins=not plies % 2)
+                board.pop()
+                if length is None:
+                    continue
+                if choice is None or (length < choice[1] if plies % 2 else length > choice[1]):
+                    choice = (move, length)
+            if choice is None:
+                break
+            line.append(choice[0])
+            board.push(choice[0])
+            plies = choice[1]
+        return line
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Prove a forced mate with proof-number search")
+    parser.add_argument("fen")
+    parser.add_argument("moves", type=int, help="longest mate to look for, in moves")
+    parser.add_argument("--nodes", type=int, default=None)
+    parser.add_argument("--time", type=float, default=None, help="seconds")
+    parser.add_argument("--all-moves", action="store_true", help="also search quiet attacking moves")
+    args = parser.parse_args(argv)
+
+    board = chess.Board(args.fen)
+    solver = MateSearch(checks_only=not args.all_moves)
+    start = time.time()
+    moves, line = solver.solve(board, args.moves, args.time, args.nodes,
+                               lambda info: print(f"[Mate] No mate in {info['moves']} ({info['nodes']:,} nodes)"))
+    elapsed = time.time() - start
+    if moves is None:
+        print(f"[Mate] No mate in {args.moves} found - {solver.nodes:,} nodes in {elapsed:.2f}s")
+    else:
+        print(f"[Mate] Mate in {moves}: {board.variation_san(line)} - {solver.nodes:,} nodes in {elapsed:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
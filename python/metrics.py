@@ -0,0 +1,193 @@
+"""
+Metrics for long-running engine processes (engine_host.py).
+
+A Metrics registry holds counters, gauges and histograms, optionally with
+labels, and renders them in the Prometheus text format or as one JSON object.
+Collector callbacks registered with add_collector run before every render, so
+gauges such as queue depth or cache sizes are read when scraped instead of
+being updated on every request.
+
+They can be exposed in two ways, both optional:
+    serve_http(metrics, port)             GET /metrics on a local port (Prometheus scrape)
+    JsonLinesWriter(metrics, path, 10.0)  one JSON snapshot appended every 10 seconds
+"""
+import os
+import json
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Upper bounds of the default histogram buckets
+NPS_BUCKETS = (1_000, 2_500, 5_000, 10_000, 25_000, 50_000, 100_000, 250_000)
+SECONDS_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def current_rss_bytes():
+    """Resident set size of this process (peak RSS where /proc is not available)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        if resource is None:
+            return 0
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # Last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                break
+        else:
+            i = len(self.buckets)
+        self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Metrics:
+    def __init__(self, prefix="tuturu_"):
+        self.prefix = prefix
+        self.lock = threading.Lock()
+        self.kinds = {}   # name -> (kind, help, buckets)
+        self.values = {}  # name -> {labels tuple: value or Histogram}
+        self.collectors = []
+
+    def describe(self, name, kind, help_text, buckets=None):
+        """Declare a metric; kind is "counter", "gauge" or "histogram"."""
+        self.kinds[name] = (kind, help_text, buckets)
+        self.values.setdefault(name, {})
+
+    def add_collector(self, collect):
+        """collect(metrics) is called before every render to update gauges."""
+        self.collectors.append(collect)
+
+    def inc(self, name, value=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            series = self.values[name]
+            series[key] = series.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        with self.lock:
+            self.values[name][tuple(sorted(labels.items()))] = value
+
+    def observe(self, name, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            series = self.values[name]
+            if key not in series:
+                series[key] = Histogram(self.kinds[name][2] or SECONDS_BUCKETS)
+            series[key].observe(value)
+
+    def get(self, name, **labels):
+        return self.values[name].get(tuple(sorted(labels.items())), 0)
+
+    def _collect(self):
+        for collect in self.collectors:
+            collect(self)
+
+    def render(self):
+        """Prometheus text exposition format."""
+        self._collect()
+        out = []
+        with self.lock:
+            for name, (kind, help_text, _) in self.kinds.items():
+                full = self.prefix + name
+                out.append(f"# HELP {full} {help_text}")
+                out.append(f"# TYPE {full} {kind}")
+                for labels, value in self.values[name].items():
+                    if kind != "histogram":
+                        out.append(f"{full}{_labels(labels)} {_number(value)}")
+                        continue
+                    cumulative = 0
+                    for bound, count in zip(value.buckets + ("+Inf",), value.counts):
+                        cumulative += count
+                        out.append(f"{full}_bucket{_labels(labels + (('le', _number(bound)),))} {cumulative}")
+                    out.append(f"{full}_sum{_labels(labels)} {_number(value.sum)}")
+                    out.append(f"{full}_count{_labels(labels)} {value.count}")
+        return "\n".join(out) + "\n"
+
+    def snapshot(self):
+        """All metrics as one JSON-serialisable dict; histograms as {count, sum, buckets}."""
+        self._collect()
+        result = {"time": round(time.time(), 3)}
+        with self.lock:
+            for name, series in self.values.items():
+                for labels, value in series.items():
+                    key = name + "".join(f"_{v}" for _, v in labels)
+                    if isinstance(value, Histogram):
+                        result[key] = {"count": value.count, "sum": round(value.sum, 6),
+                                       "buckets": dict(zip(map(str, value.buckets + ("+Inf",)), value.counts))}
+                    else:
+                        result[key] = value
+        return result
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in labels) + "}"
+
+
+def serve_http(metrics, port, bind="127.0.0.1"):
+    """Serve GET /metrics in a background thread; returns the server."""
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = metrics.render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass  # No access log on stderr for every scrape
+
+    server = ThreadingHTTPServer((bind, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class JsonLinesWriter:
+    """Append a metrics snapshot to path every interval seconds, from a background thread."""
+
+    def __init__(self, metrics, path, interval=10.0):
+        self.metrics = metrics
+        self.path = path
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while not self.stopped.wait(self.interval):
+            self.write()
+
+    def write(self):
+        with open(self.path, "a") as f:
+            f.write(json.dumps(self.metrics.snapshot()) + "\n")
+
+    def close(self):
+        self.stopped.set()
+        self.thread.join()
+        self.write()  # Final snapshot on shutdown
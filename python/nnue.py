@@ -0,0 +1,234 @@
+"""
+Small NNUE-style evaluator with incrementally updated NumPy accumulators.
+
+Network: 768 piece-square inputs per perspective -> H int16 accumulator (one
+per side, shared weights) -> [stm, other] clipped ReLU -> 16 -> 1.
+The first layer is never recomputed during search: NNUE.push / NNUE.pop add and
+subtract the weight rows of the pieces a move changes, so each node costs a few
+vector adds instead of a full evaluation.
+
+Training is done offline on packed position files (see packed_positions.py and
+selfplay.py):
+    python nnue.py train data.bin [more.bin ...] --out nnue.npz [--hidden 64] [--epochs 20]
+"""
+import time
+import argparse
+
+import chess
+import numpy as np
+
+N_FEATURES = 768
+QA = 127           # Accumulator units for an activation of 1.0
+EVAL_SCALE = 400   # Network output 1.0 = 400 centipawns (logistic with scale 400)
+W1_CLIP = 2.0      # Keeps the int16 accumulator far from overflow with 32 pieces
+
+
+def feature(perspective, piece_color, piece_type, square):
+    """Input index of a piece seen from perspective (own pieces first, board flipped for black)."""
+    if perspective == chess.BLACK:
+        square ^= 56
+    relative = 0 if piece_color == perspective else 1
+    return (relative * 6 + piece_type - 1) * 64 + square
+
+
+class NNUE:
+    """Evaluator holding a stack of accumulators that follows board.push / board.pop."""
+
+    def __init__(self, path):
+        weights = np.load(path)
+        self.w1 = np.clip(np.round(weights["w1"] * QA), -32767, 32767).astype(np.int16)
+        self.b1 = np.clip(np.round(weights["b1"] * QA), -32767, 32767).astype(np.int16)
+        self.w2 = weights["w2"].astype(np.float32)
+        self.b2 = weights["b2"].astype(np.float32)
+        self.w3 = weights["w3"].astype(np.float32)
+        self.b3 = float(weights["b3"])
+        self.stack = []
+
+    def refresh(self, board):
+        """Rebuild the accumulators from scratch (start of a search)."""
+        acc = np.empty((2, len(self.b1)), dtype=np.int16)
+        for perspective in (chess.WHITE, chess.BLACK):
+            features = [feature(perspective, piece.color, piece.piece_type, sq)
+                        for sq, piece in board.piece_map().items()]
+            acc[int(perspective)] = self.b1 + self.w1[features].sum(axis=0, dtype=np.int16)
+        self.stack = [acc]
+
+    def _changes(self, board, move):
+        """(color, piece_type, square) lists removed and added by move, which is not yet pushed."""
+        piece = board.piece_at(move.from_square)
+        removed = [(piece.color, piece.piece_type, move.from_square)]
+        added = [(piece.color, move.promotion or piece.piece_type, move.to_square)]
+        if board.is_en_passant(move):
+            removed.append((not piece.color, chess.PAWN, move.to_square ^ 8))
+        else:
+            captured = board.piece_at(move.to_square)
+            if captured:
+                removed.append((captured.color, captured.piece_type, move.to_square))
+        if board.is_castling(move):
+            rank = chess.square_rank(move.from_square)
+            if board.is_kingside_castling(move):
+                rook_from, rook_to = chess.square(7, rank), chess.square(5, rank)
+            else:
+                rook_from, rook_to = chess.square(0, rank), chess.square(3, rank)
+            removed.append((piece.color, chess.ROOK, rook_from))
+            added.append((piece.color, chess.ROOK, rook_to))
+        return removed, added
+
+    def push(self, board, move):
+        """Update the accumulators for move; call right before board.push(move)."""
+        acc = self.stack[-1].copy()
+        if move:  # Null moves change nothing
+            removed, added = self._changes(board, move)
+            for perspective in (chess.WHITE, chess.BLACK):
+                row = acc[int(perspective)]
+                for color, piece_type, sq in removed:
+                    row -= self.w1[feature(perspective, color, piece_type, sq)]
+                for color, piece_type, sq in added:
+                    row += self.w1[feature(perspective, color, piece_type, sq)]
+        self.stack.append(acc)
+
+    def pop(self):
+        self.stack.pop()
+
+    def evaluate(self, board):
+        """Score in centipawns from the side to move's point of view."""
+        acc = self.stack[-1]
+        us, them = int(board.turn), int(not board.turn)
+        x = np.clip(np.concatenate((acc[us], acc[them])), 0, QA).astype(np.float32) / QA
+        h = np.clip(x @ self.w2 + self.b2, 0.0, 1.0)
+        return int((h @ self.w3 + self.b3) * EVAL_SCALE)
+
+
+# --- Offline training -------------------------------------------------------
+
+def decode_features(records):
+    """
+    Vectorised feature extraction from packed position records.
+    Returns (stm features, other features) as (N, 32) index arrays padded with -1,
+    plus the side to move.
+    """
+    n = len(records)
+    occupied = records["occupied"].astype("<u8").view(np.uint8).reshape(n, 8)
+    occ = np.unpackbits(occupied, axis=1, bitorder="little").astype(bool)        # (N, 64)
+    pieces = records["pieces"]
+    nibbles = np.empty((n, 32), dtype=np.int64)
+    nibbles[:, 0::2] = pieces & 0x0F
+    nibbles[:, 1::2] = pieces >> 4
+    order = np.cumsum(occ, axis=1) - 1                                           # k-th piece on the board
+    codes = np.where(occ, np.take_along_axis(nibbles, np.clip(order, 0, 31), axis=1), -1)
+
+    squares = np.broadcast_to(np.arange(64), (n, 64))
+    white_view = np.where(occ, codes * 64 + squares, -1)
+    # From black's side own pieces come first and the board is mirrored
+    black_codes = np.where(codes >= 6, codes - 6, codes + 6)
+    black_view = np.where(occ, black_codes * 64 + (squares ^ 56), -1)
+
+    white_to_move = (records["flags"] & 1).astype(bool)
+    stm = np.where(white_to_move[:, None], white_view, black_view)
+    other = np.where(white_to_move[:, None], black_view, white_view)
+    # Keep only occupied squares (at most 32 per position)
+    keep = np.argsort(~occ, axis=1, kind="stable")[:, :32]
+    return np.take_along_axis(stm, keep, axis=1), np.take_along_axis(other, keep, axis=1), white_to_move
+
+
+def _one_hot(features):
+    x = np.zeros((len(features), N_FEATURES + 1), dtype=np.float32)
+    rows = np.repeat(np.arange(len(features)), features.shape[1])
+    x[rows, features.ravel()] = 1.0  # Padding (-1) lands in the extra last column
+    return x[:, :N_FEATURES]
+
+
+def load_training_data(paths, blend=0.5):
+    """Features and targets (blend of search score and game result, side to move POV)."""
+    from packed_positions import PositionReader, RESULT_UNKNOWN
+    stm, other, targets = [], [], []
+    for path in paths:
+        reader = PositionReader(path)
+        for chunk in reader.chunks():
+            chunk = chunk[chunk["result"] != RESULT_UNKNOWN]
+            s, o, white_to_move = decode_features(chunk)
+            sign = np.where(white_to_move, 1.0, -1.0)
+            score_target = 1.0 / (1.0 + np.exp(-sign * chunk["score"] / EVAL_SCALE))
+            result_target = (sign * chunk["result"] + 1.0) / 2.0
+            stm.append(s)
+            other.append(o)
+            targets.append(blend * score_target + (1.0 - blend) * result_target)
+    return np.concatenate(stm), np.concatenate(other), np.concatenate(targets).astype(np.float32)
+
+
+def train(paths, out_path="nnue.npz", hidden=64, epochs=20, batch_size=4096, lr=1e-3, blend=0.5, seed=1):
+    """Minibatch Adam on the logistic MSE, written with plain NumPy backprop."""
+    rng = np.random.default_rng(seed)
+    stm, other, targets = load_training_data(paths, blend)
+    n = len(targets)
+    print(f"[NNUE] {n:,} positions, hidden={hidden}")
+
+    params = {
+        "w1": rng.normal(0, 0.1, (N_FEATURES, hidden)).astype(np.float32),
+        "b1": np.full(hidden, 0.1, dtype=np.float32),
+        "w2": rng.normal(0, 1 / np.sqrt(2 * hidden), (2 * hidden, 16)).astype(np.float32),
+        "b2": np.zeros(16, dtype=np.float32),
+        "w3": rng.normal(0, 0.25, 16).astype(np.float32),
+        "b3": np.zeros((), dtype=np.float32),
+    }
+    m = {k: np.zeros_like(v) for k, v in params.items()}
+    v = {k: np.zeros_like(p) for k, p in params.items()}
+    step = 0
+    start = time.time()
+    for epoch in range(1, epochs + 1):
+        perm = rng.permutation(n)
+        total = 0.0
+        for i in range(0, n, batch_size):
+            idx = perm[i:i + batch_size]
+            xs, xo, y = _one_hot(stm[idx]), _one_hot(other[idx]), targets[idx]
+
+            # Forward
+            a = np.concatenate((xs @ params["w1"], xo @ params["w1"]), axis=1) + np.tile(params["b1"], 2)
+            x = np.clip(a, 0.0, 1.0)
+            z = x @ params["w2"] + params["b2"]
+            h = np.clip(z, 0.0, 1.0)
+            out = h @ params["w3"] + params["b3"]
+            p = 1.0 / (1.0 + np.exp(-out))
+            total += float(np.sum((p - y) ** 2))
+
+            # Backward
+            d_out = 2.0 * (p - y) * p * (1.0 - p) / len(idx)
+            grads = {"w3": h.T @ d_out, "b3": np.sum(d_out)}
+            d_z = np.outer(d_out, params["w3"]) * ((z > 0) & (z < 1))
+            grads["w2"] = x.T @ d_z
+            grads["b2"] = d_z.sum(axis=0)
+            d_a = (d_z @ params["w2"].T) * ((a > 0) & (a < 1))
+            d_as, d_ao = d_a[:, :hidden], d_a[:, hidden:]
+            grads["w1"] = xs.T @ d_as + xo.T @ d_ao
+            grads["b1"] = d_as.sum(axis=0) + d_ao.sum(axis=0)
+
+            step += 1
+            for k in params:
+                m[k] = 0.9 * m[k] + 0.1 * grads[k]
+                v[k] = 0.999 * v[k] + 0.001 * grads[k] ** 2
+                params[k] = params[k] - lr * (m[k] / (1 - 0.9 ** step)) / (np.sqrt(v[k] / (1 - 0.999 ** step)) + 1e-8)
+            params["w1"] = np.clip(params["w1"], -W1_CLIP, W1_CLIP)
+        print(f"[NNUE] Epoch {epoch}: loss={total / n:.6f} ({time.time() - start:.1f}s)")
+
+    np.savez(out_path, **params)
+    print(f"[NNUE] Đã lưu mạng vào {out_path}")
+    return params
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train the NNUE evaluator")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_train = sub.add_parser("train")
+    p_train.add_argument("data", nargs="+", help="packed position files")
+    p_train.add_argument("--out", default="nnue.npz")
+    p_train.add_argument("--hidden", type=int, default=64)
+    p_train.add_argument("--epochs", type=int, default=20)
+    p_train.add_argument("--batch-size", type=int, default=4096)
+    p_train.add_argument("--lr", type=float, default=1e-3)
+    p_train.add_argument("--blend", type=float, default=0.5, help="weight of the search score vs the game result")
+    args = parser.parse_args(argv)
+    train(args.data, args.out, args.hidden, args.epochs, args.batch_size, args.lr, args.blend)
+
+
+if __name__ == "__main__":
+    main()
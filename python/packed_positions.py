@@ -0,0 +1,218 @@
+"""
+Compact fixed-width binary format for positions with their score and result.
+
+Each record is 32 bytes:
+    occupied  u8      occupancy bitboard
+    pieces    u1[16]  one nibble per occupied square, in square order (piece code 0-11)
+    flags     u1      bit 0: side to move (1 = white), bits 1-4: castling K Q k q
+    ep        u1      en passant square (255 = none)
+    halfmove  u1      halfmove clock (clamped to 255)
+    result    i1      game result from white's point of view (1, 0, -1; RESULT_UNKNOWN if unknown)
+    score     i2      search score from white's point of view (centipawns)
+    fullmove  u2      fullmove number
+
+Files start with a 16-byte header so the reader can memory-map them directly
+and expose every field as a column without parsing.
+"""
+import os
+import chess
+import numpy as np
+
+MAGIC = b"PPOS"
+VERSION = 1
+HEADER_SIZE = 16
+RESULT_UNKNOWN = -128
+
+RECORD_DTYPE = np.dtype([
+    ("occupied", "<u8"),
+    ("pieces", "u1", 16),
+    ("flags", "u1"),
+    ("ep", "u1"),
+    ("halfmove", "u1"),
+    ("result", "i1"),
+    ("score", "<i2"),
+    ("fullmove", "<u2"),
+])
+assert RECORD_DTYPE.itemsize == 32
+
+CASTLING_SQUARES = [chess.H1, chess.A1, chess.H8, chess.A8]
+
+RESULT_VALUES = {"1-0": 1, "1/2-1/2": 0, "0-1": -1}
+
+
+def piece_code(piece):
+    return (piece.piece_type - 1) + (0 if piece.color == chess.WHITE else 6)
+
+
+def code_piece(code):
+    return chess.Piece(code % 6 + 1, chess.WHITE if code < 6 else chess.BLACK)
+
+
+def pack(board, score=0, result=RESULT_UNKNOWN, out=None):
+    """Encode board into a record (a new one, or the numpy record out)."""
+    record = out if out is not None else np.zeros((), dtype=RECORD_DTYPE)
+    record["occupied"] = board.occupied
+    nibbles = np.zeros(32, dtype=np.uint8)
+    for i, sq in enumerate(chess.scan_forward(board.occupied)):
+        nibbles[i] = piece_code(board.piece_at(sq))
+    record["pieces"] = nibbles[0::2] | (nibbles[1::2] << 4)
+
+    flags = 1 if board.turn == chess.WHITE else 0
+    for bit, sq in enumerate(CASTLING_SQUARES):
+        if board.castling_rights & chess.BB_SQUARES[sq]:
+            flags |= 2 << bit
+    record["flags"] = flags
+    record["ep"] = board.ep_square if board.has_legal_en_passant() else 255
+    record["halfmove"] = min(board.halfmove_clock, 255)
+    record["result"] = result
+    record["score"] = max(-32768, min(32767, int(score)))
+    record["fullmove"] = min(board.fullmove_number, 65535)
+    return record
+
+
+def unpack(record):
+    """Decode a record back into a chess.Board."""
+    board = chess.Board(None)
+    nibbles = np.empty(32, dtype=np.uint8)
+    pieces = np.asarray(record["pieces"])
+    nibbles[0::2] = pieces & 0x0F
+    nibbles[1::2] = pieces >> 4
+    for i, sq in enumerate(chess.scan_forward(int(record["occupied"]))):
+        board.set_piece_at(sq, code_piece(int(nibbles[i])))
+
+    flags = int(record["flags"])
+    board.turn = bool(flags & 1)
+    castling = 0
+    for bit, sq in enumerate(CASTLING_SQUARES):
+        if flags & (2 << bit):
+            castling |= chess.BB_SQUARES[sq]
+    board.castling_rights = castling
+    ep = int(record["ep"])
+    board.ep_square = None if ep == 255 else ep
+    board.halfmove_clock = int(record["halfmove"])
+    board.fullmove_number = int(record["fullmove"])
+    return board
+
+
+def _header():
+    return MAGIC + bytes([VERSION, RECORD_DTYPE.itemsize]) + bytes(HEADER_SIZE - 6)
+
+
+class PositionWriter:
+    """Appends packed records to a file, buffering them in chunks."""
+
+    def __init__(self, path, chunk_size=65536):
+        new_file = not os.path.exists(path) or os.path.getsize(path) == 0
+        self.file = open(path, "ab")
+        if new_file:
+            self.file.write(_header())
+        self.buffer = np.zeros(chunk_size, dtype=RECORD_DTYPE)
+        self.count = 0
+        self.written = 0
+
+    def write(self, board, score=0, result=RESULT_UNKNOWN):
+        pack(board, score, result, out=self.buffer[self.count])
+        self.count += 1
+        if self.count == len(self.buffer):
+            self.flush()
+
+    def write_records(self, records):
+        """Append already packed records (e.g. from another file)."""
+        self.flush()
+        np.asarray(records, dtype=RECORD_DTYPE).tofile(self.file)
+        self.written += len(records)
+
+    def flush(self):
+        if self.count:
+            self.buffer[:self.count].tofile(self.file)
+            self.written += self.count
+            self.count = 0
+        self.file.flush()
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class PositionReader:
+    """
+    Memory-mapped view of a packed position file.
+
+    Fields are exposed as numpy columns (reader.score, reader.result, ...) that
+    are read lazily from disk; reader.board(i) decodes a single position.
+    """
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            header = f.read(HEADER_SIZE)
+        if header[:4] != MAGIC or header[4] != VERSION or header[5] != RECORD_DTYPE.itemsize:
+            raise ValueError(f"{path} is not a packed position file (version {VERSION})")
+        if os.path.getsize(path) > HEADER_SIZE:
+            self.records = np.memmap(path, dtype=RECORD_DTYPE, mode="r", offset=HEADER_SIZE)
+        else:
+            self.records = np.zeros(0, dtype=RECORD_DTYPE)
+
+    def __len__(self):
+        return len(self.records)
+
+    def __getitem__(self, index):
+        return self.records[index]
+
+    def __getattr__(self, name):
+        if name in RECORD_DTYPE.names:
+            return self.records[name]
+        raise AttributeError(name)
+
+    @property
+    def side_to_move(self):
+        return (self.records["flags"] & 1).astype(bool)
+
+    def board(self, index):
+        return unpack(self.records[index])
+
+    def boards(self, start=0, stop=None):
+        for i in range(start, len(self) if stop is None else stop):
+            yield unpack(self.records[i])
+
+    def chunks(self, size=65536):
+        """Iterate over the file in record slices, for streaming processing."""
+        for start in range(0, len(self), size):
+            yield self.records[start:start + size]
+
+
+def convert_pgn(pgn_path, out_path):
+    """Write every position of every game in a PGN file (score 0, result from the header)."""
+    import chess.pgn
+    games = 0
+    with open(pgn_path, encoding="utf-8", errors="replace") as f, PositionWriter(out_path) as writer:
+        while True:
+            game = chess.pgn.read_game(f)
+            if game is None:
+                break
+            result = RESULT_VALUES.get(game.headers.get("Result"), RESULT_UNKNOWN)
+            board = game.board()
+            for move in game.mainline_moves():
+                board.push(move)
+                writer.write(board, 0, result)
+            games += 1
+    print(f"[Packed] {games} games -> {out_path}")
+
+
+if __name__ == "__main__":
+    import sys
+    # Usage: python packed_positions.py from-pgn games.pgn out.bin | python packed_positions.py info file.bin
+    if len(sys.argv) == 4 and sys.argv[1] == "from-pgn":
+        convert_pgn(sys.argv[2], sys.argv[3])
+    elif len(sys.argv) == 3 and sys.argv[1] == "info":
+        reader = PositionReader(sys.argv[2])
+        print(f"{len(reader):,} positions")
+        for i in range(min(5, len(reader))):
+            print(reader.board(i).fen(), int(reader.score[i]), int(reader.result[i]))
+    else:
+        print("Usage: python packed_positions.py from-pgn games.pgn out.bin | info file.bin")
@@ -0,0 +1,245 @@
+"""
+Game review: centipawn loss, best move and mistake tags for every move of a PGN file.
+
+Games are streamed from the file one at a time and reviewed in worker
+processes in parallel. Each game is replayed on a single board with push (no
+per-ply rebuild) and every position is searched under a node budget with the
+worker's Searcher, whose TT is kept along the whole game line so each search
+starts warm from the previous one.
+
+A move's centipawn loss is the best score minus the score after the move
+played, both from the mover's point of view and capped at +/-MAX_CP:
+    >= 50 inaccuracy (?!), >= 100 mistake (?), >= 300 blunder (??)
+
+With --cache PATH the workers share a persistent analysis cache (see
+analysis_cache.py), so positions reviewed before - repeated games, common
+openings - are answered from it when the cached result is at least
+--cache-depth deep.
+
+Usage:
+    python review.py games.pgn [--nodes 20000] [--workers K] [--format json|pgn] [--out FILE]
+                     [--cache analysis_cache.sqlite] [--cache-depth 8]
+"""
+import io
+import os
+import sys
+import json
+import time
+import argparse
+from collections import deque
+from multiprocessing import Pool
+
+import chess
+import chess.pgn
+import chess.engine
+
+from search import Searcher, IMMEDIATE_MATE_SCORE
+from engine_common import search_nodes
+from analysis_cache import AnalysisCache, HIT_DEPTH
+
+MAX_CP = 1000
+TAGS = [(300, "blunder", chess.pgn.NAG_BLUNDER),
+        (100, "mistake", chess.pgn.NAG_MISTAKE),
+        (50, "inaccuracy", chess.pgn.NAG_DUBIOUS_MOVE)]
+
+_SEARCHER = None
+
+
+def _init_worker(cache_path=None, cache_depth=HIT_DEPTH):
+    global _SEARCHER
+    _SEARCHER = Searcher()
+    if cache_path:
+        _SEARCHER.analysis_cache = AnalysisCache(cache_path)  # One connection per worker (SQLite WAL)
+        _SEARCHER.cache_hit_depth = cache_depth
+
+
+def iter_game_texts(f):
+    """Split a PGN stream into the raw text of each game, without parsing the moves."""
+    lines = []
+    in_movetext = False
+    for line in f:
+        if line.startswith("[") and in_movetext:
+            yield "".join(lines)
+            lines = []
+            in_movetext = False
+        elif line.strip() and not line.startswith("["):
+            in_movetext = True
+        lines.append(line)
+    if any(line.strip() for line in lines):
+        yield "".join(lines)
+
+
+def capped(score):
+    return max(-MAX_CP, min(MAX_CP, score))
+
+
+def tag_for(cpl):
+    for threshold, name, nag in TAGS:
+        if cpl >= threshold:
+            return name, nag
+    return None, None
+
+
+def terminal_score(board):
+    """Score of a finished position for the side to move, or None if the game goes on."""
+    if board.is_checkmate():
+        return -IMMEDIATE_MATE_SCORE
+    if board.is_stalemate() or board.is_insufficient_material():
+        return 0
+    return None
+
+
+def evaluate_line(searcher, board, moves, node_budget):
+    """(best move, score for side to move) for every position of the line, replayed on board."""
+    results = []
+    for move in moves + [None]:
+        score = terminal_score(board)
+        if score is not None:
+            results.append((None, score))
+        elif board.legal_moves.count() == 1:
+            results.append((next(iter(board.legal_moves)), None))  # Forced: score taken from the next position
+        else:
+            results.append(search_nodes(searcher, board, node_budget))
+        if move is None:
+            break
+        board.push(move)
+
+    # Fill in forced positions (and a line ending without a search) from the position after them
+    for i in range(len(results) - 1, -1, -1):
+        best, score = results[i]
+        if score is None:
+            results[i] = (best, -results[i + 1][1] if i + 1 < len(results) and results[i + 1][1] is not None else 0)
+    return results
+
+
+def review_game(task):
+    """Worker: review one game; returns (game index, report dict, annotated PGN string)."""
+    index, text, node_budget = task
+    searcher = _SEARCHER
+    searcher.tt.table.clear()  # Keep the TT along this game's line only
+    game = chess.pgn.read_game(io.StringIO(text))
+    if game is None or game.board().uci_variant != "chess":
+        return index, None, None
+
+    start = time.time()
+    board = game.board()
+    moves = list(game.mainline_moves())
+    scores = evaluate_line(searcher, board, moves, node_budget)
+
+    board = game.board()
+    report_moves = []
+    loss = {chess.WHITE: [], chess.BLACK: []}
+    counts = {name: {"white": 0, "black": 0} for _, name, _ in TAGS}
+    for ply, (node, move) in enumerate(zip(game.mainline(), moves)):
+        best, best_score = scores[ply]
+        played_score = -scores[ply + 1][1]
+        cpl = max(0, capped(best_score) - capped(played_score)) if move != best else 0
+        tag, nag = tag_for(cpl)
+        mover = board.turn
+        side = "white" if mover == chess.WHITE else "black"
+        loss[mover].append(cpl)
+
+        white_score = played_score if mover == chess.WHITE else -played_score
+        entry = {
+            "ply": ply + 1,
+            "move": board.san(move),
+            "best": board.san(best) if best else None,
+            "score": int(white_score),
+            "cpl": cpl,
+            "tag": tag,
+        }
+        report_moves.append(entry)
+
+        # Annotate the PGN node of the move just played
+        if searcher.is_mate_score(white_score):
+            mate = (searcher.score_to_ply(white_score) + 1) // 2
+            if mate == 0:
+                # The move mates (MateGiven): python-chess set_eval drops any mate 0 score,
+                # so write "#0" itself - GameNode.eval reads it back as MateGiven for the mover
+                pov = chess.engine.PovScore(chess.engine.MateGiven, mover)
+            else:
+                pov = chess.engine.PovScore(chess.engine.Mate(mate if white_score > 0 else -mate), chess.WHITE)
+        else:
+            pov = chess.engine.PovScore(chess.engine.Cp(int(white_score)), chess.WHITE)
+        node.set_eval(pov)
+        if pov.relative == chess.engine.MateGiven:
+            node.comment = (node.comment + " " if node.comment else "") + "[%eval #0]"
+        if tag:
+            counts[tag][side] += 1
+            node.nags.add(nag)
+            node.comment = (node.comment + " " if node.comment else "") + f"{tag.capitalize()}. Best: {entry['best']}"
+        board.push(move)
+
+    report = {
+        "game": index,
+        "white": game.headers.get("White", "?"),
+        "black": game.headers.get("Black", "?"),
+        "result": game.headers.get("Result", "*"),
+        "acpl": {
+            "white": round(sum(loss[chess.WHITE]) / max(1, len(loss[chess.WHITE])), 1),
+            "black": round(sum(loss[chess.BLACK]) / max(1, len(loss[chess.BLACK])), 1),
+        },
+        "counts": counts,
+        "moves": report_moves,
+        "time": round(time.time() - start, 2),
+    }
+    exporter = chess.pgn.StringExporter(headers=True, variations=True, comments=True)
+    return index, report, game.accept(exporter)
+
+
+def review(pgn_path, out=sys.stdout, node_budget=20000, workers=None, output_format="json",
+           cache_path=None, cache_depth=HIT_DEPTH):
+    start = time.time()
+    reviewed = 0
+    workers = workers or os.cpu_count() or 1
+    if cache_path:
+        AnalysisCache(cache_path).close()  # Create the file and table once, before the workers open it
+    with open(pgn_path, encoding="utf-8", errors="replace") as f, \
+            Pool(workers, initializer=_init_worker, initargs=(cache_path, cache_depth)) as pool:
+        texts = enumerate(iter_game_texts(f))
+        window = deque()
+        while True:
+            # Keep only a few games in flight so the file is read as fast as it is reviewed
+            while len(window) < 2 * workers:
+                item = next(texts, None)
+                if item is None:
+                    break
+                window.append(pool.apply_async(review_game, ((item[0], item[1], node_budget),)))
+            if not window:
+                break
+            index, report, annotated = window.popleft().get()
+            if report is None:
+                continue
+            if output_format == "pgn":
+                out.write(annotated + "\n\n")
+            else:
+                out.write(json.dumps(report) + "\n")
+            out.flush()
+            reviewed += 1
+            print(f"[Review] Game {index + 1}: {report['white']} - {report['black']} | "
+                  f"ACPL {report['acpl']['white']} / {report['acpl']['black']} ({report['time']}s)",
+                  file=sys.stderr)
+    print(f"[Review] {reviewed} games in {time.time() - start:.1f}s", file=sys.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Review the games of a PGN file")
+    parser.add_argument("pgn")
+    parser.add_argument("--nodes", type=int, default=20000, help="node budget per position")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument("--format", choices=("json", "pgn"), default="json")
+    parser.add_argument("--out", default=None, help="output file (default: stdout)")
+    parser.add_argument("--cache", default=None, help="persistent analysis cache file shared by the workers")
+    parser.add_argument("--cache-depth", type=int, default=HIT_DEPTH,
+                        help="cached results at least this deep replace the search of a position")
+    args = parser.parse_args(argv)
+    out = open(args.out, "w") if args.out else sys.stdout
+    try:
+        review(args.pgn, out, args.nodes, args.workers, args.format, args.cache, args.cache_depth)
+    finally:
+        if args.out:
+            out.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -2,7 +2,10 @@ import math
 import chess
 import chess.polyglot  # Add explicit import for polyglot module
 import time
+import struct
 from evaluate import evaluate_board
+from bitbase import get_bitbases, DRAW
+from search_params import default_params
 import functools
 from collections import defaultdict
 
@@ -48,13 +51,15 @@ class SearchProfiler:
 # Global profiler instance
 PROFILER = SearchProfiler()
 
-# Decorator for profiling functions
+# Decorator for profiling Searcher methods (a plain call unless the searcher's enable_profiling is set)
 def profile(section_name):
     def decorator(func):
         @functools.wraps(func)
-        def wrapper(*args, **kwargs):
+        def wrapper(self, *args, **kwargs):
+            if not self.enable_profiling:
+                return func(self, *args, **kwargs)
             PROFILER.start(section_name)
-            result = func(*args, **kwargs)
+            result = func(self, *args, **kwargs)
             PROFILER.stop(section_name)
             return result
         return wrapper
@@ -64,6 +69,7 @@ IMMEDIATE_MATE_SCORE = 100000
 POS_INF = 9999999
 NEG_INF = -POS_INF
 MAX_DEPTH = 64
+MAX_PLY = 128  # Size of the search stack
 
 piece_values = {
     chess.PAWN: 100,
@@ -118,44 +124,232 @@ class TranspositionEntry:
         self.flag = flag
         self.move = move
 
+# Binary TT snapshot: header + fixed-width entries (see TranspositionTable.save)
+TT_SNAPSHOT_MAGIC = b"TTS1"
+TT_SNAPSHOT_HEADER = struct.Struct("<4sQQQ")  # magic, key check, table size, entry count
+TT_SNAPSHOT_FIELDS = [("key", "<u8"), ("value", "<i4"), ("depth", "<i2"), ("flag", "u1"), ("move", "<u2")]
+# Hash of the start position: changes if the key scheme (polyglot Zobrist) ever changes
+TT_KEY_CHECK = chess.polyglot.zobrist_hash(chess.Board())
+
+
+def encode_move(move):
+    """16-bit move: from (6 bits) | to (6 bits) | promotion piece type (3 bits); 0 = no move."""
+    if not move:
+        return 0
+    return move.from_square | (move.to_square << 6) | ((move.promotion or 0) << 12)
+
+
+def decode_move(code):
+    if not code:
+        return None
+    return chess.Move(code & 63, (code >> 6) & 63, promotion=(code >> 12) or None)
+
+
+class NodeContext:
+    """
+    Attack information of one search node, computed once from bitboards and
+    shared by every move heuristic at that node (pruning, reductions, ordering).
+    """
+    __slots__ = ("board", "in_check", "them", "ep_square", "their_king", "discoverers", "check_squares", "non_pawn")
+
+    def __init__(self, board):
+        us = board.turn
+        occupied = board.occupied
+        self.board = board
+        self.in_check = bool(board.checkers_mask())
+        self.them = board.occupied_co[not us]
+        self.ep_square = board.ep_square
+        # Non-pawn, non-king material per color (indexed by chess.WHITE / chess.BLACK)
+        pieces = occupied & ~(board.pawns | board.kings)
+        self.non_pawn = (bool(pieces & board.occupied_co[chess.BLACK]), bool(pieces & board.occupied_co[chess.WHITE]))
+
+        king = board.king(not us)
+        self.their_king = king
+        if king is None:
+            self.discoverers = 0
+            self.check_squares = (0,) * 7
+            return
+        # Squares from which a piece of each type would attack their king
+        diagonal = chess.BB_DIAG_ATTACKS[king][chess.BB_DIAG_MASKS[king] & occupied]
+        straight = (chess.BB_RANK_ATTACKS[king][chess.BB_RANK_MASKS[king] & occupied] |
+                    chess.BB_FILE_ATTACKS[king][chess.BB_FILE_MASKS[king] & occupied])
+        self.check_squares = (0, chess.BB_PAWN_ATTACKS[not us][king], chess.BB_KNIGHT_ATTACKS[king],
+                              diagonal, straight, diagonal | straight, 0)
+
+        # Our pieces that are the only blocker between one of our sliders and their king
+        snipers = (((chess.BB_RANK_ATTACKS[king][0] | chess.BB_FILE_ATTACKS[king][0]) & (board.rooks | board.queens)) |
+                   (chess.BB_DIAG_ATTACKS[king][0] & (board.bishops | board.queens))) & board.occupied_co[us]
+        discoverers = 0
+        for sniper in chess.scan_reversed(snipers):
+            blockers = chess.between(king, sniper) & occupied
+            if blockers and blockers & (blockers - 1) == 0:
+                discoverers |= blockers
+        self.discoverers = discoverers & board.occupied_co[us]
+
+    def is_capture(self, move):
+        return bool(chess.BB_SQUARES[move.to_square] & self.them) or \
+            (move.to_square == self.ep_square and self.board.is_en_passant(move))
+
+    def gives_check(self, move):
+        """Same as board.gives_check(move), from the precomputed check squares and discovered-check candidates."""
+        board = self.board
+        piece_type = board.piece_type_at(move.from_square)
+        if move.promotion or (piece_type == chess.KING and board.is_castling(move)) or \
+                (piece_type == chess.PAWN and move.to_square == self.ep_square):
+            return board.gives_check(move)  # Rare moves that change more than two squares
+        if chess.BB_SQUARES[move.to_square] & self.check_squares[piece_type]:
+            return True
+        if chess.BB_SQUARES[move.from_square] & self.discoverers:
+            if not chess.BB_RAYS[self.their_king][move.from_square] & chess.BB_SQUARES[move.to_square]:
+                return True  # Leaves the line to their king
+            return board.gives_check(move)  # Stays on the line: depends on which side of the slider it lands
+        return False
+
+
+class PlyFrame:
+    """Per-ply search state, preallocated once per Searcher and indexed by ply."""
+    __slots__ = ("key", "static_eval", "killer1", "killer2", "move", "reduction", "pv")
+
+    def __init__(self):
+        self.pv = []
+        self.reset()
+
+    def reset(self):
+        self.key = None          # Zobrist key of the node (repetition detection along the path)
+        self.static_eval = None
+        self.killer1 = None      # Most recent new quiet cutoff move
+        self.killer2 = None
+        self.move = None         # Move currently being searched from this node
+        self.reduction = 0       # LMR reduction applied to that move
+        self.pv.clear()          # Principal variation from this node
+
+
 class TranspositionTable:
     EXACT, LOWER, UPPER = 0, 1, 2
 
     def __init__(self, size=2**20*64):
         self.table = {}
         self.size = size
+        self.probes = 0  # Search and quiescence probes and hits, counted after count_probes()
+        self.hits = 0
 
     def get(self, key):
         return self.table.get(key)
 
+    # Lookup at the search and quiescence probe sites: plain get unless counting is enabled
+    probe = get
+
+    def count_probes(self):
+        """Count probes and hits from now on (engine_host reports the TT hit rate)."""
+        self.probe = self._counted_probe
+
+    def _counted_probe(self, key):
+        self.probes += 1
+        entry = self.table.get(key)
+        if entry is not None:
+            self.hits += 1
+        return entry
+
     def store(self, key, value, depth, flag, move):
         if len(self.table) >= self.size:
             self.table.clear()
         self.table[key] = TranspositionEntry(key, value, depth, flag, move)
 
+    def save(self, path):
+        """Write the table to a binary snapshot; returns the number of entries written."""
+        import numpy as np  # Only needed for snapshots: keeps it out of the engine's startup
+        entries = np.zeros(len(self.table), dtype=TT_SNAPSHOT_FIELDS)
+        for i, (key, entry) in enumerate(self.table.items()):
+            entries[i] = (key, int(entry.value), entry.depth, entry.flag, encode_move(entry.move))
+        with open(path, "wb") as f:
+            f.write(TT_SNAPSHOT_HEADER.pack(TT_SNAPSHOT_MAGIC, TT_KEY_CHECK, self.size, len(entries)))
+            entries.tofile(f)
+        return len(entries)
+
+    def load(self, path, merge=False):
+        """
+        Load a snapshot written by save(). Raises ValueError if the file is not a
+        snapshot, was written with a different key scheme, or is truncated. If it
+        holds more entries than this table's size, only the deepest ones are kept.
+        """
+        import numpy as np
+        with open(path, "rb") as f:
+            header = f.read(TT_SNAPSHOT_HEADER.size)
+            if len(header) < TT_SNAPSHOT_HEADER.size:
+                raise ValueError(f"{path}: not a TT snapshot")
+            magic, key_check, size, count = TT_SNAPSHOT_HEADER.unpack(header)
+            if magic != TT_SNAPSHOT_MAGIC:
+                raise ValueError(f"{path}: not a TT snapshot")
+            if key_check != TT_KEY_CHECK:
+                raise ValueError(f"{path}: written with a different hash key scheme")
+            entries = np.fromfile(f, dtype=TT_SNAPSHOT_FIELDS, count=count)
+        if len(entries) != count:
+            raise ValueError(f"{path}: truncated ({len(entries)} of {count} entries)")
+        if count > self.size:
+            print(f"[TT] Snapshot has {count:,} entries (size {size:,}), keeping the {self.size:,} deepest")
+            entries = entries[np.argsort(-entries["depth"], kind="stable")[:self.size]]
+
+        if not merge:
+            self.table = {}
+        for key, value, depth, flag, move in entries.tolist():
+            self.table[key] = TranspositionEntry(key, value, depth, flag, decode_move(move))
+        return len(entries)
+
 class Searcher:
     def __init__(self):
         self.best_move = None
         self.best_eval = 0
         self.stop_search = False
         self.tt = TranspositionTable()
-        self.killer_moves = {ply: [] for ply in range(64)}
+        self.stack = [PlyFrame() for _ in range(MAX_PLY + 1)]
         self.history = {}
-        self.repetition_table = []
-        self.static_evals = {}
         self.q_eval_cache = {}  # Cache for quiescence evaluations
         self.see_cache = {}     # Cache for static exchange evaluations
+        self.bitbases = get_bitbases()  # Memory-mapped KQK/KRK/KPK tables
+        self.root_in_bitbase = False
 
         self.start_time = 0
         self.time_limit = 9.5
         self.nodes = 0
+        self.node_limit = None      # Hard node limit of the running search (None: no limit)
+        self.check_interval = 128   # Nodes between two polls of the clock
+        self.next_check = 0         # Node count at which check_limits runs next
+
+        # Deterministic mode: only depth and node limits apply (the clock is never read)
+        # and every search starts from empty tables, so results depend only on the
+        # position and the limits - for reproducible tests and comparisons. A search
+        # whose only limit is a time limit (a GUI's go wtime/movetime) still honours
+        # the clock, otherwise it would effectively never return.
+        self.deterministic = False
+        self.use_clock = True
 
         self.profiler = PROFILER
         self.enable_profiling = False
+
+        # Optional callable polled by check_limits: returning True stops the search, e.g.
+        # when the request being searched has been superseded (see ai.EngineWorker)
+        self.stop_condition = None
+
+        # Called after every completed depth with a dict (depth, score, move, pv, nodes, time)
+        self.info_callback = None
+
+        # Optional NNUE evaluator (see load_nnue); evaluate_board is used otherwise
+        self.nnue = None
+
+        # Optional persistent AnalysisCache: consulted at the root and at plies <= cache_probe_plies.
+        # A cached root result is played at once when it is at least min(max_depth, cache_hit_depth) deep
+        self.analysis_cache = None
+        self.cache_probe_plies = 0
+        self.cache_hit_depth = 0    # Accept cached results at least this deep (0: only max_depth)
         
-        # Pre-compute piece value difference thresholds for SEE pruning
-        self.futility_margin = 90  # Futility pruning margin per depth
-        self.delta_margin = 200    # Delta pruning margin beyond piece values
+        # Optional TraceRecorder (search_trace.py): sampled node records of search and quiescence.
+        # _trace_node is the record of the node being searched, None unless this search is traced
+        self.trace = None
+        self._trace_node = None
+
+        # Pruning and reduction margins (futility_margin, lmr_divisor, ...): see search_params.py
+        for name, value in default_params().items():
+            setattr(self, name, value)
 
     def is_mate_score(self, score):
         return abs(score) > IMMEDIATE_MATE_SCORE - 1000
@@ -163,39 +357,164 @@ class Searcher:
     def score_to_ply(self, score):
         return IMMEDIATE_MATE_SCORE - abs(score)
 
+    def value_to_tt(self, value, ply):
+        """Mate scores are stored as the distance to mate from the node, not from the root."""
+        if self.is_mate_score(value):
+            return value + ply if value > 0 else value - ply
+        return value
+
+    def value_from_tt(self, value, ply):
+        """Inverse of value_to_tt: the stored mate distance seen from a node ply plies from the root."""
+        if self.is_mate_score(value):
+            return value - ply if value > 0 else value + ply
+        return value
+
+    def load_nnue(self, path):
+        """Evaluate with the NNUE network stored at path (None switches back to evaluate_board)."""
+        if path is None:
+            self.nnue = None
+        else:
+            from nnue import NNUE
+            self.nnue = NNUE(path)
+
+    def evaluate(self, board):
+        if self.nnue is not None and self.bitbases.probe(board) is None:
+            return self.nnue.evaluate(board)
+        return evaluate_board(board)
+
+    def make_move(self, board, move):
+        """board.push that also keeps the NNUE accumulators in sync."""
+        if self.nnue is not None:
+            self.nnue.push(board, move)
+        board.push(move)
+
+    def unmake_move(self, board):
+        if self.nnue is not None:
+            self.nnue.pop()
+        return board.pop()
+
+    def save_tt(self, path):
+        return self.tt.save(path)
+
+    def load_tt(self, path, merge=False):
+        return self.tt.load(path, merge)
+
+    def stop(self):
+        """Abort the running search; iterative_deepening returns its best move so far."""
+        self.stop_search = True
+
+    def check_limits(self):
+        """
+        The single check of the search limits, called from search and quiescence
+        when self.nodes reaches self.next_check: the node limit is exact, the
+        clock is only polled every check_interval nodes. Returns stop_search.
+        """
+        if self.node_limit is not None and self.nodes >= self.node_limit:
+            self.stop_search = True
+        elif self.use_clock and time.time() - self.start_time > self.time_limit:
+            self.stop_search = True
+        elif self.stop_condition is not None and self.stop_condition():
+            self.stop_search = True
+        self.next_check = self.nodes + self.check_interval
+        if self.node_limit is not None:
+            self.next_check = min(self.next_check, self.node_limit)
+        return self.stop_search
+
+    def clear(self):
+        """Forget everything learnt by previous searches (TT, history and caches)."""
+        self.tt.table.clear()
+        self.history.clear()
+        self.q_eval_cache.clear()
+        self.see_cache.clear()
+
+    def is_killer(self, move, ply):
+        frame = self.stack[ply]
+        return move == frame.killer1 or move == frame.killer2
+
+    def get_pv(self, board, max_length=None, prefix=()):
+        """
+        Principal variation from board: the moves in prefix (e.g. the root frame's
+        PV), continued by following transposition table moves.
+        """
+        pv = []
+        seen = set()
+        max_length = max_length or MAX_DEPTH
+        for move in prefix:
+            if len(pv) >= max_length or not board.is_legal(move):
+                break
+            pv.append(move)
+            board.push(move)
+        while len(pv) < max_length:
+            key = chess.polyglot.zobrist_hash(board)
+            entry = self.tt.get(key)
+            if not entry or not entry.move or key in seen or not board.is_legal(entry.move):
+                break
+            seen.add(key)
+            pv.append(entry.move)
+            board.push(entry.move)
+        for _ in pv:
+            board.pop()
+        return pv
+
     def has_non_pawn_material(self, board):
-        for square in chess.SQUARES:
-            piece = board.piece_at(square)
-            if piece and piece.piece_type != chess.PAWN:
-                return True
-        return False
+        """Whether the side to move has a piece other than pawns and king (null move is unsafe without one)."""
+        return bool(board.occupied_co[board.turn] & ~(board.pawns | board.kings))
 
     @profile("iterative_deepening")
-    def iterative_deepening(self, board, max_depth=5, time_limit=9.5):
+    def iterative_deepening(self, board, max_depth=5, time_limit=9.5, node_limit=None):
+        """
+        Search board to max_depth, within time_limit seconds (None: no limit) and
+        node_limit nodes. self.nodes counts the nodes of this search only.
+        """
         self.stop_search = False
         self.best_eval = 0
         self.best_move = None
         self.start_time = time.time()
-        self.time_limit = time_limit
+        for frame in self.stack:
+            frame.reset()
+        self.time_limit = time_limit if time_limit is not None else float("inf")
+        self.node_limit = node_limit
+        self.nodes = 0
+        self.next_check = min(self.check_interval, node_limit) if node_limit is not None else self.check_interval
+        self.use_clock = not self.deterministic or (node_limit is None and time_limit is not None)
+        if self.deterministic:
+            self.clear()
 
         last_completed_best_move = None
         legal_moves = list(board.legal_moves)
-        if len(legal_moves) == 1:
-            return legal_moves[0]  # Nếu chỉ còn 1 nước thì chơi luôn
+
+        # If the root is already a bitbase position, keep searching won lines so
+        # the known-win eval can drive progress; otherwise resolve them at once.
+        self.root_in_bitbase = self.bitbases.probe(board) is not None
+
+        if self.nnue is not None:
+            self.nnue.refresh(board)
+
+        root_key = chess.polyglot.zobrist_hash(board)
+        if self.analysis_cache is not None and not self.deterministic:
+            min_depth = min(max_depth, self.cache_hit_depth) if self.cache_hit_depth > 0 else max_depth
+            cached_move = self.probe_analysis_cache(board, root_key, legal_moves, min_depth)
+            if cached_move is not None:
+                return cached_move
 
         # Reset profiler for a new search
         if self.enable_profiling:
             self.profiler.reset()
+        if self.trace is not None:
+            self.trace.start_search(self, board)
+
+        if len(legal_moves) == 1:
+            return self.forced_move(board, legal_moves[0])  # Nếu chỉ còn 1 nước thì chơi luôn
 
         for depth in range(1, max_depth + 1):
-            if time.time() - self.start_time > self.time_limit:
+            if self.use_clock and time.time() - self.start_time > self.time_limit:
                 break
 
             self.current_depth = depth
             eval = self.search(board, depth, 0, NEG_INF, POS_INF)
 
-            if self.stop_search or (time.time() - self.start_time > self.time_limit):
-                print(f"[Search] Depth {depth} incomplete (timeout) - best eval: {self.best_eval}")
+            if self.stop_search:
+                print(f"[Search] Depth {depth} incomplete (limit reached) - best eval: {self.best_eval}")
                 break
 
             elapsed = time.time() - self.start_time
@@ -219,11 +538,36 @@ class Searcher:
                       f"Nodes: {self.nodes:,}  "
                       f"({int(nps):,} NPS)")
 
+            pv = []
+            if self.info_callback or self.analysis_cache is not None:
+                pv = self.get_pv(board, depth, self.stack[0].pv)
+            if self.analysis_cache is not None and self.best_move:
+                self.analysis_cache.put(root_key, depth, eval, self.tt.EXACT, self.best_move, pv)
+
+            if self.info_callback:
+                self.info_callback({
+                    "depth": depth,
+                    "score": eval,
+                    "move": self.best_move,
+                    "pv": pv,
+                    "nodes": self.nodes,
+                    "time": elapsed,
+                })
+
             if self.is_mate_score(eval) and self.score_to_ply(eval) <= depth:
                 print(f"[Search] Found checkmate sequence, stopping search")
                 break
 
         result = last_completed_best_move if last_completed_best_move else self.best_move
+        if result is None and legal_moves:
+            # A hard node limit can stop depth 1 before any root move completes:
+            # play the hash move, or the first move in search order, never a null move
+            entry = self.tt.get(root_key)
+            if entry is not None and entry.move in legal_moves:
+                result = entry.move
+            else:
+                result = self.order_moves(board, legal_moves, None, 0)[0]
+            self.best_move = result
 
         # Print profiling report if enabled
         if self.enable_profiling:
@@ -231,134 +575,243 @@ class Searcher:
 
         return result
 
+    def forced_move(self, board, move):
+        """
+        Play the only legal move without a search. Its score comes from a quiescence
+        search of the resulting position and is reported like a depth 1 iteration,
+        so callers that record scores (selfplay, epd_runner, UCI info) get one.
+        """
+        self.make_move(board, move)
+        score = -self.quiescence(board, NEG_INF, POS_INF, 1, 0, self.qsearch_max_ply)
+        self.unmake_move(board)
+        self.best_move = move
+        self.best_eval = score
+        if self.info_callback:
+            self.info_callback({
+                "depth": 1,
+                "score": score,
+                "move": move,
+                "pv": [move],
+                "nodes": self.nodes,
+                "time": time.time() - self.start_time,
+            })
+        return move
+
+    def probe_analysis_cache(self, board, root_key, legal_moves, min_depth):
+        """
+        Return the cached move if the cache already holds an exact result at least
+        min_depth deep; otherwise seed the TT with any cached move and return None.
+        Callers usually pass max_depth=64 with a time or node limit, so min_depth is
+        capped by cache_hit_depth: the depth the entry point trusts for its budget
+        (--cache-depth, UCI CacheDepth).
+        """
+        cached = self.analysis_cache.get(root_key)
+        if cached is None or not cached.move:
+            return None
+        move = chess.Move.from_uci(cached.move)
+        if move not in legal_moves:
+            return None
+        if cached.depth >= min_depth and cached.flag == self.tt.EXACT:
+            self.best_move = move
+            self.best_eval = cached.score
+            print(f"[Search] Cache hit: depth {cached.depth} - Score: {cached.score} - Move: {move}")
+            if self.info_callback:
+                self.info_callback({
+                    "depth": cached.depth,
+                    "score": cached.score,
+                    "move": move,
+                    "pv": [chess.Move.from_uci(m) for m in cached.pv],
+                    "nodes": 0,
+                    "time": 0.0,
+                })
+            return move
+        # Depth 0 never causes a cutoff, it only puts the cached move first
+        self.tt.store(root_key, cached.score, 0, cached.flag, move)
+        return None
+
     def search(self, board, depth, ply, alpha, beta):
-        if time.time() - self.start_time > self.time_limit:
-            self.stop_search = True
+        if self.stop_search:
             return 0
         self.nodes += 1
-        
+        if self.nodes >= self.next_check and self.check_limits():
+            return 0
+
+        if ply >= MAX_PLY:
+            return self.evaluate(board)
+        frame = self.stack[ply]
+        frame.pv.clear()
+
         if depth <= 0:
-            return self.quiescence(board, alpha, beta)
+            return self.quiescence(board, alpha, beta, ply, 0, self.qsearch_max_ply)
 
         zobrist = chess.polyglot.zobrist_hash(board)
-        is_repetition = zobrist in self.repetition_table or board.is_repetition(3)
-        if is_repetition:
+        frame.key = zobrist
+        node = self._trace_node
+        if node is not None:
+            node.key = zobrist
+
+        # Repetition of a position on the current path (same side to move, since the last irreversible move)
+        for i in range(ply - 2, max(-1, ply - board.halfmove_clock - 1), -2):
+            if self.stack[i].key == zobrist:
+                return 0
+        if board.is_repetition(3):
             return 0
         
-        # Probe Transposition Table
-        entry = self.tt.get(zobrist)
+        # Probe the transposition table once: the entry gives the cutoff, the move and the eval
+        entry = self.tt.probe(zobrist)
+        tt_value = self.value_from_tt(entry.value, ply) if entry else None
+        tt_move = entry.move if entry else None
         tt_hit = entry and entry.depth >= depth
 
-        if tt_hit:
-            if entry.flag == self.tt.EXACT:
-                return entry.value
-            elif entry.flag == self.tt.LOWER and entry.value >= beta:
-                return entry.value
-            elif entry.flag == self.tt.UPPER and entry.value <= alpha:
-                return entry.value
-
-        # Handle checkmate, but don't return early
-        # Instead, assign a mate score based on ply depth, so we find the shortest mate
-        if board.is_checkmate():
-            mate_score = -IMMEDIATE_MATE_SCORE + ply
-            return mate_score
-            
-        if board.is_stalemate() or board.is_insufficient_material():
+        if tt_hit and (entry.flag == self.tt.EXACT
+                       or (entry.flag == self.tt.LOWER and tt_value >= beta)
+                       or (entry.flag == self.tt.UPPER and tt_value <= alpha)):
+            if node is not None:
+                node.exit = "tt"
+            return tt_value
+
+        # Persistent analysis cache at shallow plies (scores are relative to the cached position)
+        if not tt_hit and self.analysis_cache is not None and 0 < ply <= self.cache_probe_plies \
+                and not self.deterministic:
+            cached = self.analysis_cache.get(zobrist, touch=False)
+            if cached and cached.depth >= depth:
+                value = self.value_from_tt(cached.score, ply)
+                if cached.flag == self.tt.EXACT:
+                    return value
+                elif cached.flag == self.tt.LOWER and value >= beta:
+                    return value
+                elif cached.flag == self.tt.UPPER and value <= alpha:
+                    return value
+
+        ctx = NodeContext(board)
+
+        # Checkmate gets a mate score based on ply depth, so we find the shortest mate
+        if not any(board.generate_legal_moves()):
+            return -IMMEDIATE_MATE_SCORE + ply if ctx.in_check else 0
+
+        if board.is_insufficient_material():
             return 0
+
+        # Bitbase probe: drawn endings end the search here, won/lost ones too
+        # unless we are converting a root position that is itself in a bitbase
+        if ply > 0 and self.bitbases:
+            wdl = self.bitbases.probe(board)
+            if wdl == DRAW:
+                return 0
+            if wdl is not None and not self.root_in_bitbase:
+                return self.evaluate(board)
       
         # Null move pruning
-        do_null = depth >= 3 and not board.is_check() and self.has_non_pawn_material(board)
+        do_null = depth >= 3 and not ctx.in_check and ctx.non_pawn[board.turn]
         if do_null:
             R = 3 if depth >= 6 else 2
-            board.push(chess.Move.null())
+            self.make_move(board, chess.Move.null())
             value = -self.search(board, depth - 1 - R, ply + 1, -beta, -beta + 1)
-            board.pop()
+            self.unmake_move(board)
+            if node is not None:
+                node.flags |= 1  # search_trace.FLAG_NULL
 
             if value >= beta and not self.is_mate_score(value):
+                if node is not None:
+                    node.exit = "null"
                 return beta
-            
+
+        is_pv = beta > alpha + 1
+
+        # No hash move: at PV nodes a reduced search finds one (internal iterative
+        # deepening), zero-window nodes are simply searched one ply shallower
+        # (internal iterative reduction) since they are likely to cut anyway
+        if tt_move is None and not self.stop_search:
+            if is_pv and depth >= 4:
+                self.search(board, depth - 2, ply, alpha, beta)
+                iid_entry = self.tt.get(zobrist)
+                tt_move = iid_entry.move if iid_entry else None
+                if node is not None:
+                    node.flags |= 2  # search_trace.FLAG_IID
+            elif not is_pv and depth >= 3:
+                depth -= 1
+                if node is not None:
+                    node.flags |= 4  # search_trace.FLAG_IIR
+
         legal_moves = list(board.legal_moves)
 
+        alpha_orig = alpha  # The move loop raises alpha; the TT bound compares against the window searched
         best_val = NEG_INF
         best_move = None
         move_count = 0
-        is_pv = beta > alpha + 1
-
-        self.repetition_table.append(zobrist)
-
-        tt_move = self.tt.get(zobrist).move if self.tt.get(zobrist) else None
 
         # Move ordering
-        ordered_moves = self.order_moves(board, legal_moves, tt_move, ply)
+        ordered_moves = self.order_moves(board, legal_moves, tt_move, ply, ctx)
 
         # Profile static evaluation
         if self.enable_profiling:
             self.profiler.start("static_eval")
-        if self.tt.get(zobrist):
-            static_eval = self.tt.get(zobrist).value
+        if entry:
+            static_eval = tt_value
         else:
-            static_eval = evaluate_board(board)
+            static_eval = self.evaluate(board)
             
         improving = False
-        if ply >= 2 and not board.is_check():
-            improving = static_eval > self.static_evals.get(ply-2, NEG_INF)
-        self.static_evals[ply] = static_eval
+        if ply >= 2 and not ctx.in_check:
+            previous = self.stack[ply - 2].static_eval
+            improving = previous is None or static_eval > previous
+        frame.static_eval = static_eval
+        if node is not None:
+            node.static_eval = static_eval
         if self.enable_profiling:
             self.profiler.stop("static_eval")
 
         for move in ordered_moves:
-            if time.time() - self.start_time > self.time_limit:
-                self.stop_search = True
-                break
-
-            gives_check = board.gives_check(move)
-            is_capture = board.is_capture(move)
+            gives_check = ctx.gives_check(move)
+            is_capture = ctx.is_capture(move)
 
             # SEE pruning - skip bad captures in non-PV nodes (except at very shallow depths)
+            # (all losing captures at higher depths, only very bad ones at lower depths)
             if depth >= 2 and is_capture and not is_pv and not gives_check:
-                # Use SEE to determine if this is a bad capture
-                if self.see(board, move) < 0:
-                    # Skip obviously bad captures at higher depths
-                    if depth >= 4:
-                        continue
-                    # For lower depths, only skip very bad captures
-                    elif self.see(board, move) < -150:
-                        continue
+                see_score = self.see(board, move)
+                if see_score < 0 and (depth >= 4 or see_score < -150):
+                    if node is not None:
+                        node.count("see")
+                    continue
 
-            board.push(move)
+            self.make_move(board, move)
             move_count += 1
+            frame.move = move
+            frame.reduction = 0
             is_quiet = not is_capture and not move.promotion
-            refutation_move = move == tt_move or move in self.killer_moves.get(ply, [])
+            refutation_move = move == tt_move or move == frame.killer1 or move == frame.killer2
             history_score = self.history.get(move.uci(), 0)
 
             # LMR conditions
             do_full_search = True
             val = 0
 
-            # History pruning for quiet moves
-            do_prune = False
+            # History pruning for quiet moves (do_prune names the heuristic that fired)
+            do_prune = None
             if depth >= 2 and move_count > 1 and is_quiet and not is_pv:
-                if history_score < -8000 * depth:
-                    do_prune = True
+                if history_score < -self.history_prune * depth:
+                    do_prune = "history"
 
             # Late Move Pruning (LMP) for quiet moves
-            if not do_prune and depth <= 8 and is_quiet and move_count >= 3 + depth * depth / 2 and not is_pv:
-                do_prune = True
+            if not do_prune and depth <= 8 and is_quiet and not is_pv and \
+               move_count >= self.lmp_base + depth * depth * self.lmp_scale / 100:
+                do_prune = "lmp"
 
             # Futility pruning for non-PV quiet moves
-            if not do_prune and depth <= 7 and not is_pv and not board.is_check() and is_quiet and \
+            if not do_prune and depth <= 7 and not is_pv and is_quiet and \
                not gives_check and not self.is_mate_score(alpha):
-                futility_margin = 90 * depth
-                if static_eval + futility_margin <= alpha:
-                    do_prune = True
+                if static_eval + self.futility_margin * depth <= alpha:
+                    do_prune = "futility"
 
             if do_prune:
-                board.pop()
+                if node is not None:
+                    node.count(do_prune)
+                self.unmake_move(board)
                 continue
 
             # Late Move Reduction (LMR)
             do_lmr = depth >= 3 and move_count > (2 + 2 * is_pv) and \
-                     not board.is_check() and not is_capture and not move.promotion
+                     not gives_check and not is_capture and not move.promotion
 
             # Adjust LMR based on SEE for captures
             if is_capture and depth >= 3 and move_count > (2 + is_pv):
@@ -372,7 +825,7 @@ class Searcher:
                 if depth < 3 or move_count < 4:
                     reduction = 0
                 else:
-                    reduction = int(0.75 + math.log(depth) * math.log(move_count) / 2.25)
+                    reduction = int(self.lmr_base / 100 + math.log(depth) * math.log(move_count) * 100 / self.lmr_divisor)
 
                 # Adjust reduction based on conditions
                 reduction += 0 if is_pv else 1
@@ -386,10 +839,15 @@ class Searcher:
 
                 # Ensure we don't reduce too much
                 reduction = min(depth - 1, max(1, int(reduction)))
+                frame.reduction = reduction
 
                 # Reduced depth search with zero window
                 val = -self.search(board, depth - reduction, ply + 1, -alpha - 1, -alpha)
                 do_full_search = (val > alpha)
+                if node is not None:
+                    node.count("lmr")
+                    if do_full_search:
+                        node.count("lmr_research")
 
             # Normal search if LMR wasn't done or the reduced search was promising
             if not do_lmr or do_full_search:
@@ -406,7 +864,7 @@ class Searcher:
                         # Research with full window
                         val = -self.search(board, depth - 1, ply + 1, -beta, -alpha)
                         
-            board.pop()
+            self.unmake_move(board)
 
             if self.stop_search:
                 break
@@ -417,73 +875,97 @@ class Searcher:
                 if ply == 0:
                     self.best_move = move
 
+            if val > alpha:
+                frame.pv[:] = [move] + self.stack[ply + 1].pv
+
             alpha = max(alpha, val)
             if alpha >= beta:
-                if not board.is_capture(move):
-                    if move not in self.killer_moves[ply]:
-                        self.killer_moves[ply].append(move)
-                        if len(self.killer_moves[ply]) > 2:
-                            self.killer_moves[ply] = self.killer_moves[ply][-2:]
+                if node is not None:
+                    node.cutoff = move_count
+                if not is_capture and move != frame.killer1 and move != frame.killer2:
+                    frame.killer2 = frame.killer1
+                    frame.killer1 = move
                 self.history[move.uci()] = self.history.get(move.uci(), 0) + depth * depth
                 break
 
-        self.repetition_table.pop()
+        if self.stop_search:
+            return best_val  # Incomplete: discarded by the caller, keep it out of the TT
+
+        if best_val == NEG_INF:
+            best_val = alpha  # Every move was pruned: a fail low, not a mate for the opponent
+        if node is not None:
+            node.exit = "full"
+            node.searched = move_count
+            node.move = best_move
 
         flag = self.tt.EXACT
-        if best_val <= alpha:
+        if best_val <= alpha_orig:
             flag = self.tt.UPPER
         elif best_val >= beta:
             flag = self.tt.LOWER
 
-        self.tt.store(zobrist, best_val, depth, flag, best_move)
+        self.tt.store(zobrist, self.value_to_tt(best_val, ply), depth, flag, best_move)
 
         return best_val
 
     @profile("quiescence")
-    def quiescence(self, board, alpha, beta, ply=0, max_ply=8):
+    def quiescence(self, board, alpha, beta, ply=0, qply=0, max_qply=8):
         """
         Enhanced quiescence search using SEE for more accurate capture evaluation.
         Only considers captures that pass the SEE threshold for winning or equal trades.
+        ply is the distance from the root (for mate scores), qply the depth into quiescence.
         """
-        if time.time() - self.start_time > self.time_limit:
-            return evaluate_board(board)
+        if self.stop_search:
+            return 0
             
         if board.is_repetition(3):
             return 0
             
         # Prevent explosion in highly tactical positions
-        if ply >= max_ply:
-            return evaluate_board(board)
+        if qply >= max_qply:
+            return self.evaluate(board)
             
         self.nodes += 1
+        if self.nodes >= self.next_check and self.check_limits():
+            return 0
         
+        node = self._trace_node
+
         # Check for checkmate or stalemate
-        if board.is_checkmate():
-            return -IMMEDIATE_MATE_SCORE + ply
-        if board.is_stalemate():
-            return 0
+        in_check = board.is_check()
+        if not any(board.generate_legal_moves()):
+            return -IMMEDIATE_MATE_SCORE + ply if in_check else 0
             
         # Stand pat score
-        stand_pat = evaluate_board(board)
+        stand_pat = self.evaluate(board)
+        if node is not None:
+            node.static_eval = stand_pat
         
         # Beta cutoff with stand pat score
         if stand_pat >= beta:
+            if node is not None:
+                node.exit = "standpat"
             return beta
             
         # Update alpha with stand pat score if it's better
+        alpha_orig = alpha
         if alpha < stand_pat:
             alpha = stand_pat
             
-        # Probe transposition table
+        # Probe transposition table: any entry will do, quiescence ones are stored at depth 0
+        # and full-width results are at least as deep as a captures-only search
         zobrist = chess.polyglot.zobrist_hash(board)
-        entry = self.tt.get(zobrist)
-        if entry and entry.depth >= ply:
-            if entry.flag == self.tt.EXACT:
-                return entry.value
-            elif entry.flag == self.tt.LOWER and entry.value >= beta:
-                return entry.value
-            elif entry.flag == self.tt.UPPER and entry.value <= alpha:
-                return entry.value
+        if node is not None:
+            node.key = zobrist
+        entry = self.tt.probe(zobrist)
+        if entry:
+            tt_value = self.value_from_tt(entry.value, ply)
+            if (entry.flag == self.tt.EXACT
+                    or (entry.flag == self.tt.LOWER and tt_value >= beta)
+                    or (entry.flag == self.tt.UPPER and tt_value <= alpha)):
+                if node is not None:
+                    node.exit = "tt"
+                return tt_value
                 
         # Initialize best score and move
         best_score = stand_pat
@@ -492,11 +974,14 @@ class Searcher:
         # Get all potential capturing moves
         captures = []
         for move in board.legal_moves:
-            if board.is_capture(move) or move.promotion:
+            is_capture = board.is_capture(move)
+            if is_capture or move.promotion:
                 # Use SEE to filter out losing captures early
-                if board.is_capture(move) and not move.promotion:
+                if is_capture and not move.promotion:
                     # Skip clearly bad captures based on SEE
                     if self.see(board, move) < 0:
+                        if node is not None:
+                            node.count("see")
                         continue
                         
                 # Score the move for ordering
@@ -507,20 +992,21 @@ class Searcher:
         captures.sort(key=lambda x: x[1], reverse=True)
         
         # Delta pruning: if even the best possible capture plus margin cannot improve alpha, skip
-        if not board.is_check() and len(captures) > 0:
+        if not in_check and len(captures) > 0:
             best_possible_capture_value = 900  # Queen value
             if stand_pat + best_possible_capture_value + self.delta_margin < alpha:
                 # Even a free queen cannot improve alpha
+                if node is not None:
+                    node.exit = "delta"
                 return alpha
                 
         # Search the captures
-        for move, _ in captures:
-            if time.time() - self.start_time > self.time_limit:
+        for move_count, (move, _) in enumerate(captures, 1):
+            self.make_move(board, move)
+            score = -self.quiescence(board, -beta, -alpha, ply + 1, qply + 1, max_qply)
+            self.unmake_move(board)
+            if self.stop_search:
                 return best_score
-                
-            board.push(move)
-            score = -self.quiescence(board, -beta, -alpha, ply + 1, max_ply)
-            board.pop()
             
             if score > best_score:
                 best_score = score
@@ -528,15 +1014,24 @@ class Searcher:
                 if score > alpha:
                     alpha = score
                     if alpha >= beta:
+                        if node is not None:
+                            node.cutoff = move_count
                         break
                         
-        # Store the result in the transposition table
-        if best_score >= beta:
-            self.tt.store(zobrist, best_score, ply, self.tt.LOWER, best_move)
-        elif best_score > stand_pat:
-            self.tt.store(zobrist, best_score, ply, self.tt.EXACT, best_move)
-        else:
-            self.tt.store(zobrist, best_score, ply, self.tt.UPPER, best_move)
+        if node is not None:
+            node.exit = "full"
+            node.searched = move_count if captures else 0
+            node.move = best_move
+
+        # Store the result at depth 0, below any full-width search depth, so search() never
+        # takes a captures-only result as a real one; never overwrite a search() entry
+        if entry is None or entry.depth <= 0:
+            flag = self.tt.EXACT
+            if best_score <= alpha_orig:
+                flag = self.tt.UPPER
+            elif best_score >= beta:
+                flag = self.tt.LOWER
+            self.tt.store(zobrist, self.value_to_tt(best_score, ply), 0, flag, best_move)
             
         return best_score
 
@@ -812,7 +1307,7 @@ class Searcher:
                     score += PROMOTION_SCORES[promotion]  # Use precomputed table
                 
                 # 4. Killer move bonus 
-                if move in self.killer_moves.get(ply, []):
+                if self.is_killer(move, ply):
                     score += 4000
                 
                 # 5. History heuristic
@@ -830,7 +1325,7 @@ class Searcher:
             score += PROMOTION_SCORES[promotion]  # Use precomputed table
         
         # Killer move bonus
-        if move in self.killer_moves.get(ply, []):
+        if self.is_killer(move, ply):
             score += 4000
         
         # History heuristic
@@ -841,11 +1336,12 @@ class Searcher:
         
         return score
 
-    def order_moves(self, board, legal_moves, tt_move, ply):
+    def order_moves(self, board, legal_moves, tt_move, ply, ctx=None):
         """
         Optimized move ordering that avoids expensive sorting operations.
         Uses a pick-best approach which is faster than sorting the whole list.
         """
+        is_capture = ctx.is_capture if ctx else board.is_capture
         
         if self.enable_profiling:
             self.profiler.start("move_ordering")
@@ -873,7 +1369,7 @@ class Searcher:
         capture_scores = []
         
         for i, move in enumerate(remaining_moves):
-            if board.is_capture(move) or move.promotion:
+            if is_capture(move) or move.promotion:
                 # Score the capture using MVV-LVA
                 score = self._score_capture(board, move, ply)
                 captures_indices.append(i)
@@ -888,23 +1384,18 @@ class Searcher:
             # Add best move to ordered list
             ordered.append(remaining_moves[move_idx])
             
-            # Remove from our tracking lists
-            best_move_original_idx = captures_indices[best_idx]
+            # Remove from our tracking lists (remaining_moves itself is rebuilt below,
+            # so the stored indices stay valid)
             capture_scores.pop(best_idx)
             captures_indices.pop(best_idx)
-            
-            # Adjust indices that come after the removed move
-            for j in range(len(captures_indices)):
-                if captures_indices[j] > best_move_original_idx:
-                    captures_indices[j] -= 1
         
         # Rebuild remaining_moves list after removing captures
-        remaining_moves = [move for move in remaining_moves if not (board.is_capture(move) or move.promotion)]
+        remaining_moves = [move for move in remaining_moves if not (is_capture(move) or move.promotion)]
         
         # 3. Add killer moves
         killers = []
         for move in remaining_moves:
-            if move in self.killer_moves.get(ply, []):
+            if self.is_killer(move, ply):
                 killers.append(move)
                 
         ordered.extend(killers)
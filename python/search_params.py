@@ -0,0 +1,33 @@
+"""
+Tunable search parameters: pruning and reduction margins used by Searcher.
+
+Each entry is (Searcher attribute, UCI option name, default, min, max). Values
+are integers so they can be offered as UCI spin options (uci.py); fractional
+constants are stored in hundredths. spsa.py tunes them and writes
+tuned_search.py, which replaces the defaults when present.
+
+Kept free of heavy imports so the UCI front end can list the options without
+loading the search.
+"""
+
+SEARCH_PARAMS = [
+    ("futility_margin", "FutilityMargin", 90, 0, 300),    # Futility pruning margin per depth
+    ("delta_margin", "DeltaMargin", 200, 0, 600),         # Delta pruning margin beyond a queen
+    ("lmr_base", "LMRBase", 75, 0, 200),                  # LMR: base + log(depth) * log(moves) / divisor, in 1/100
+    ("lmr_divisor", "LMRDivisor", 225, 100, 500),
+    ("lmp_base", "LMPBase", 3, 1, 12),                    # Late move pruning after base + depth^2 * scale quiet moves
+    ("lmp_scale", "LMPScale", 50, 10, 150),               # in 1/100
+    ("history_prune", "HistoryPrune", 8000, 0, 32000),    # Prune quiet moves with history below -value * depth
+    ("qsearch_max_ply", "QSearchMaxPly", 8, 2, 16),       # Quiescence depth limit
+]
+
+# Values tuned by spsa.py (if present) replace the defaults above
+try:
+    from tuned_search import SEARCH_PARAM_VALUES
+except ImportError:
+    SEARCH_PARAM_VALUES = {}
+
+
+def default_params():
+    """{attribute: value} for every parameter, tuned values where available."""
+    return {name: SEARCH_PARAM_VALUES.get(name, default) for name, _, default, _, _ in SEARCH_PARAMS}
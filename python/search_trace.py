@@ -0,0 +1,325 @@
+"""
+Search tree trace recorder: which pruning and reduction heuristics fired at
+which nodes, for node-efficiency work on Searcher.search / quiescence.
+
+Opt-in: set searcher.trace = TraceRecorder(...), and call
+trace.detach(searcher) before setting it back to None. Each
+iterative_deepening call is sampled with probability sample_rate; while a
+sampled search runs, search and quiescence are wrapped at the instance level
+(the class methods are untouched, so an untraced search pays nothing but a
+None check per pruning site) and every node at ply <= max_ply writes one
+fixed-size record into a preallocated ring buffer:
+
+    search id, node id, parent id, Zobrist key, kind (search/qsearch), exit
+    reason, ply, depth (-qply in quiescence), alpha, beta, value, static eval,
+    best move, the move that led to the node, moves searched, index of the
+    cutoff move, null move / IID / IIR flags, and per-node counts of SEE,
+    history, LMP and futility pruning, LMR reductions and LMR re-searches.
+
+When the buffer is full the oldest records are overwritten. save() writes
+the records (oldest first) with a JSON header holding the FEN of every
+recorded search.
+
+Usage:
+    python search_trace.py record "<FEN>" [more FENs ...] [--depth 6] [--max-ply 64] [--sample-rate 1.0]
+                                  [--out trace.bin]
+    python search_trace.py stats trace.bin
+    python search_trace.py tree trace.bin [--search N] [--depth D] [--max-ply 3]
+"""
+import json
+import struct
+import random
+import argparse
+from collections import defaultdict
+
+TRACE_MAGIC = b"STR1"
+TRACE_HEADER = struct.Struct("<4sII")  # magic, JSON header length, record count
+RECORD = struct.Struct("<IIIQBBBbiiiiHHBBBBBBBBB")
+RECORD_FIELDS = ["search", "node", "parent", "key", "kind", "exit", "ply", "depth", "alpha", "beta",
+                 "value", "static_eval", "move", "played", "searched", "cutoff", "flags",
+                 "see", "history", "lmp", "futility", "lmr", "lmr_research"]
+
+KINDS = ["search", "qsearch"]
+EXITS = ["other", "full", "tt", "null", "standpat", "delta", "stopped"]
+COUNTS = ["see", "history", "lmp", "futility", "lmr", "lmr_research"]
+FLAG_NULL, FLAG_IID, FLAG_IIR = 1, 2, 4
+NO_EVAL = -2 ** 31
+NO_CUTOFF = 255
+
+
+class TraceNode:
+    """Per-node facts filled in by the search body while it runs."""
+    __slots__ = ("id", "key", "exit", "static_eval", "move", "searched", "cutoff", "flags", "counts")
+
+    def __init__(self, node_id):
+        self.id = node_id
+        self.key = 0
+        self.exit = "other"
+        self.static_eval = None
+        self.move = None
+        self.searched = 0
+        self.cutoff = None
+        self.flags = 0
+        self.counts = None
+
+    def count(self, name):
+        if self.counts is None:
+            self.counts = dict.fromkeys(COUNTS, 0)
+        self.counts[name] += 1
+
+
+def encode_move(move):
+    """Same 16-bit layout as the TT snapshots (search.encode_move); 0 = no move or the null move."""
+    if not move:
+        return 0
+    return move.from_square | (move.to_square << 6) | ((move.promotion or 0) << 12)
+
+
+def _clamp(value, low, high):
+    return max(low, min(high, int(value)))
+
+
+class TraceRecorder:
+    def __init__(self, capacity=1 << 20, sample_rate=1.0, max_ply=64, seed=0, max_searches=10000):
+        self.capacity = capacity
+        self.buffer = bytearray(capacity * RECORD.size)  # Preallocated: recording never allocates records
+        self.written = 0           # Records written so far (the buffer holds the last capacity of them)
+        self.sample_rate = sample_rate
+        self.max_ply = max_ply
+        self.rng = random.Random(seed)
+        self.searches = {}         # Search id -> root FEN, for the recorded searches
+        self.max_searches = max_searches
+        self.search_id = 0
+        self.next_node = 1         # Node ids start at 1; parent 0 is the root call's parent
+
+    def start_search(self, searcher, board):
+        """Called by iterative_deepening: decide whether this search is sampled and (un)hook the searcher."""
+        self.search_id += 1
+        if self.rng.random() >= self.sample_rate:
+            self.detach(searcher)
+            return
+        self.searches[self.search_id] = board.fen()
+        if len(self.searches) > self.max_searches:
+            del self.searches[next(iter(self.searches))]
+        cls = type(searcher)
+
+        def search(board, depth, ply, alpha, beta):
+            if depth <= 0:
+                # Horizon: no node of its own, the quiescence node is recorded under the caller
+                return cls.search(searcher, board, depth, ply, alpha, beta)
+            if ply > self.max_ply:
+                return self._untraced(searcher, cls.search, board, depth, ply, alpha, beta)
+            return self._traced(searcher, cls.search, 0, depth, ply, alpha, beta, board, depth, ply, alpha, beta)
+
+        def quiescence(board, alpha, beta, ply=0, qply=0, max_qply=8):
+            if ply > self.max_ply:
+                return self._untraced(searcher, cls.quiescence, board, alpha, beta, ply, qply, max_qply)
+            return self._traced(searcher, cls.quiescence, 1, -qply, ply, alpha, beta,
+                                board, alpha, beta, ply, qply, max_qply)
+
+        searcher.search = search
+        searcher.quiescence = quiescence
+
+    @staticmethod
+    def detach(searcher):
+        """Remove the instance-level wrappers: the searcher runs the plain class methods again."""
+        searcher.__dict__.pop("search", None)
+        searcher.__dict__.pop("quiescence", None)
+        searcher._trace_node = None
+
+    def _untraced(self, searcher, method, *args):
+        parent = searcher._trace_node
+        searcher._trace_node = None  # Keep deeper nodes' pruning out of the parent's counts
+        try:
+            return method(searcher, *args)
+        finally:
+            searcher._trace_node = parent
+
+    def _traced(self, searcher, method, kind, depth, ply, alpha, beta, *args):
+        parent = searcher._trace_node
+        board = args[0]
+        played = board.peek() if board.move_stack else None
+        node = TraceNode(self.next_node)
+        self.next_node += 1
+        searcher._trace_node = node
+        try:
+            value = method(searcher, *args)
+        finally:
+            searcher._trace_node = parent
+        if searcher.stop_search:
+            node.exit = "stopped"
+        self._write(node, parent.id if parent else 0, kind, depth, ply, alpha, beta, value, played)
+        return value
+
+    def _write(self, node, parent_id, kind, depth, ply, alpha, beta, value, played):
+        counts = node.counts or {}
+        RECORD.pack_into(
+            self.buffer, (self.written % self.capacity) * RECORD.size,
+            self.search_id, node.id & 0xFFFFFFFF, parent_id & 0xFFFFFFFF, node.key, kind, EXITS.index(node.exit),
+            _clamp(ply, 0, 255), _clamp(depth, -128, 127),
+            _clamp(alpha, -2 ** 31 + 1, 2 ** 31 - 1), _clamp(beta, -2 ** 31 + 1, 2 ** 31 - 1),
+            _clamp(value, -2 ** 31 + 1, 2 ** 31 - 1),
+            NO_EVAL if node.static_eval is None else _clamp(node.static_eval, -2 ** 31 + 1, 2 ** 31 - 1),
+            encode_move(node.move), encode_move(played),
+            min(255, node.searched), NO_CUTOFF if node.cutoff is None else min(254, node.cutoff), node.flags,
+            *(min(255, counts.get(name, 0)) for name in COUNTS))
+        self.written += 1
+
+    def records(self):
+        """The buffered records as dicts, oldest first."""
+        count = min(self.written, self.capacity)
+        start = self.written - count
+        for i in range(start, self.written):
+            yield dict(zip(RECORD_FIELDS, RECORD.unpack_from(self.buffer, (i % self.capacity) * RECORD.size)))
+
+    def save(self, path):
+        """Write the buffered records to path; returns the number of records."""
+        count = min(self.written, self.capacity)
+        start = self.written % self.capacity if self.written > self.capacity else 0
+        header = json.dumps({"searches": self.searches, "dropped": self.written - count}).encode()
+        with open(path, "wb") as f:
+            f.write(TRACE_HEADER.pack(TRACE_MAGIC, len(header), count))
+            f.write(header)
+            size = RECORD.size
+            f.write(self.buffer[start * size:count * size])
+            if start:
+                f.write(self.buffer[:start * size])
+        return count
+
+
+def load(path):
+    """(header dict, list of record dicts) from a trace file written by save."""
+    with open(path, "rb") as f:
+        magic, header_length, count = TRACE_HEADER.unpack(f.read(TRACE_HEADER.size))
+        if magic != TRACE_MAGIC:
+            raise ValueError(f"{path} is not a search trace")
+        header = json.loads(f.read(header_length))
+        data = f.read(count * RECORD.size)
+    records = [dict(zip(RECORD_FIELDS, values)) for values in RECORD.iter_unpack(data)]
+    return header, records
+
+
+def _move_text(code):
+    if not code:
+        return "--"
+    text = "abcdefgh"[code & 7] + str((code >> 3 & 7) + 1) + "abcdefgh"[code >> 6 & 7] + str((code >> 9 & 7) + 1)
+    return text + (" pnbrqk"[code >> 12] if code >> 12 else "")
+
+
+def _bound(value):
+    return "inf" if value >= 9999999 else "-inf" if value <= -9999999 else str(value)
+
+
+def print_stats(header, records):
+    """Per-kind and per-depth aggregates: exits, move ordering and how often each heuristic fired."""
+    print(f"[Trace] {len(records):,} nodes from {len(header['searches'])} searches "
+          f"({header['dropped']:,} older records overwritten)")
+    rows = defaultdict(lambda: defaultdict(int))
+    for r in records:
+        row = rows[(r["kind"], r["depth"])]
+        row["nodes"] += 1
+        row["exit_" + EXITS[r["exit"]]] += 1
+        if r["cutoff"] != NO_CUTOFF:
+            row["cutoffs"] += 1
+            row["first_move_cutoffs"] += r["cutoff"] == 1
+        row["searched"] += r["searched"]
+        for name in COUNTS:
+            row[name] += r[name]
+        row["null_tried"] += bool(r["flags"] & FLAG_NULL)
+        row["iid"] += bool(r["flags"] & FLAG_IID)
+        row["iir"] += bool(r["flags"] & FLAG_IIR)
+
+    print(f"\n{'kind':<8} {'depth':>5} {'nodes':>9} {'tt%':>6} {'null%':>6} {'cut%':>6} {'1st%':>6} "
+          f"{'moves':>6} {'see':>7} {'hist':>7} {'lmp':>7} {'fut':>7} {'lmr':>7} {'re%':>6} {'iid':>5} {'iir':>6}")
+    for (kind, depth), row in sorted(rows.items(), key=lambda item: (item[0][0], -item[0][1])):
+        nodes = row["nodes"]
+        cut = row["cutoffs"] / nodes * 100
+        first = row["first_move_cutoffs"] / row["cutoffs"] * 100 if row["cutoffs"] else 0.0
+        research = row["lmr_research"] / row["lmr"] * 100 if row["lmr"] else 0.0
+        print(f"{KINDS[kind]:<8} {depth:>5} {nodes:>9,} {row['exit_tt'] / nodes * 100:>6.1f} "
+              f"{row['exit_null'] / nodes * 100:>6.1f} {cut:>6.1f} {first:>6.1f} {row['searched'] / nodes:>6.2f} "
+              f"{row['see']:>7,} {row['history']:>7,} {row['lmp']:>7,} {row['futility']:>7,} {row['lmr']:>7,} "
+              f"{research:>6.1f} {row['iid']:>5,} {row['iir']:>6,}")
+
+    exits = defaultdict(int)
+    for r in records:
+        exits[(KINDS[r["kind"]], EXITS[r["exit"]])] += 1
+    print("\n[Trace] Exits: " + ", ".join(f"{kind}/{name} {count:,}" for (kind, name), count in sorted(exits.items())))
+
+
+def print_tree(header, records, search_id=None, depth=None, max_ply=3):
+    """Indented dump of one iteration's tree (the last recorded one unless search/depth are given)."""
+    roots = [r for r in records if r["ply"] == 0 and r["parent"] == 0 and r["kind"] == 0
+             and (search_id is None or r["search"] == search_id) and (depth is None or r["depth"] == depth)]
+    if not roots:
+        print("[Trace] No matching root node in the trace")
+        return
+    root = roots[-1]
+    children = defaultdict(list)
+    for r in records:
+        if r["search"] == root["search"]:
+            children[r["parent"]].append(r)
+
+    print(f"[Trace] Search {root['search']}: {header['searches'].get(str(root['search']), '?')} "
+          f"depth {root['depth']}")
+
+    def show(node, move, indent):
+        flags = [name for bit, name in ((FLAG_NULL, "null"), (FLAG_IID, "iid"), (FLAG_IIR, "iir"))
+                 if node["flags"] & bit]
+        flags += [f"{name}={node[name]}" for name in COUNTS if node[name]]
+        cutoff = f" cut@{node['cutoff']}" if node["cutoff"] != NO_CUTOFF else ""
+        static_eval = node["static_eval"] if node["static_eval"] != NO_EVAL else "-"
+        print(f"{'  ' * indent}{move} {KINDS[node['kind']]} d={node['depth']} "
+              f"[{_bound(node['alpha'])},{_bound(node['beta'])}] -> {_bound(node['value'])} "
+              f"eval={static_eval} {EXITS[node['exit']]} best={_move_text(node['move'])} "
+              f"moves={node['searched']}{cutoff} {' '.join(flags)}")
+        if node["ply"] >= max_ply:
+            return
+        for child in children[node["node"]]:
+            show(child, _move_text(child["played"]), indent + 1)
+
+    show(root, "root", 0)
+
+
+def record(fens, depth, out, capacity=1 << 20, max_ply=64, sample_rate=1.0):
+    from search import Searcher
+    import chess
+
+    searcher = Searcher()
+    searcher.deterministic = True
+    searcher.trace = TraceRecorder(capacity, sample_rate, max_ply)
+    for fen in fens:
+        searcher.iterative_deepening(chess.Board(fen), max_depth=depth, time_limit=None)
+    count = searcher.trace.save(out)
+    print(f"[Trace] Wrote {count:,} node records to {out}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Record and analyse search tree traces")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_record = sub.add_parser("record", help="search positions with tracing on")
+    p_record.add_argument("fen", nargs="+")
+    p_record.add_argument("--depth", type=int, default=6)
+    p_record.add_argument("--max-ply", type=int, default=64, help="record nodes up to this ply")
+    p_record.add_argument("--capacity", type=int, default=1 << 20, help="ring buffer size in records")
+    p_record.add_argument("--sample-rate", type=float, default=1.0, help="share of the searches recorded")
+    p_record.add_argument("--out", default="trace.bin")
+    p_stats = sub.add_parser("stats", help="aggregated statistics per node kind and depth")
+    p_stats.add_argument("trace")
+    p_tree = sub.add_parser("tree", help="dump the tree of one iteration")
+    p_tree.add_argument("trace")
+    p_tree.add_argument("--search", type=int, default=None, help="search id (default: the last one)")
+    p_tree.add_argument("--depth", type=int, default=None, help="iteration depth (default: the last one)")
+    p_tree.add_argument("--max-ply", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    if args.command == "record":
+        record(args.fen, args.depth, args.out, args.capacity, args.max_ply, args.sample_rate)
+    elif args.command == "stats":
+        print_stats(*load(args.trace))
+    else:
+        print_tree(*load(args.trace), args.search, args.depth, args.max_ply)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""
+Self-play data generator.
+
+Plays Searcher against itself in worker processes from randomised openings at a
+fixed node budget and writes every recorded position with its search score and
+the final game result to a packed position file (see packed_positions.py).
+Positions in check, positions whose best move is a capture or promotion, and
+duplicates are skipped.
+
+Each worker keeps one Searcher for all its games, and the progress lines report
+its cache sizes and peak RSS, so memory growth over thousands of games shows up.
+
+Usage:
+    python selfplay.py out.bin [--games 1000] [--nodes 5000] [--workers K] [--random-plies 8] [--seed 1]
+"""
+import time
+import random
+import argparse
+from multiprocessing import Pool
+
+import chess
+import numpy as np
+
+from search import Searcher
+from engine_common import search_nodes, ADJUDICATE_SCORE, ADJUDICATE_PLIES
+from bitbase import get_bitbases, WIN, LOSS
+from packed_positions import PositionWriter, RECORD_DTYPE, pack
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+KEY_BYTES = 26  # occupied + pieces + flags + ep: identifies the position for dedup
+
+_SEARCHER = None
+
+
+def _init_worker():
+    global _SEARCHER
+    _SEARCHER = Searcher()
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def play_game(task):
+    """Play one game from a random opening; returns (packed records, stats)."""
+    seed, node_budget, random_plies, max_plies = task
+    rng = random.Random(seed)
+    searcher = _SEARCHER
+    bitbases = get_bitbases()
+    start = time.time()
+
+    board = chess.Board()
+    for _ in range(random_plies):
+        moves = list(board.legal_moves)
+        if not moves:
+            break
+        board.push(rng.choice(moves))
+
+    samples = []  # (board, white-relative score)
+    result = None
+    decisive_plies = 0
+    while result is None:
+        if board.is_game_over(claim_draw=True):
+            outcome = board.outcome(claim_draw=True)
+            result = 0 if outcome.winner is None else (1 if outcome.winner == chess.WHITE else -1)
+            break
+        if len(board.move_stack) >= max_plies:
+            result = 0
+            break
+        wdl = bitbases.probe(board)
+        if wdl is not None:
+            winner = board.turn if wdl == WIN else (not board.turn if wdl == LOSS else None)
+            result = 0 if winner is None else (1 if winner == chess.WHITE else -1)
+            break
+
+        move, score = search_nodes(searcher, board, node_budget)
+        if move is None:
+            result = 0
+            break
+        white_score = score if board.turn == chess.WHITE else -score
+
+        # Adjudicate long one-sided games
+        decisive_plies = decisive_plies + 1 if abs(score) >= ADJUDICATE_SCORE else 0
+        if decisive_plies >= ADJUDICATE_PLIES:
+            result = 1 if white_score > 0 else -1
+            break
+
+        if not board.is_check() and not board.is_capture(move) and not move.promotion:
+            samples.append((board.copy(stack=False), white_score))
+        board.push(move)
+
+    records = np.zeros(len(samples), dtype=RECORD_DTYPE)
+    for i, (sample, score) in enumerate(samples):
+        pack(sample, score, result, out=records[i])
+
+    stats = {
+        "plies": len(board.move_stack),
+        "result": result,
+        "time": time.time() - start,
+        "tt": len(searcher.tt.table),
+        "see_cache": len(searcher.see_cache),
+        "history": len(searcher.history),
+        "rss_mb": peak_rss_mb(),
+    }
+    return records, stats
+
+
+def generate(out_path, games=1000, node_budget=5000, workers=None, random_plies=8, max_plies=400, seed=1):
+    tasks = [(seed * 1_000_003 + i, node_budget, random_plies, max_plies) for i in range(games)]
+    seen = set()
+    written = duplicates = 0
+    results = {1: 0, 0: 0, -1: 0}
+    start = time.time()
+    with Pool(workers, initializer=_init_worker) as pool, PositionWriter(out_path) as writer:
+        for n, (records, stats) in enumerate(pool.imap_unordered(play_game, tasks), 1):
+            keys = records.view(np.uint8).reshape(-1, RECORD_DTYPE.itemsize)[:, :KEY_BYTES]
+            keep = []
+            for i, key in enumerate(keys):
+                key = key.tobytes()
+                if key in seen:
+                    duplicates += 1
+                    continue
+                seen.add(key)
+                keep.append(i)
+            writer.write_records(records[keep])
+            written += len(keep)
+            results[stats["result"]] += 1
+
+            rss = f"{stats['rss_mb']:.0f} MB" if stats["rss_mb"] is not None else "n/a"
+            print(f"[Selfplay] Game {n}/{games}: {stats['plies']} plies, result {stats['result']:+d}, "
+                  f"{stats['time']:.1f}s | positions {written:,} (dup {duplicates:,}) | "
+                  f"worker tt={stats['tt']:,} see_cache={stats['see_cache']:,} "
+                  f"history={stats['history']:,} peak RSS={rss}")
+
+    print(f"\n[Selfplay] {games} games in {time.time() - start:.1f}s: "
+          f"+{results[1]} ={results[0]} -{results[-1]}, {written:,} positions -> {out_path}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate self-play training data")
+    parser.add_argument("out")
+    parser.add_argument("--games", type=int, default=1000)
+    parser.add_argument("--nodes", type=int, default=5000, help="node budget per move")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument("--random-plies", type=int, default=8, help="random opening moves")
+    parser.add_argument("--max-plies", type=int, default=400)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+    generate(args.out, args.games, args.nodes, args.workers, args.random_plies, args.max_plies, args.seed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,233 @@
+"""
+SPSA tuning of the search parameters in search_params.py.
+
+Every iteration perturbs all parameters at once by +/-c_k (random signs),
+plays game pairs between the "plus" and "minus" settings from the same random
+opening with colours swapped, and moves the parameters along the perturbation
+by the score difference (the simultaneous perturbation gradient estimate).
+Games are played in worker processes in parallel at a fixed node budget, with
+the same adjudication as selfplay.py.
+
+Step sizes follow the usual SPSA schedule: c_k = c / k^0.101 and
+a_k = a / (A + k)^0.602, with c one twentieth of each parameter's range and a
+chosen so the last step moves a parameter by about r_end * c^2 / c_k.
+
+Progress is checkpointed to a JSON file after every iteration and resumed
+from it on restart. The final values are written to tuned_search.py, which
+search_params.py loads in place of its defaults when present.
+
+Usage:
+    python spsa.py [--iterations 200] [--pairs 8] [--nodes 3000] [--workers K]
+                   [--params FutilityMargin,LMRBase] [--checkpoint spsa.json] [--out tuned_search.py]
+"""
+import os
+import json
+import time
+import random
+import argparse
+from multiprocessing import Pool
+
+import chess
+
+from search import Searcher
+from search_params import SEARCH_PARAMS, default_params
+from engine_common import search_nodes, ADJUDICATE_SCORE, ADJUDICATE_PLIES
+from bitbase import get_bitbases, WIN, LOSS
+
+ALPHA = 0.602
+GAMMA = 0.101
+
+_SEARCHERS = None
+
+
+def _init_worker():
+    global _SEARCHERS
+    _SEARCHERS = (Searcher(), Searcher())
+
+
+def play_game(task):
+    """
+    Play one game between two parameter sets from a random opening.
+    Returns the result from the point of view of the first set (1, 0.5 or 0).
+    """
+    seed, first_params, second_params, first_white, node_budget, random_plies, max_plies = task
+    rng = random.Random(seed)
+    bitbases = get_bitbases()
+    first, second = _SEARCHERS
+    for searcher, params in ((first, first_params), (second, second_params)):
+        searcher.clear()  # Games must not share TT or history between settings
+        for name, value in params.items():
+            setattr(searcher, name, value)
+    white, black = (first, second) if first_white else (second, first)
+
+    board = chess.Board()
+    for _ in range(random_plies):
+        moves = list(board.legal_moves)
+        if not moves:
+            break
+        board.push(rng.choice(moves))
+
+    result = None  # White-relative: 1, 0, -1
+    decisive_plies = 0
+    while result is None:
+        if board.is_game_over(claim_draw=True):
+            outcome = board.outcome(claim_draw=True)
+            result = 0 if outcome.winner is None else (1 if outcome.winner == chess.WHITE else -1)
+            break
+        if len(board.move_stack) >= max_plies:
+            result = 0
+            break
+        wdl = bitbases.probe(board)
+        if wdl is not None:
+            winner = board.turn if wdl == WIN else (not board.turn if wdl == LOSS else None)
+            result = 0 if winner is None else (1 if winner == chess.WHITE else -1)
+            break
+
+        searcher = white if board.turn == chess.WHITE else black
+        move, score = search_nodes(searcher, board, node_budget)
+        if move is None:
+            result = 0
+            break
+
+        # Adjudicate long one-sided games (both sides' scores count, as in selfplay.py)
+        decisive_plies = decisive_plies + 1 if abs(score) >= ADJUDICATE_SCORE else 0
+        if decisive_plies >= ADJUDICATE_PLIES:
+            white_score = score if board.turn == chess.WHITE else -score
+            result = 1 if white_score > 0 else -1
+            break
+        board.push(move)
+
+    first_result = result if first_white else -result
+    return (first_result + 1) / 2
+
+
+class SPSA:
+    def __init__(self, names, iterations, r_end=0.002):
+        specs = {name: (default, low, high) for name, _, default, low, high in SEARCH_PARAMS}
+        start = default_params()
+        self.names = names
+        self.low = {name: specs[name][1] for name in names}
+        self.high = {name: specs[name][2] for name in names}
+        self.theta = {name: float(start[name]) for name in names}
+        self.c = {name: (self.high[name] - self.low[name]) / 20 for name in names}
+        self.A = 0.1 * iterations
+        self.a = {name: r_end * self.c[name] ** 2 * (self.A + iterations) ** ALPHA for name in names}
+        self.k = 0
+        self.history = []  # (iteration, score of plus vs minus, theta)
+
+    def perturbation(self, rng):
+        """
+        (plus params, minus params, signs) for the next iteration. The played values
+        are rounded to integers, as write_params and the UCI spin options use them,
+        so integer thresholds (qsearch_max_ply, lmp_base) behave as they will after tuning.
+        """
+        k = self.k + 1
+        signs = {name: rng.choice((-1, 1)) for name in self.names}
+        plus, minus = {}, {}
+        for name in self.names:
+            c_k = self.c[name] / k ** GAMMA
+            plus[name] = int(round(min(self.high[name], max(self.low[name], self.theta[name] + c_k * signs[name]))))
+            minus[name] = int(round(min(self.high[name], max(self.low[name], self.theta[name] - c_k * signs[name]))))
+        return plus, minus, signs
+
+    def update(self, signs, score):
+        """Step along the perturbation; score is plus's points minus minus's points, per game pair."""
+        self.k += 1
+        for name in self.names:
+            a_k = self.a[name] / (self.A + self.k) ** ALPHA
+            c_k = self.c[name] / self.k ** GAMMA
+            theta = self.theta[name] + a_k / c_k * score * signs[name]
+            self.theta[name] = min(self.high[name], max(self.low[name], theta))
+        self.history.append((self.k, score, dict(self.theta)))
+
+    def state(self):
+        return {"names": self.names, "k": self.k, "theta": self.theta, "history": self.history}
+
+    def restore(self, state):
+        if state["names"] != self.names:
+            raise ValueError(f"checkpoint tunes {state['names']}, not {self.names}")
+        self.k = state["k"]
+        self.theta = {name: float(value) for name, value in state["theta"].items()}
+        self.history = [tuple(item) for item in state["history"]]
+
+
+def save_checkpoint(path, state):
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(state, f, indent=1)
+    os.replace(tmp, path)  # Atomic: an interrupted run never leaves a half-written checkpoint
+
+
+def write_params(theta, path="tuned_search.py"):
+    values = {**default_params(), **{name: int(round(value)) for name, value in theta.items()}}
+    out = ["# Generated by spsa.py - do not edit by hand", "SEARCH_PARAM_VALUES = {"]
+    for name, value in values.items():
+        out.append(f"    {name!r}: {value},")
+    out.append("}")
+    with open(path, "w") as f:
+        f.write("\n".join(out) + "\n")
+    print(f"[SPSA] Wrote tuned values to {path}")
+
+
+def tune(names, iterations=200, pairs=8, node_budget=3000, workers=None, checkpoint="spsa.json",
+         seed=1, random_plies=8, max_plies=300, r_end=0.002):
+    spsa = SPSA(names, iterations, r_end)
+    if checkpoint and os.path.exists(checkpoint):
+        with open(checkpoint) as f:
+            spsa.restore(json.load(f))
+        print(f"[SPSA] Resumed from {checkpoint} at iteration {spsa.k}")
+
+    with Pool(workers, initializer=_init_worker) as pool:
+        while spsa.k < iterations:
+            start = time.time()
+            rng = random.Random(seed * 1_000_003 + spsa.k)  # Per iteration, so a resumed run replays the same games
+            plus, minus, signs = spsa.perturbation(rng)
+            tasks = []
+            for pair in range(pairs):
+                game_seed = rng.getrandbits(32)
+                for plus_white in (True, False):
+                    tasks.append((game_seed, plus, minus, plus_white, node_budget, random_plies, max_plies))
+            points = sum(pool.map(play_game, tasks))
+            score = (2 * points - len(tasks)) / pairs  # Per pair, in [-2, 2]
+            spsa.update(signs, score)
+            if checkpoint:
+                save_checkpoint(checkpoint, spsa.state())
+
+            values = " ".join(f"{name}={spsa.theta[name]:.1f}" for name in names)
+            print(f"[SPSA] Iteration {spsa.k}/{iterations}: plus {points:.1f}/{len(tasks)} "
+                  f"({time.time() - start:.1f}s) | {values}")
+    return spsa.theta
+
+
+def main(argv=None):
+    by_option = {option.lower(): name for name, option, _, _, _ in SEARCH_PARAMS}
+    parser = argparse.ArgumentParser(description="SPSA tuning of the search parameters")
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--pairs", type=int, default=8, help="game pairs per iteration")
+    parser.add_argument("--nodes", type=int, default=3000, help="node budget per move")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument("--params", default=None,
+                        help="comma-separated UCI option names to tune (default: all)")
+    parser.add_argument("--checkpoint", default="spsa.json", help="JSON file to save and resume progress")
+    parser.add_argument("--out", default="tuned_search.py")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--random-plies", type=int, default=8, help="random opening moves")
+    parser.add_argument("--max-plies", type=int, default=300)
+    parser.add_argument("--r-end", type=float, default=0.002, help="final learning rate")
+    args = parser.parse_args(argv)
+
+    if args.params:
+        unknown = [p for p in args.params.split(",") if p.strip().lower() not in by_option]
+        if unknown:
+            parser.error(f"unknown parameters: {', '.join(unknown)}")
+        names = [by_option[p.strip().lower()] for p in args.params.split(",")]
+    else:
+        names = [name for name, _, _, _, _ in SEARCH_PARAMS]
+
+    theta = tune(names, args.iterations, args.pairs, args.nodes, args.workers, args.checkpoint,
+                 args.seed, args.random_plies, args.max_plies, args.r_end)
+    write_params(theta, args.out)
+
+
+if __name__ == "__main__":
+    main()
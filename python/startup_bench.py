@@ -0,0 +1,74 @@
+"""
+Engine startup benchmark: time from launching the engine process to "uciok",
+and to "readyok" (when the Searcher has been created), over several runs.
+
+Match runners and engine hosts restart the engine for every game, so this is
+paid thousands of times; --budget makes the run fail when the median
+time-to-uciok goes over it.
+
+Usage:
+    python startup_bench.py [--runs 20] [--budget 300] [--command python uci.py]
+"""
+import os
+import sys
+import time
+import argparse
+import subprocess
+
+from engine_common import percentile
+
+UCI_COMMAND = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "uci.py")]
+
+
+def wait_for(process, token):
+    for line in process.stdout:
+        if line.strip() == token:
+            return
+    raise RuntimeError(f"engine exited before {token!r}")
+
+
+def measure(command):
+    """(ms to uciok, ms to readyok) for one cold start of command."""
+    start = time.perf_counter()
+    process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                               stderr=subprocess.DEVNULL, text=True, bufsize=1)
+    try:
+        process.stdin.write("uci\n")
+        process.stdin.flush()
+        wait_for(process, "uciok")
+        uciok = time.perf_counter() - start
+        process.stdin.write("isready\n")
+        process.stdin.flush()
+        wait_for(process, "readyok")
+        readyok = time.perf_counter() - start
+        process.stdin.write("quit\n")
+        process.stdin.flush()
+        process.wait(timeout=10)
+    finally:
+        if process.poll() is None:
+            process.kill()
+    return uciok * 1000, readyok * 1000
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure the engine's time-to-uciok")
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--budget", type=float, default=None, help="fail if the median time-to-uciok exceeds this (ms)")
+    parser.add_argument("--command", nargs="+", default=UCI_COMMAND, help="engine command (default: uci.py)")
+    args = parser.parse_args(argv)
+
+    measure(args.command)  # Warm the OS file cache; cold-start numbers should not include disk reads
+    uciok, readyok = zip(*(measure(args.command) for _ in range(args.runs)))
+    for name, values in (("uciok", uciok), ("readyok", readyok)):
+        print(f"[Startup] {name:<8} min {min(values):7.1f} ms | median {percentile(values, 0.5):7.1f} ms | "
+              f"p90 {percentile(values, 0.9):7.1f} ms | max {max(values):7.1f} ms")
+
+    median = percentile(uciok, 0.5)
+    if args.budget is not None and median > args.budget:
+        print(f"[Startup] Median time-to-uciok {median:.1f} ms is over the {args.budget:.0f} ms budget")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
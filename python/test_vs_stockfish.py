@@ -45,6 +45,7 @@ for game_num in range(1, NUM_GAMES + 1):
             board.push(result.move)
 
     engine.quit()
+    ai.close()
 
     # Kết quả
     result = board.result()
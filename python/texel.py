@@ -0,0 +1,236 @@
+"""
+Texel tuning of the material values and piece-square tables in evaluate.py.
+
+evaluate_board is linear in its parameters once the per-side endgame weight is
+fixed, so every quiet position is encoded as a sparse feature row (material
+counts, tapered middlegame/endgame PST entries) and the parameters are fitted
+with vectorised NumPy gradient descent (Adam) on the logistic loss between
+sigmoid(eval) and the game result.
+
+Usage:
+    python texel.py extract games.pgn [more.pgn ...] --out features.npz
+    python texel.py tune features.npz [--epochs 2000] [--lr 1.0] [--out tuned_eval.py]
+
+The tuned tables are written to tuned_eval.py, which evaluate.py loads in place
+of its built-in tables when present.
+"""
+import time
+import argparse
+
+import chess
+import chess.pgn
+import numpy as np
+
+import evaluate
+from evaluate import get_material_info, pst_index
+from bitbase import get_bitbases
+
+PIECE_TYPES = [chess.PAWN, chess.KNIGHT, chess.BISHOP, chess.ROOK, chess.QUEEN, chess.KING]
+N_MATERIAL = 5  # King value is fixed at 0
+MG_OFFSET = N_MATERIAL
+EG_OFFSET = MG_OFFSET + 6 * 64
+N_PARAMS = EG_OFFSET + 6 * 64
+
+RESULTS = {"1-0": 1.0, "1/2-1/2": 0.5, "0-1": 0.0}
+
+
+def initial_params():
+    """Parameter vector holding the tables currently used by evaluate.py."""
+    params = np.zeros(N_PARAMS)
+    for i, pt in enumerate(PIECE_TYPES):
+        if pt != chess.KING:
+            params[i] = evaluate.piece_values[pt]
+        mg, eg = evaluate.piece_square_tables[pt]
+        params[MG_OFFSET + i * 64:MG_OFFSET + (i + 1) * 64] = mg
+        params[EG_OFFSET + i * 64:EG_OFFSET + (i + 1) * 64] = eg
+    return params
+
+
+def encode(board):
+    """Sparse features (columns, values) of a position, from white's point of view."""
+    cols, vals = [], []
+    for color, sign in ((chess.WHITE, 1.0), (chess.BLACK, -1.0)):
+        _, endgame_t, _ = get_material_info(board, color)
+        for i, pt in enumerate(PIECE_TYPES):
+            for sq in board.pieces(pt, color):
+                idx = pst_index(sq, color)
+                if pt != chess.KING:
+                    cols.append(i)
+                    vals.append(sign)
+                cols.append(MG_OFFSET + i * 64 + idx)
+                vals.append(sign * (1 - endgame_t))
+                cols.append(EG_OFFSET + i * 64 + idx)
+                vals.append(sign * endgame_t)
+    return cols, vals
+
+
+def is_quiet(board, searcher):
+    """Quiet = not in check, no promotion pending and no capture that wins material by SEE."""
+    if board.is_check():
+        return False
+    for move in board.legal_moves:
+        if move.promotion:
+            return False
+        if board.is_capture(move) and searcher.see(board, move) > 0:
+            return False
+    return True
+
+
+def extract(pgn_paths, skip_plies=8, max_positions=None):
+    """Stream PGN games and collect quiet positions with their game results as sparse rows."""
+    from search import Searcher
+    searcher = Searcher()
+    bitbases = get_bitbases()
+    rows, cols, vals, results = [], [], [], []
+    n = 0
+    start = time.time()
+    for path in pgn_paths:
+        with open(path, encoding="utf-8", errors="replace") as f:
+            while max_positions is None or n < max_positions:
+                game = chess.pgn.read_game(f)
+                if game is None:
+                    break
+                result = RESULTS.get(game.headers.get("Result"))
+                if result is None:
+                    continue
+                board = game.board()
+                for ply, move in enumerate(game.mainline_moves()):
+                    board.push(move)
+                    if ply < skip_plies or board.is_game_over() or bitbases.probe(board) is not None:
+                        continue
+                    if not is_quiet(board, searcher):
+                        continue
+                    c, v = encode(board)
+                    rows.extend([n] * len(c))
+                    cols.extend(c)
+                    vals.extend(v)
+                    results.append(result)
+                    n += 1
+                    if max_positions is not None and n >= max_positions:
+                        break
+        print(f"[Texel] {path}: {n:,} positions ({time.time() - start:.1f}s)")
+    return (np.array(rows, dtype=np.int32), np.array(cols, dtype=np.int32),
+            np.array(vals, dtype=np.float32), np.array(results, dtype=np.float32))
+
+
+class Dataset:
+    def __init__(self, rows, cols, vals, results):
+        self.rows, self.cols, self.vals, self.results = rows, cols, vals, results
+        self.n = len(results)
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path)
+        return cls(data["rows"], data["cols"], data["vals"], data["results"])
+
+    def save(self, path):
+        np.savez_compressed(path, rows=self.rows, cols=self.cols, vals=self.vals, results=self.results)
+
+    def evaluate(self, params):
+        """evaluate_board (white's point of view) for every position at once."""
+        return np.bincount(self.rows, weights=self.vals * params[self.cols], minlength=self.n)
+
+    def gradient(self, per_position):
+        """Back-propagate a per-position gradient onto the parameters."""
+        return np.bincount(self.cols, weights=self.vals * per_position[self.rows], minlength=N_PARAMS)
+
+
+def sigmoid(evals, k):
+    return 1.0 / (1.0 + 10.0 ** (-k * evals / 400.0))
+
+
+def loss(dataset, params, k):
+    return float(np.mean((dataset.results - sigmoid(dataset.evaluate(params), k)) ** 2))
+
+
+def fit_k(dataset, params):
+    """Scaling constant of the sigmoid that best matches the current evaluation."""
+    best_k, best_loss = 1.0, loss(dataset, params, 1.0)
+    for k in np.arange(0.1, 3.0, 0.05):
+        current = loss(dataset, params, k)
+        if current < best_loss:
+            best_k, best_loss = float(k), current
+    return best_k
+
+
+def tune(dataset, params=None, epochs=2000, lr=1.0, k=None, report_every=100):
+    """Adam on the Texel mean squared error; material and PST are updated together."""
+    params = initial_params() if params is None else params.copy()
+    k = fit_k(dataset, params) if k is None else k
+    print(f"[Texel] {dataset.n:,} positions, K={k:.2f}, loss={loss(dataset, params, k):.6f}")
+
+    m = np.zeros(N_PARAMS)
+    v = np.zeros(N_PARAMS)
+    beta1, beta2, eps = 0.9, 0.999, 1e-8
+    scale = np.log(10.0) * k / 400.0
+    start = time.time()
+    for epoch in range(1, epochs + 1):
+        s = sigmoid(dataset.evaluate(params), k)
+        # d/d eval of mean (result - s)^2
+        per_position = -2.0 * (dataset.results - s) * s * (1.0 - s) * scale / dataset.n
+        grad = dataset.gradient(per_position)
+        m = beta1 * m + (1 - beta1) * grad
+        v = beta2 * v + (1 - beta2) * grad * grad
+        params -= lr * (m / (1 - beta1 ** epoch)) / (np.sqrt(v / (1 - beta2 ** epoch)) + eps)
+        if epoch % report_every == 0 or epoch == epochs:
+            print(f"[Texel] Epoch {epoch}: loss={loss(dataset, params, k):.6f} ({time.time() - start:.1f}s)")
+    return params
+
+
+def _format_table(name, table):
+    lines = [f"{name} = ["]
+    for r in range(8):
+        row = ", ".join(f"{int(round(x)):4d}" for x in table[r * 8:(r + 1) * 8])
+        lines.append(f"    {row},")
+    lines.append("]")
+    return "\n".join(lines)
+
+
+def write_tables(params, path="tuned_eval.py"):
+    names = ["PAWN", "KNIGHT", "BISHOP", "ROOK", "QUEEN", "KING"]
+    out = ["# Generated by texel.py - do not edit by hand", "import chess", ""]
+    for i, name in enumerate(names):
+        out.append(_format_table(f"{name}_MG", params[MG_OFFSET + i * 64:MG_OFFSET + (i + 1) * 64]))
+        out.append("")
+        out.append(_format_table(f"{name}_EG", params[EG_OFFSET + i * 64:EG_OFFSET + (i + 1) * 64]))
+        out.append("")
+    out.append("piece_square_tables = {")
+    for name in names:
+        out.append(f"    chess.{name}: ({name}_MG, {name}_EG),")
+    out.append("}")
+    out.append("")
+    out.append("piece_values = {")
+    for i, name in enumerate(names):
+        value = int(round(params[i])) if i < N_MATERIAL else 0
+        out.append(f"    chess.{name}: {value},")
+    out.append("}")
+    with open(path, "w") as f:
+        f.write("\n".join(out) + "\n")
+    print(f"[Texel] Đã ghi bảng mới vào {path}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Texel tuning for evaluate.py")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_extract = sub.add_parser("extract", help="extract quiet positions from PGN files")
+    p_extract.add_argument("pgn", nargs="+")
+    p_extract.add_argument("--out", default="features.npz")
+    p_extract.add_argument("--skip-plies", type=int, default=8)
+    p_extract.add_argument("--max-positions", type=int, default=None)
+    p_tune = sub.add_parser("tune", help="fit the parameters on extracted features")
+    p_tune.add_argument("features")
+    p_tune.add_argument("--epochs", type=int, default=2000)
+    p_tune.add_argument("--lr", type=float, default=1.0)
+    p_tune.add_argument("--k", type=float, default=None)
+    p_tune.add_argument("--out", default="tuned_eval.py")
+    args = parser.parse_args(argv)
+
+    if args.command == "extract":
+        Dataset(*extract(args.pgn, args.skip_plies, args.max_positions)).save(args.out)
+    else:
+        params = tune(Dataset.load(args.features), epochs=args.epochs, lr=args.lr, k=args.k)
+        write_tables(params, args.out)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,55 +1,284 @@
 import sys
+import time
+import threading
+import contextlib
 import chess
-import chess.engine
-from ai import get_best_move
+from search_params import SEARCH_PARAMS, default_params
+from analysis_cache import HIT_DEPTH
+
+ENGINE_NAME = "Tuturu"
+ENGINE_AUTHOR = "LeNgocQuy2901"
+
+
+def uci_score(searcher, score):
+    """Điểm theo định dạng UCI: 'cp N' hoặc 'mate N' (số nước, âm nếu bị chiếu hết)."""
+    if searcher.is_mate_score(score):
+        moves = (searcher.score_to_ply(score) + 1) // 2
+        return f"mate {moves if score > 0 else -moves}"
+    return f"cp {int(score)}"
 
 
 class ChessEngine:
     def __init__(self):
         self.board = chess.Board()
+        self.out = sys.stdout  # Giữ lại stdout thật: log của Searcher bị chuyển sang stderr khi tìm kiếm
+        # Searcher (và các module nặng) chỉ được tạo khi cần, để trả lời "uci" ngay khi khởi động
+        self._searcher = None
+        self.mate_search = None
+        # Giá trị các tuỳ chọn UCI theo tên thuộc tính của Searcher, giữ qua các ván
+        self.options = {"deterministic": False, "cache_hit_depth": HIT_DEPTH, **default_params()}
+        self.analysis_cache = None  # AnalysisCache mở bằng tuỳ chọn AnalysisCache (đường dẫn file)
+        # go chạy trên luồng riêng để "stop" dừng được tìm kiếm; stop_event được Searcher kiểm tra
+        self.search_thread = None
+        self.stop_event = threading.Event()
+        self.infinite = False
+        self.send_lock = threading.Lock()
+
+    @property
+    def searcher(self):
+        if self._searcher is None:
+            from search import Searcher
+            self._searcher = Searcher()
+            self._searcher.info_callback = self.send_info
+            self._searcher.analysis_cache = self.analysis_cache
+            for name, value in self.options.items():
+                setattr(self._searcher, name, value)
+        return self._searcher
+
+    def send(self, line):
+        with self.send_lock:
+            print(line, file=self.out, flush=True)
+
+    def send_info(self, info):
+        elapsed_ms = int(info["time"] * 1000)
+        nps = int(info["nodes"] / info["time"]) if info["time"] > 0 else 0
+        pv = " ".join(move.uci() for move in info["pv"])
+        self.send(f"info depth {info['depth']} score {uci_score(self.searcher, info['score'])} "
+                  f"nodes {info['nodes']} nps {nps} time {elapsed_ms} pv {pv}")
 
     def handle_uci_command(self, command):
         """
         Xử lý các lệnh UCI.
+        Lệnh mở rộng: savett <file> / loadtt <file> lưu và nạp bảng chuyển vị.
         """
-        if command.startswith("uci"):
+        parts = command.split()
+        if not parts:
+            return
+        name = parts[0]
+        if name not in ("isready", "stop", "quit"):
+            self.wait_search()  # Các lệnh khác chỉ được xử lý khi tìm kiếm đang chạy đã xong
+        if name == "uci":
             self.uci_ready()
-        elif command.startswith("isready"):
+        elif name == "isready":
             self.is_ready()
-        elif command.startswith("position"):
-            self.set_position(command)
-        elif command.startswith("go"):
-            self.go(command)
-        elif command.startswith("quit"):
+        elif name == "ucinewgame":
+            self.new_game()
+        elif name == "position":
+            self.set_position(parts)
+        elif name == "setoption":
+            self.set_option(parts)
+        elif name == "go":
+            self.go(parts)
+        elif name == "stop":
+            self.stop()
+        elif name == "savett":
+            self.save_tt(command[len(name):].strip())
+        elif name == "loadtt":
+            self.load_tt(command[len(name):].strip())
+        elif name == "quit":
             self.quit()
         else:
-            print(f"UCI: Không nhận diện được lệnh: {command}")
+            self.send(f"info string UCI: Không nhận diện được lệnh: {command}")
 
     def uci_ready(self):
         """Lệnh khi engine đã sẵn sàng."""
-        print("uciok")
+        self.send(f"id name {ENGINE_NAME}")
+        self.send(f"id author {ENGINE_AUTHOR}")
+        self.send("option name Deterministic type check default false")
+        self.send("option name AnalysisCache type string default <empty>")
+        self.send(f"option name CacheDepth type spin default {self.options['cache_hit_depth']} min 0 max 64")
+        for name, option, _, low, high in SEARCH_PARAMS:
+            self.send(f"option name {option} type spin default {self.options[name]} min {low} max {high}")
+        self.send("uciok")
 
     def is_ready(self):
-        """Lệnh kiểm tra nếu engine sẵn sàng để nhận lệnh mới."""
-        print("readyok")
+        """Lệnh kiểm tra nếu engine sẵn sàng để nhận lệnh mới (khởi tạo Searcher nếu chưa có)."""
+        self.searcher
+        self.send("readyok")
 
-    def set_position(self, command):
-        """Lệnh để thiết lập vị trí cờ."""
-        parts = command.split(" ")
-        if "startpos" in parts:
+    def set_option(self, parts):
+        """Lệnh setoption name <tên> value <giá trị>."""
+        value_index = parts.index("value") if "value" in parts else len(parts)
+        option = " ".join(parts[2:value_index]).lower()
+        value = " ".join(parts[value_index + 1:])
+        spins = {uci_name.lower(): (name, low, high) for name, uci_name, _, low, high in SEARCH_PARAMS}
+        spins["cachedepth"] = ("cache_hit_depth", 0, 64)
+        if option == "analysiscache":
+            self.set_analysis_cache(value)
+            return
+        if option == "deterministic":
+            # Chỉ giới hạn theo độ sâu/số nút, không đọc đồng hồ: kết quả lặp lại được
+            # (go chỉ có giới hạn thời gian như wtime/movetime vẫn dừng theo đồng hồ)
+            name, value = "deterministic", value.lower() == "true"
+        elif option in spins:
+            name, low, high = spins[option]
+            try:
+                value = min(high, max(low, int(value)))
+            except ValueError:
+                self.send(f"info string UCI: Giá trị không hợp lệ cho {option}: {value}")
+                return
+        else:
+            self.send(f"info string UCI: Không có tuỳ chọn: {option}")
+            return
+        self.options[name] = value
+        if self._searcher is not None:
+            setattr(self._searcher, name, value)
+
+    def set_analysis_cache(self, path):
+        """Mở cache phân tích lưu trên đĩa (đường dẫn rỗng hoặc <empty>: tắt cache)."""
+        if self.analysis_cache is not None:
+            self.analysis_cache.close()
+            self.analysis_cache = None
+        if path and path != "<empty>":
+            import sqlite3
+            from analysis_cache import AnalysisCache
+            try:
+                self.analysis_cache = AnalysisCache(path)
+            except sqlite3.Error as e:
+                self.send(f"info string Could not open analysis cache: {e}")
+        if self._searcher is not None:
+            self._searcher.analysis_cache = self.analysis_cache
+
+    def new_game(self):
+        """Ván mới: xoá bảng chuyển vị và các bảng heuristic (giữ các tuỳ chọn)."""
+        self._searcher = None
+        self.mate_search = None
+        self.board = chess.Board()
+
+    def set_position(self, parts):
+        """Lệnh để thiết lập vị trí cờ: position [startpos | fen <FEN>] [moves ...]."""
+        moves_index = parts.index("moves") if "moves" in parts else len(parts)
+        if len(parts) > 1 and parts[1] == "fen":
+            self.board = chess.Board(" ".join(parts[2:moves_index]))
+        else:
             self.board = chess.Board()
-        elif "fen" in parts:
-            fen_position = parts[2]
-            self.board.set_fen(fen_position)
+        for uci in parts[moves_index + 1:]:
+            self.board.push_uci(uci)
+
+    def go(self, parts):
+        """
+        Lệnh yêu cầu engine tìm nước đi tốt nhất. Tìm kiếm chạy trên luồng riêng;
+        với go infinite, bestmove chỉ được gửi sau lệnh stop.
+        """
+        args = {}
+        for i, token in enumerate(parts[1:-1], 1):
+            if token in ("depth", "nodes", "mate", "movetime", "wtime", "btime", "winc", "binc", "movestogo"):
+                try:
+                    args[token] = int(parts[i + 1])
+                except ValueError:
+                    # Giá trị sai không được làm engine thoát: bỏ qua tham số này
+                    self.send(f"info string UCI: Giá trị không hợp lệ cho {token}: {parts[i + 1]}")
+
+        max_depth = args.get("depth", 64)
+        if "movetime" in args:
+            time_limit = args["movetime"] / 1000
+        elif "wtime" in args or "btime" in args:
+            remaining = args.get("wtime" if self.board.turn == chess.WHITE else "btime", 0)
+            increment = args.get("winc" if self.board.turn == chess.WHITE else "binc", 0)
+            moves_to_go = args.get("movestogo", 30)
+            time_limit = max(0.05, (remaining / moves_to_go + increment * 0.8) / 1000)
+        elif "depth" in args or "nodes" in args or "infinite" in parts:
+            time_limit = None
+        else:
+            time_limit = 10
+
+        self.infinite = "infinite" in parts
+        self.stop_event.clear()
+        self.searcher.stop_condition = self.stop_event.is_set
+        self.search_thread = threading.Thread(target=self.run_search, daemon=True,
+                                              args=(max_depth, time_limit, args.get("nodes"), args.get("mate")))
+        self.search_thread.start()
+
+    def run_search(self, max_depth, time_limit, node_limit, mate):
+        """Luồng tìm kiếm của một lệnh go: gửi bestmove khi xong (go infinite: sau khi nhận stop)."""
+        best_move = None
+        if mate is not None:
+            best_move = self.go_mate(mate, time_limit, node_limit)
+            if best_move is None and not self.stop_event.is_set():
+                # Không chứng minh được: tìm kiếm thường với thời gian còn lại
+                if time_limit is not None:
+                    time_limit = max(0.05, time_limit - (time.time() - self.mate_started))
+
+        if best_move is None:
+            # Các dòng log của Searcher không thuộc giao thức UCI
+            with contextlib.redirect_stdout(sys.stderr):
+                best_move = self.searcher.iterative_deepening(self.board, max_depth=max_depth,
+                                                              time_limit=time_limit, node_limit=node_limit)
+        if self.infinite:
+            self.stop_event.wait()
+        self.send(f"bestmove {best_move.uci()}" if best_move is not None else "bestmove 0000")
+
+    def stop(self):
+        """Lệnh stop: dừng tìm kiếm đang chạy và chờ nó gửi bestmove."""
+        if self.search_thread is not None:
+            self.stop_event.set()
+            self.wait_search()
+
+    def wait_search(self):
+        if self.search_thread is not None:
+            self.search_thread.join()
+            self.search_thread = None
+
+    def go_mate(self, moves, time_limit, node_limit):
+        """
+        go mate N: chứng minh chiếu hết trong N nước bằng proof-number search, trước
+        hết chỉ với các nước chiếu, sau đó với mọi nước đi. Trả về nước đầu tiên
+        của đường chiếu hết, hoặc None nếu không tìm được.
+        """
+        self.mate_started = time.time()
+        if self.mate_search is None:
+            from mate_search import MateSearch
+            self.mate_search = MateSearch()
+        self.mate_search.stop_condition = self.stop_event.is_set
+        nodes = 0
+        for checks_only in (True, False):
+            self.mate_search.checks_only = checks_only
+            remaining = None if time_limit is None else time_limit - (time.time() - self.mate_started)
+            found, line = self.mate_search.solve(self.board, moves, remaining,
+                                                 node_limit - nodes if node_limit else None)
+            nodes += self.mate_search.nodes
+            if found is not None:
+                elapsed = time.time() - self.mate_started
+                nps = int(nodes / elapsed) if elapsed > 0 else 0
+                self.send(f"info depth {len(line)} score mate {found} nodes {nodes} nps {nps} "
+                          f"time {int(elapsed * 1000)} pv {' '.join(m.uci() for m in line)}")
+                return line[0]
+            if self.mate_search.stop_search:
+                break
+        self.send(f"info string No mate in {moves} found ({nodes} nodes)")
+        return None
+
+    def save_tt(self, path):
+        """Lưu bảng chuyển vị ra file để khởi động nóng lần sau."""
+        try:
+            with contextlib.redirect_stdout(sys.stderr):
+                count = self.searcher.save_tt(path)
+            self.send(f"info string Saved {count} TT entries to {path}")
+        except OSError as e:
+            self.send(f"info string Could not save TT: {e}")
 
-    def go(self, command):
-        """Lệnh yêu cầu engine tìm nước đi tốt nhất."""
-        print("go")
-        best_move_found = get_best_move(self.board, depth=10)
-        print(f"bestmove {best_move_found}")
+    def load_tt(self, path):
+        """Nạp bảng chuyển vị đã lưu bằng savett."""
+        try:
+            with contextlib.redirect_stdout(sys.stderr):  # Log của TT (số mục bị bỏ...) không thuộc giao thức UCI
+                count = self.searcher.load_tt(path)
+            self.send(f"info string Loaded {count} TT entries from {path}")
+        except (OSError, ValueError) as e:
+            self.send(f"info string Could not load TT: {e}")
 
     def quit(self):
-        """Lệnh để kết thúc engine."""
+        """Lệnh để kết thúc engine (dừng tìm kiếm đang chạy)."""
+        self.stop()
         sys.exit()
 
 
@@ -60,6 +289,10 @@ def main():
     for line in sys.stdin:
         line = line.strip()
         engine.handle_uci_command(line)
+    # Hết đầu vào: chờ tìm kiếm đang chạy gửi bestmove (go infinite thì dừng luôn)
+    if engine.infinite:
+        engine.stop()
+    engine.wait_search()
 
 
 if __name__ == "__main__":
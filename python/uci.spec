@@ -5,7 +5,7 @@ a = Analysis(
     ['uci.py'],
     pathex=[],
     binaries=[],
-    datas=[],
+    datas=[('bitbases/*.bin', 'bitbases')],  # Endgame tables, found next to bitbase.py
     hiddenimports=[],
     hookspath=[],
     hooksconfig={},
@@ -0,0 +1,423 @@
+"""
+UCI gateway: serves the engine over a local TCP socket (plain UCI lines) or
+WebSocket (one UCI line per text message, detected from the HTTP upgrade on
+the same port).
+
+Every connection gets a uci.py process of its own for as long as it stays
+connected. With --pool N, N engines are kept started and warm: a connection
+takes one from the pool and a new one is started in the background to refill
+it, so clients never wait for interpreter startup. When the connection closes
+its engine is made clean again before it goes back to the pool: a running
+search is stopped (uci.py's "stop" interrupts it and answers bestmove), every
+option the session set is put back to its default and "ucinewgame" drops the
+TT, so sessions never see each other's settings. An engine that does not
+answer in time is quit instead.
+With --pool 0 every connection starts its own engine and quits it at the end.
+
+A client "quit" ends the session only; an engine that exits ends its session. Connections beyond --max-connections
+are refused, connections with no input or engine output for --idle-timeout
+seconds are closed (never while their engine is searching),
+and engines started beyond the pool size are quit after sitting idle as long.
+
+Usage:
+    python uci_gateway.py [--port 8766] [--bind 127.0.0.1] [--pool 2] [--max-connections 16] [--idle-timeout 300]
+"""
+import os
+import re
+import sys
+import time
+import base64
+import socket
+import struct
+import hashlib
+import argparse
+import itertools
+import threading
+import subprocess
+import socketserver
+
+UCI_COMMAND = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "uci.py")]
+WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+OPTION_RE = re.compile(r"option name (.+?) type (\S+)(?: default (.*?))?(?: min | max | var |$)")
+STOP_TIMEOUT = 5.0  # Seconds to wait for "bestmove" after "stop" before giving up on an engine
+
+
+class Engine:
+    """One uci.py process; output lines go to the current listener (the session using it)."""
+
+    def __init__(self, command=UCI_COMMAND):
+        self.process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                        stderr=subprocess.DEVNULL, text=True, bufsize=1)
+        self.listener = None
+        self.on_exit = None               # Called when the process exits while a session uses it
+        self.defaults = {}                # Option name (lowercase) -> (name, default) from the "uci" reply
+        self.waiting = None               # (token, event) while synchronising with the engine
+        self.idle = threading.Event()     # Set while no search is running
+        self.idle.set()
+        self.last_used = time.time()
+        threading.Thread(target=self._read, daemon=True).start()
+        if not self.request("uci", "uciok", timeout=30):
+            self.close()
+            raise RuntimeError("engine did not answer uci")
+
+    def _read(self):
+        for line in self.process.stdout:
+            line = line.rstrip("\n")
+            match = OPTION_RE.match(line)
+            if match and match.group(2) != "button":
+                # Only the first "uci" reply: later ones report the values a session has set
+                self.defaults.setdefault(match.group(1).lower(), (match.group(1), match.group(3) or ""))
+            if line.startswith("bestmove"):
+                self.idle.set()
+            waiting = self.waiting
+            if waiting and line.split(" ", 1)[0] == waiting[0]:
+                waiting[1].set()
+            listener = self.listener
+            if listener is not None:
+                try:
+                    listener(line)
+                except OSError:
+                    pass  # Client went away; the session cleans up
+        self.idle.set()
+        on_exit = self.on_exit
+        if on_exit is not None:
+            on_exit()
+
+    def send(self, line):
+        if line.split(" ", 1)[0] == "go":
+            self.idle.clear()
+        self.process.stdin.write(line + "\n")
+        self.process.stdin.flush()
+
+    def request(self, line, token, timeout):
+        """Send line and wait for the reply line starting with token; False on timeout."""
+        event = threading.Event()
+        self.waiting = (token, event)
+        try:
+            self.send(line)
+            return event.wait(timeout)
+        except OSError:
+            return False
+        finally:
+            self.waiting = None
+
+    def reset(self, changed):
+        """Stop any search, restore the options in changed and start a new game; False if the engine is stuck."""
+        try:
+            if not self.idle.is_set():
+                self.send("stop")
+                if not self.idle.wait(STOP_TIMEOUT):
+                    return False
+            for option in changed:
+                if option in self.defaults:
+                    name, default = self.defaults[option]
+                    self.send(f"setoption name {name} value {default}")
+            self.send("ucinewgame")
+        except OSError:
+            return False
+        return self.request("isready", "readyok", timeout=STOP_TIMEOUT)
+
+    def alive(self):
+        return self.process.poll() is None
+
+    def close(self):
+        self.listener = None
+        self.on_exit = None
+        try:
+            self.send("quit")
+            self.process.wait(timeout=2)
+        except (OSError, subprocess.TimeoutExpired):
+            self.process.kill()
+
+
+class Gateway:
+    def __init__(self, command=UCI_COMMAND, pool_size=2, max_connections=16, idle_timeout=300.0):
+        self.command = command
+        self.pool_size = pool_size
+        self.max_connections = max_connections
+        self.idle_timeout = idle_timeout
+        self.lock = threading.Lock()
+        self.idle_engines = []  # Warm engines, most recently used last
+        self.starting = 0
+        self.sessions = {}      # Session id -> [last activity, close callback, engine in use]
+        self.next_session = 0
+        self.closed = False
+        self._refill()
+        threading.Thread(target=self._reap, daemon=True).start()
+
+    def _refill(self):
+        """Start engines in the background until the pool (with the ones starting) is full again."""
+        with self.lock:
+            missing = self.pool_size - len(self.idle_engines) - self.starting
+            self.starting += max(0, missing)
+        for _ in range(missing):
+            threading.Thread(target=self._start_engine, daemon=True).start()
+
+    def _start_engine(self):
+        try:
+            engine = Engine(self.command)
+        except (OSError, RuntimeError) as e:
+            print(f"[Gateway] Could not start engine: {e}", file=sys.stderr)
+            engine = None
+        with self.lock:
+            self.starting -= 1
+            if engine is not None and not self.closed:
+                self.idle_engines.append(engine)
+                return
+        if engine is not None:
+            engine.close()
+
+    def acquire(self):
+        """A warm engine from the pool, or a new one when the pool is empty."""
+        with self.lock:
+            engine = None
+            while self.idle_engines and engine is None:
+                engine = self.idle_engines.pop()
+                if not engine.alive():
+                    engine = None
+        if self.pool_size:
+            self._refill()
+        return engine or Engine(self.command)
+
+    def release(self, engine, changed):
+        """Clean the engine and put it back in the pool (or quit it)."""
+        engine.listener = None
+        if self.pool_size and not self.closed and engine.alive() and engine.reset(changed):
+            engine.last_used = time.time()
+            with self.lock:
+                self.idle_engines.append(engine)
+        else:
+            engine.close()
+
+    def open_session(self, close):
+        """Register a connection; None when the gateway is at --max-connections."""
+        with self.lock:
+            if len(self.sessions) >= self.max_connections:
+                return None
+            self.next_session += 1
+            self.sessions[self.next_session] = [time.time(), close, None]
+            return self.next_session
+
+    def touch(self, session):
+        with self.lock:
+            if session in self.sessions:
+                self.sessions[session][0] = time.time()
+
+    def close_session(self, session):
+        with self.lock:
+            self.sessions.pop(session, None)
+
+    def _reap(self):
+        """Close idle connections, and quit idle engines beyond the pool size."""
+        while not self.closed:
+            time.sleep(1.0)
+            now = time.time()
+            with self.lock:
+                # A session whose engine is searching is never idle, however long the search is quiet
+                stale = [close for last, close, engine in self.sessions.values()
+                         if now - last > self.idle_timeout and (engine is None or engine.idle.is_set())]
+                surplus = len(self.idle_engines) - self.pool_size
+                reaped = [engine for engine in self.idle_engines[:max(0, surplus)]
+                          if now - engine.last_used > self.idle_timeout]
+                self.idle_engines = [engine for engine in self.idle_engines if engine not in reaped]
+            for close in stale:
+                close()
+            for engine in reaped:
+                engine.close()
+            if stale or reaped:
+                print(f"[Gateway] Reaped {len(stale)} idle connections, {len(reaped)} idle engines",
+                      file=sys.stderr)
+
+    def serve(self, session, lines, write):
+        """Run one session: UCI lines from the client go to an engine, its output to write(line)."""
+        engine = self.acquire()
+        changed = set()  # Options this session set, restored when the engine goes back to the pool
+
+        def forward(line):
+            self.touch(session)  # Engine output counts as activity: a client waiting on a search is not idle
+            write(line)
+
+        def engine_exited():
+            # The client would otherwise wait forever for bestmove or readyok
+            try:
+                write("info string Engine exited, closing the connection")
+            except OSError:
+                pass
+            with self.lock:
+                close = self.sessions[session][1] if session in self.sessions else None
+            if close is not None:
+                close()
+
+        engine.listener = forward
+        engine.on_exit = engine_exited
+        with self.lock:
+            if session in self.sessions:
+                self.sessions[session][2] = engine
+        try:
+            for line in lines:
+                if not engine.alive():
+                    break
+                self.touch(session)
+                line = line.strip()
+                if not line:
+                    continue
+                if line == "quit":
+                    break
+                if line.startswith("setoption"):
+                    parts = line.split()
+                    value_index = parts.index("value") if "value" in parts else len(parts)
+                    changed.add(" ".join(parts[2:value_index]).lower())
+                engine.send(line)
+        except OSError:
+            pass  # Engine died; the session ends
+        finally:
+            engine.on_exit = None
+            self.release(engine, changed)
+
+    def close(self):
+        with self.lock:
+            self.closed = True
+            engines, self.idle_engines = self.idle_engines, []
+            sessions = [close for _, close, _ in self.sessions.values()]
+        for close in sessions:
+            close()
+        for engine in engines:
+            engine.close()
+
+
+def websocket_handshake(rfile, wfile, request_line):
+    """Answer an HTTP upgrade request; False if it is not a WebSocket request."""
+    headers = {}
+    for line in rfile:
+        line = line.decode("latin-1").strip()
+        if not line:
+            break
+        name, _, value = line.partition(":")
+        headers[name.strip().lower()] = value.strip()
+    key = headers.get("sec-websocket-key")
+    if not request_line.startswith(b"GET ") or key is None:
+        wfile.write(b"HTTP/1.1 400 Bad Request\r\nContent-Length: 0\r\n\r\n")
+        return False
+    accept = base64.b64encode(hashlib.sha1((key + WS_GUID).encode()).digest()).decode()
+    wfile.write(("HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                 f"Sec-WebSocket-Accept: {accept}\r\n\r\n").encode())
+    wfile.flush()
+    return True
+
+
+def websocket_frame(opcode, payload):
+    """Encode an unmasked (server to client) frame."""
+    if len(payload) < 126:
+        header = struct.pack("!BB", 0x80 | opcode, len(payload))
+    elif len(payload) < 1 << 16:
+        header = struct.pack("!BBH", 0x80 | opcode, 126, len(payload))
+    else:
+        header = struct.pack("!BBQ", 0x80 | opcode, 127, len(payload))
+    return header + payload
+
+
+def websocket_lines(rfile, send_frame):
+    """Lines of the text messages received; answers pings, stops at a close frame or EOF."""
+    message = b""
+    while True:
+        header = rfile.read(2)
+        if len(header) < 2:
+            return
+        fin, opcode = header[0] & 0x80, header[0] & 0x0F
+        length = header[1] & 0x7F
+        if length == 126:
+            length = struct.unpack("!H", rfile.read(2))[0]
+        elif length == 127:
+            length = struct.unpack("!Q", rfile.read(8))[0]
+        mask = rfile.read(4) if header[1] & 0x80 else b"\0\0\0\0"
+        payload = bytearray(rfile.read(length))
+        for i in range(len(payload)):
+            payload[i] ^= mask[i % 4]
+
+        if opcode == 0x8:
+            send_frame(0x8, b"")
+            return
+        if opcode == 0x9:
+            send_frame(0xA, bytes(payload))
+        elif opcode in (0x0, 0x1):
+            message += payload
+            if fin:
+                yield from message.decode("utf-8", errors="replace").splitlines()
+                message = b""
+
+
+def serve_tcp(gateway, port, bind="127.0.0.1"):
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            lock = threading.Lock()
+
+            def shutdown():
+                try:
+                    self.connection.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+
+            first = self.rfile.readline()
+            if not first:
+                return
+            session = gateway.open_session(shutdown)
+            if first.startswith(b"GET "):
+                if not websocket_handshake(self.rfile, self.wfile, first):
+                    gateway.close_session(session)
+                    return
+
+                def send_frame(opcode, payload):
+                    with lock:
+                        self.wfile.write(websocket_frame(opcode, payload))
+                        self.wfile.flush()
+
+                def write(line):
+                    send_frame(0x1, line.encode())
+
+                lines = websocket_lines(self.rfile, send_frame)
+            else:
+                def write(line):
+                    with lock:
+                        self.wfile.write((line + "\n").encode())
+                        self.wfile.flush()
+
+                lines = (raw.decode("utf-8", errors="replace") for raw in itertools.chain([first], self.rfile))
+
+            if session is None:
+                write("info string Gateway busy: too many connections")
+                return
+            try:
+                gateway.serve(session, lines, write)
+            finally:
+                gateway.close_session(session)
+
+    socketserver.ThreadingTCPServer.allow_reuse_address = True
+    with socketserver.ThreadingTCPServer((bind, port), Handler) as server:
+        server.daemon_threads = True
+        print(f"[Gateway] Listening on {bind}:{port} (pool {gateway.pool_size}, "
+              f"max {gateway.max_connections} connections)", file=sys.stderr)
+        server.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the UCI engine over TCP / WebSocket")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--bind", default="127.0.0.1")
+    parser.add_argument("--pool", type=int, default=2, help="warm engines kept ready (0: one engine per connection)")
+    parser.add_argument("--max-connections", type=int, default=16)
+    parser.add_argument("--idle-timeout", type=float, default=300.0,
+                        help="seconds before idle connections and surplus engines are closed")
+    parser.add_argument("--command", nargs="+", default=UCI_COMMAND, help="engine command (default: uci.py)")
+    args = parser.parse_args(argv)
+
+    gateway = Gateway(args.command, args.pool, args.max_connections, args.idle_timeout)
+    try:
+        serve_tcp(gateway, args.port, args.bind)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        gateway.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,6 @@
 import pygame
 import chess
+import chess.polyglot
 
 WIDTH, HEIGHT = 600, 600
 SQUARE_SIZE = WIDTH // 8
@@ -16,29 +17,125 @@ for piece in PIECES:
     except pygame.error:
         print(f"Không thể load ảnh cho quân {piece}")
 
+# Bề mặt bàn cờ được vẽ sẵn một lần, dùng lại cho mọi khung hình
+_BOARD_SURFACE = None
+
+
+def piece_image_key(piece):
+    """Tên ảnh trong PIECE_IMAGES của một quân cờ ('p' cho tốt đen, 'p1' cho tốt trắng)."""
+    symbol = piece.symbol()
+    if symbol.isupper():
+        symbol = symbol.lower() + "1"
+    return symbol
+
+
+def square_rect(square):
+    col, row = chess.square_file(square), 7 - chess.square_rank(square)
+    return pygame.Rect(col * SQUARE_SIZE, row * SQUARE_SIZE, SQUARE_SIZE, SQUARE_SIZE)
+
+
+def get_board_surface():
+    """Trả về bề mặt nền bàn cờ, chỉ vẽ 64 ô ở lần gọi đầu tiên."""
+    global _BOARD_SURFACE
+    if _BOARD_SURFACE is None:
+        surface = pygame.Surface((WIDTH, HEIGHT))
+        for row in range(8):
+            for col in range(8):
+                color = WHITE if (row + col) % 2 == 0 else BROWN
+                pygame.draw.rect(surface, color, (col * SQUARE_SIZE, row * SQUARE_SIZE, SQUARE_SIZE, SQUARE_SIZE))
+        _BOARD_SURFACE = surface
+    return _BOARD_SURFACE
+
+
 def draw_board(screen):
-    for row in range(8):
-        for col in range(8):
-            color = WHITE if (row + col) % 2 == 0 else BROWN
-            pygame.draw.rect(screen, color, (col * SQUARE_SIZE, row * SQUARE_SIZE, SQUARE_SIZE, SQUARE_SIZE))
+    screen.blit(get_board_surface(), (0, 0))
 
 def draw_pieces(screen, board):
-    for square in chess.SQUARES:
-        piece = board.piece_at(square)
-        if piece:
-            col, row = chess.square_file(square), 7 - chess.square_rank(square)
-            symbol = piece.symbol()
-            if symbol.isupper():
-                symbol = symbol.lower() + "1"
-            screen.blit(PIECE_IMAGES[symbol], (col * SQUARE_SIZE, row * SQUARE_SIZE))
+    for square, piece in board.piece_map().items():
+        screen.blit(PIECE_IMAGES[piece_image_key(piece)], square_rect(square).topleft)
 
 def highlight_moves(screen, board, square):
-    legal_moves = [move for move in board.legal_moves if move.from_square == square]
-    for move in legal_moves:
-        col, row = chess.square_file(move.to_square), 7 - chess.square_rank(move.to_square)
-        pygame.draw.circle(screen, HIGHLIGHT,
-                           (col * SQUARE_SIZE + SQUARE_SIZE // 2, row * SQUARE_SIZE + SQUARE_SIZE // 2), 10)
-        
+    for to_square in legal_targets(board, square):
+        draw_highlight(screen, to_square)
+
+
+def legal_targets(board, square):
+    return {move.to_square for move in board.legal_moves if move.from_square == square}
+
+
+def draw_highlight(screen, square):
+    rect = square_rect(square)
+    pygame.draw.circle(screen, HIGHLIGHT, rect.center, 10)
+
+
+class BoardRenderer:
+    """
+    Vẽ bàn cờ theo vùng thay đổi (dirty rects) thay vì vẽ lại toàn bộ mỗi khung hình.
+
+    - Nền bàn cờ được vẽ sẵn một lần (get_board_surface).
+    - Lớp quân cờ được cache theo Zobrist hash của thế cờ.
+    - Các ô gợi ý nước đi chỉ được tính lại khi thế cờ hoặc ô được chọn thay đổi.
+    - render() trả về danh sách các ô cần cập nhật; danh sách rỗng nghĩa là
+      có thể bỏ qua khung hình này.
+    """
+
+    PIECE_CACHE_SIZE = 256
+
+    def __init__(self, screen):
+        self.screen = screen
+        self.piece_cache = {}
+        self.highlight_key = None
+        self.highlight_targets = frozenset()
+        self.squares = None  # Nội dung từng ô ở khung hình trước: (ảnh quân, có gợi ý)
+
+    def invalidate(self):
+        """Buộc vẽ lại toàn bộ ở khung hình tiếp theo (ví dụ khi cửa sổ bị che/khôi phục)."""
+        self.squares = None
+
+    def piece_layer(self, board):
+        key = chess.polyglot.zobrist_hash(board)
+        layer = self.piece_cache.get(key)
+        if layer is None:
+            if len(self.piece_cache) >= self.PIECE_CACHE_SIZE:
+                self.piece_cache.clear()
+            pieces = board.piece_map()
+            layer = tuple(piece_image_key(pieces[sq]) if sq in pieces else None for sq in chess.SQUARES)
+            self.piece_cache[key] = layer
+        return layer
+
+    def highlights(self, board, selected_square):
+        if selected_square is None:
+            return frozenset()
+        key = (chess.polyglot.zobrist_hash(board), selected_square)
+        if key != self.highlight_key:
+            self.highlight_key = key
+            self.highlight_targets = frozenset(legal_targets(board, selected_square))
+        return self.highlight_targets
+
+    def render(self, board, selected_square=None):
+        layer = self.piece_layer(board)
+        targets = self.highlights(board, selected_square)
+        squares = [(layer[sq], sq in targets) for sq in chess.SQUARES]
+
+        if self.squares is None:
+            changed = chess.SQUARES
+        else:
+            changed = [sq for sq in chess.SQUARES if squares[sq] != self.squares[sq]]
+        self.squares = squares
+
+        background = get_board_surface()
+        dirty = []
+        for sq in changed:
+            rect = square_rect(sq)
+            self.screen.blit(background, rect.topleft, rect)
+            image, highlighted = squares[sq]
+            if image is not None:
+                self.screen.blit(PIECE_IMAGES[image], rect.topleft)
+            if highlighted:
+                draw_highlight(self.screen, sq)
+            dirty.append(rect)
+        return dirty
+
 def draw_promotion_choices(screen, color):
     options = [chess.QUEEN, chess.ROOK, chess.BISHOP, chess.KNIGHT]
     names = ['q', 'r', 'b', 'n']